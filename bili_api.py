@@ -0,0 +1,263 @@
+"""
+B站API客户端模块 - 进程内共享的requests会话与请求头构造
+
+视频信息、字幕信息、UP主视频列表等API请求共用一个带连接池的Session：
+连接保持长连接复用，省去每次请求的TCP/TLS握手；cookie文件只在首次使用（或登录后重新加载）时读取一次；
+429和5xx由连接池适配器按指数退避自动重试，并遵循Retry-After。
+
+UP主投稿列表使用需要WBI签名的 x/space/wbi/arc/search 接口（旧的 x/space/arc/search 频繁被限流或拒绝）：
+从nav接口取得img_key/sub_key，按固定置换表生成mixin_key并在进程内缓存，
+请求参数加入wts时间戳后按键排序、过滤特殊字符，拼接mixin_key计算MD5作为w_rid。
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from datetime import datetime
+from urllib.parse import urlencode
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+BILI_COOKIE_PATH = "bili_cookies.json"  # 与bili_summary.COOKIE_PATH一致
+BILI_USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+                   'Chrome/120.0.0.0 Safari/537.36')
+BILI_API_TIMEOUT = 10  # 单次请求超时（秒）
+BILI_API_POOL_SIZE = 16  # 连接池大小，不小于并行获取字幕的线程数
+BILI_API_MAX_RETRIES = 3  # 适配器层面的自动重试次数
+BILI_API_BACKOFF_FACTOR = 0.5  # 重试退避系数：0.5, 1, 2秒...
+BILI_API_RETRY_STATUS = (429, 500, 502, 503, 504)
+
+WBI_NAV_URL = "https://api.bilibili.com/x/web-interface/nav"
+SPACE_WBI_ARC_SEARCH_URL = "https://api.bilibili.com/x/space/wbi/arc/search"
+WBI_KEY_TTL_SECONDS = 6 * 3600  # WBI密钥每天轮换，缓存6小时后重新获取
+WBI_RETRY_CODES = (-352, -403)  # 签名校验失败（通常是密钥已轮换），刷新密钥后重试一次
+WBI_MIXIN_KEY_ENC_TAB = [
+    46, 47, 18, 2, 53, 8, 23, 32, 15, 50, 10, 31, 58, 3, 45, 35, 27, 43, 5, 49,
+    33, 9, 42, 19, 29, 28, 14, 39, 12, 38, 41, 13, 37, 48, 7, 16, 24, 55, 40,
+    61, 26, 17, 0, 1, 60, 51, 30, 4, 22, 25, 54, 21, 56, 59, 6, 63, 57, 62, 11,
+    36, 20, 34, 44, 52
+]
+WBI_FILTERED_CHARS = "!'()*"
+
+
+def build_bili_headers(referer: str = "https://www.bilibili.com/", origin: str = "https://www.bilibili.com") -> dict:
+    """构造B站API请求头（缺少Referer/Origin时接口容易返回412）"""
+    return {
+        'User-Agent': BILI_USER_AGENT,
+        'Referer': referer,
+        'Origin': origin,
+        'Accept': 'application/json, text/plain, */*',
+        'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+        'Accept-Encoding': 'gzip, deflate, br',
+    }
+
+
+def normalize_subtitle_url(subtitle_url: str) -> str:
+    """把接口返回的字幕地址（常见为//开头）补全为完整URL"""
+    if subtitle_url.startswith('//'):
+        return f'https:{subtitle_url}'
+    if not subtitle_url.startswith('http'):
+        return f'https://{subtitle_url}'
+    return subtitle_url
+
+
+def select_subtitle_url(subtitles: list):
+    """从player接口的字幕列表中选出中文字幕URL：优先AI中文字幕（ai-zh），其次其他中文字幕，没有时返回None"""
+    for subtitle in subtitles:
+        if subtitle.get('lan') == 'ai-zh' and subtitle.get('subtitle_url'):
+            return normalize_subtitle_url(subtitle['subtitle_url'])
+    for subtitle in subtitles:
+        if (subtitle.get('lan_doc') == '中文' or subtitle.get('lan') == 'zh') and subtitle.get('subtitle_url'):
+            return normalize_subtitle_url(subtitle['subtitle_url'])
+    return None
+
+
+def build_space_video(video_data: dict) -> dict:
+    """把UP主投稿列表接口（vlist）中的一项转换为项目统一的视频信息字典"""
+    bvid = video_data.get('bvid', '')
+    return {
+        "title": video_data.get('title', ''),
+        "url": f"https://www.bilibili.com/video/{bvid}",
+        "date": datetime.fromtimestamp(video_data.get('created', 0)).strftime('%Y-%m-%d %H:%M'),
+        "created": video_data.get('created', 0),  # 发布时间戳，用于与时间窗口精确比较
+        "bvid": bvid,
+        "aid": video_data.get('aid'),
+        "play": video_data.get('play', 0),
+        "comment": video_data.get('comment', 0)
+    }
+
+
+def get_mixin_key(img_key: str, sub_key: str) -> str:
+    """按置换表打乱img_key+sub_key，取前32位作为签名用的mixin_key"""
+    raw = img_key + sub_key
+    return ''.join(raw[i] for i in WBI_MIXIN_KEY_ENC_TAB)[:32]
+
+
+def parse_wbi_keys(nav_data: dict):
+    """从nav接口响应中取出img_key与sub_key（未登录时code为-101，但仍返回wbi_img）"""
+    wbi_img = (nav_data.get('data') or {}).get('wbi_img') or {}
+    img_url, sub_url = wbi_img.get('img_url'), wbi_img.get('sub_url')
+    if not img_url or not sub_url:
+        raise ValueError(f"nav接口未返回WBI密钥: {nav_data.get('message', '未知错误')}")
+    return (img_url.rsplit('/', 1)[-1].split('.')[0],
+            sub_url.rsplit('/', 1)[-1].split('.')[0])
+
+
+def sign_wbi_params(params: dict, mixin_key: str, wts: int = None) -> dict:
+    """为请求参数添加wts与w_rid签名，返回新的参数字典"""
+    signed = dict(params)
+    signed['wts'] = int(time.time()) if wts is None else wts
+    signed = {
+        key: ''.join(c for c in str(signed[key]) if c not in WBI_FILTERED_CHARS)
+        for key in sorted(signed)
+    }
+    signed['w_rid'] = hashlib.md5((urlencode(signed) + mixin_key).encode('utf-8')).hexdigest()
+    return signed
+
+
+class WbiKeyCache:
+    """进程内共享的mixin_key缓存，同步与异步客户端共用，线程安全"""
+
+    def __init__(self, ttl_seconds: float = WBI_KEY_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._mixin_key = None
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        """返回未过期的mixin_key，没有时返回None"""
+        with self._lock:
+            if self._mixin_key and time.monotonic() - self._fetched_at < self.ttl_seconds:
+                return self._mixin_key
+            return None
+
+    def set(self, img_key: str, sub_key: str) -> str:
+        mixin_key = get_mixin_key(img_key, sub_key)
+        with self._lock:
+            self._mixin_key = mixin_key
+            self._fetched_at = time.monotonic()
+        return mixin_key
+
+    def invalidate(self):
+        with self._lock:
+            self._mixin_key = None
+
+
+_wbi_key_cache = WbiKeyCache()
+
+
+def get_wbi_key_cache() -> WbiKeyCache:
+    return _wbi_key_cache
+
+
+class BiliApiClient:
+    """共享的B站API客户端，持有一个带连接池与自动重试的Session，可在多线程中共用"""
+
+    def __init__(self, cookie_path: str = BILI_COOKIE_PATH, pool_size: int = BILI_API_POOL_SIZE,
+                 max_retries: int = BILI_API_MAX_RETRIES, timeout: float = BILI_API_TIMEOUT):
+        self.cookie_path = cookie_path
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(build_bili_headers())
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=BILI_API_BACKOFF_FACTOR,
+            status_forcelist=BILI_API_RETRY_STATUS,
+            allowed_methods=frozenset(["GET"]),
+            respect_retry_after_header=True,
+            raise_on_status=False  # 重试用尽后返回最后一次响应，由调用方按状态码处理
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._cookies = None
+        self._cookie_lock = threading.Lock()
+
+    @property
+    def cookies(self) -> dict:
+        """已加载的cookie（name -> value），首次访问时从cookie文件读取"""
+        if self._cookies is None:
+            with self._cookie_lock:
+                if self._cookies is None:
+                    self._load_cookies()
+        return self._cookies
+
+    def _load_cookies(self):
+        cookies = {}
+        try:
+            if os.path.exists(self.cookie_path):
+                with open(self.cookie_path, 'r', encoding='utf-8') as f:
+                    saved = json.load(f)
+                for cookie in saved:
+                    if 'name' in cookie and 'value' in cookie:
+                        cookies[cookie['name']] = cookie['value']
+                        self.session.cookies.set(cookie['name'], cookie['value'],
+                                                 domain=cookie.get('domain', ''), path=cookie.get('path', '/'))
+            else:
+                print("Cookie文件不存在，API请求将使用未登录状态")
+        except Exception as e:
+            print(f"加载cookie失败: {str(e)}")
+        self._cookies = cookies
+
+    def reload_cookies(self):
+        """cookie文件更新（重新登录）后调用，下次请求时重新读取"""
+        with self._cookie_lock:
+            self.session.cookies.clear()
+            self._cookies = None
+
+    def get(self, url: str, referer: str = None, origin: str = None, params=None, timeout: float = None,
+            **kwargs) -> requests.Response:
+        """发送GET请求，referer/origin为空时使用默认请求头"""
+        self.cookies  # 确保cookie已加载到会话
+        headers = None
+        if referer or origin:
+            headers = build_bili_headers(referer or "https://www.bilibili.com/",
+                                         origin or "https://www.bilibili.com")
+        return self.session.get(url, headers=headers, params=params, timeout=timeout or self.timeout, **kwargs)
+
+    def get_wbi_mixin_key(self, force_refresh: bool = False) -> str:
+        """取得WBI签名用的mixin_key，缓存过期或force_refresh时请求nav接口重新获取"""
+        cache = get_wbi_key_cache()
+        mixin_key = None if force_refresh else cache.get()
+        if mixin_key is None:
+            response = self.get(WBI_NAV_URL)
+            response.raise_for_status()
+            mixin_key = cache.set(*parse_wbi_keys(response.json()))
+        return mixin_key
+
+    def get_signed(self, url: str, params: dict, referer: str = None, origin: str = None,
+                   **kwargs) -> requests.Response:
+        """发送WBI签名的GET请求，签名校验失败时刷新密钥重试一次"""
+        response = None
+        for attempt in range(2):
+            signed = sign_wbi_params(params, self.get_wbi_mixin_key(force_refresh=attempt > 0))
+            response = self.get(url, referer=referer, origin=origin, params=signed, **kwargs)
+            try:
+                code = response.json().get('code')
+            except ValueError:
+                return response
+            if code not in WBI_RETRY_CODES:
+                return response
+            print(f"WBI签名校验失败（code {code}），刷新密钥后重试")
+        return response
+
+    def close(self):
+        self.session.close()
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_bili_api_client() -> BiliApiClient:
+    """获取进程内共享的B站API客户端"""
+    global _default_client
+    if _default_client is None:
+        with _default_client_lock:
+            if _default_client is None:
+                _default_client = BiliApiClient()
+    return _default_client
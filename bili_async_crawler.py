@@ -0,0 +1,330 @@
+"""
+B站异步爬虫模块 - 基于httpx.AsyncClient的视频列表、元数据与字幕流水线
+
+所有UP主的投稿列表并发获取，某个UP主的列表一返回，其中每个视频立即依次请求
+view（aid/cid/时长）→ player/wbi/v2（字幕列表）→ 字幕JSON，不等待其他UP主。
+每个域名有独立的并发上限（api.bilibili.com与字幕CDN分开），请求在单线程事件循环中复用同一连接池，
+UP主数量从几个扩展到上百个时总耗时主要取决于并发上限而不是串行等待。
+429、5xx、网络错误和"请求过于频繁"（code -799）按指数退避重试。
+
+提供时间窗口起点时，投稿列表按UP主水位（bili_watermark）增量获取：投稿逐个读取、分页按需请求，
+读到已见过的投稿或窗口起点之前的投稿即停止，高产UP主跨多页的投稿也能取全。
+
+结果与get_subtitle_urls_threaded的返回格式一致：有字幕时返回subtitle_content，无字幕时返回needs_transcription标记。
+"""
+
+import time
+import random
+import asyncio
+from urllib.parse import urlparse
+
+import httpx
+
+from bili_api import (build_bili_headers, select_subtitle_url, build_space_video, get_bili_api_client,
+                      get_wbi_key_cache, parse_wbi_keys, sign_wbi_params, SPACE_WBI_ARC_SEARCH_URL, WBI_NAV_URL,
+                      WBI_RETRY_CODES)
+from extract_subtitle import subtitle_json_to_text
+from transcript_store import get_video_bvid
+from bili_watermark import get_watermark_store, WATERMARK_PROBE_PAGE_SIZE, WATERMARK_MAX_PAGES
+
+BILI_ASYNC_HOST_LIMITS = {
+    "api.bilibili.com": 8,  # B站API并发上限，过高容易触发-799/412
+    "aisubtitle.hdslb.com": 16,  # 字幕CDN并发上限
+}
+BILI_ASYNC_DEFAULT_HOST_LIMIT = 4  # 未列出域名的并发上限
+BILI_ASYNC_TIMEOUT = 10  # 单次请求超时（秒）
+BILI_ASYNC_MAX_RETRIES = 3  # 单个请求的最大重试次数
+BILI_ASYNC_BACKOFF_BASE = 1.0  # 退避基数（秒）
+BILI_ASYNC_PAGE_SIZE = 10  # 投稿列表每页数量（没有水位时）
+BILI_ASYNC_UP_CONCURRENCY = 4  # 同时翻页获取投稿列表的UP主数上限
+BILI_ASYNC_RETRY_STATUS = (429, 500, 502, 503, 504)
+BILI_ASYNC_RETRY_CODES = (-799,)  # 请求过于频繁
+
+VIDEO_VIEW_URL = "https://api.bilibili.com/x/web-interface/view"
+PLAYER_URL = "https://api.bilibili.com/x/player/wbi/v2"
+
+
+class BiliThrottledError(Exception):
+    """接口返回请求过于频繁"""
+
+
+class BiliAsyncCrawler:
+    """异步B站爬虫，需在事件循环中通过 async with 使用
+
+    Args:
+        host_limits: 域名 -> 并发上限，未提供时使用BILI_ASYNC_HOST_LIMITS
+        cookies: 请求使用的cookie字典，None时使用共享API客户端已加载的cookie
+        watermarks: UP主水位记录，None时使用进程内共享的记录
+        timeout: 单次请求超时（秒）
+        max_retries: 单个请求的最大重试次数
+    """
+
+    def __init__(self, host_limits: dict = None, cookies: dict = None, timeout: float = BILI_ASYNC_TIMEOUT,
+                 max_retries: int = BILI_ASYNC_MAX_RETRIES, watermarks=None):
+        self.host_limits = dict(BILI_ASYNC_HOST_LIMITS if host_limits is None else host_limits)
+        self.cookies = get_bili_api_client().cookies if cookies is None else cookies
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.watermarks = get_watermark_store() if watermarks is None else watermarks
+        self.request_count = 0
+        self.retry_count = 0
+        self._semaphores = {}
+        self._client = None
+        self._wbi_lock = None
+        self._up_semaphore = None
+
+    async def __aenter__(self):
+        max_connections = sum(self.host_limits.values()) + BILI_ASYNC_DEFAULT_HOST_LIMIT
+        self._client = httpx.AsyncClient(
+            headers=build_bili_headers(),
+            cookies=self.cookies,
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            follow_redirects=True
+        )
+        self._wbi_lock = asyncio.Lock()
+        self._up_semaphore = asyncio.Semaphore(BILI_ASYNC_UP_CONCURRENCY)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self._client.aclose()
+        self._client = None
+
+    def _semaphore(self, url: str) -> asyncio.Semaphore:
+        host = urlparse(url).hostname or ""
+        if host not in self._semaphores:
+            self._semaphores[host] = asyncio.Semaphore(self.host_limits.get(host, BILI_ASYNC_DEFAULT_HOST_LIMIT))
+        return self._semaphores[host]
+
+    async def get_json(self, url: str, params: dict = None, referer: str = None, origin: str = None):
+        """在域名并发上限内请求JSON，可重试的错误按指数退避重试，最终失败时抛出最后一次异常"""
+        headers = build_bili_headers(referer, origin or "https://www.bilibili.com") if referer else None
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._semaphore(url):
+                    self.request_count += 1
+                    response = await self._client.get(url, params=params, headers=headers)
+                response.raise_for_status()
+                data = response.json()
+                if isinstance(data, dict) and data.get('code') in BILI_ASYNC_RETRY_CODES:
+                    raise BiliThrottledError(f"请求过于频繁（code {data.get('code')}）")
+                return data
+            except (httpx.TransportError, httpx.HTTPStatusError, BiliThrottledError) as e:
+                status = e.response.status_code if isinstance(e, httpx.HTTPStatusError) else None
+                if attempt >= self.max_retries or (status is not None and status not in BILI_ASYNC_RETRY_STATUS):
+                    raise
+                self.retry_count += 1
+                delay = random.uniform(0, BILI_ASYNC_BACKOFF_BASE * (2 ** attempt))
+                await asyncio.sleep(delay)
+
+    async def get_wbi_mixin_key(self, force_refresh: bool = False) -> str:
+        """取得WBI签名用的mixin_key，与同步客户端共用缓存，并发请求只触发一次nav请求"""
+        cache = get_wbi_key_cache()
+        async with self._wbi_lock:
+            mixin_key = None if force_refresh else cache.get()
+            if mixin_key is None:
+                mixin_key = cache.set(*parse_wbi_keys(await self.get_json(WBI_NAV_URL)))
+            return mixin_key
+
+    async def get_signed_json(self, url: str, params: dict, referer: str = None, origin: str = None):
+        """WBI签名请求，签名校验失败时刷新密钥重试一次"""
+        data = None
+        for attempt in range(2):
+            signed = sign_wbi_params(params, await self.get_wbi_mixin_key(force_refresh=attempt > 0))
+            data = await self.get_json(url, params=signed, referer=referer, origin=origin)
+            if data.get('code') not in WBI_RETRY_CODES:
+                return data
+            print(f"WBI签名校验失败（code {data.get('code')}），刷新密钥后重试")
+        return data
+
+    async def fetch_video_page(self, up_id: str, page: int, page_size: int):
+        """获取UP主投稿列表的一页（按发布时间倒序），接口返回错误时返回None"""
+        data = await self.get_signed_json(SPACE_WBI_ARC_SEARCH_URL,
+                                          params={"mid": up_id, "pn": page, "ps": page_size, "order": "pubdate"},
+                                          referer=f"https://space.bilibili.com/{up_id}/video",
+                                          origin="https://space.bilibili.com")
+        if data.get('code') != 0:
+            print(f"UP主 {up_id} 异步获取视频列表失败: {data.get('message', '未知错误')}")
+            return None
+        return ((data.get('data') or {}).get('list') or {}).get('vlist') or []
+
+    async def iter_up_videos(self, up_id: str, page_size: int = BILI_ASYNC_PAGE_SIZE,
+                             max_pages: int = WATERMARK_MAX_PAGES):
+        """按发布时间倒序逐个产出UP主的投稿，分页按需请求：调用方停止迭代后不再请求后续页；某页失败时抛出RuntimeError"""
+        for page in range(1, max_pages + 1):
+            vlist = await self.fetch_video_page(up_id, page, page_size)
+            if vlist is None:
+                raise RuntimeError(f"第{page}页获取失败")
+            for item in vlist:
+                yield build_space_video(item)
+            if len(vlist) < page_size:
+                return
+
+    async def take_new_videos(self, up_id: str, page_size: int, window_start: float):
+        """异步版的bili_watermark.take_new_videos：读到水位或窗口起点之前的投稿即停止，返回 (新投稿列表, 是否完整)"""
+        new_videos = []
+        pages = self.iter_up_videos(up_id, page_size)
+        try:
+            async for video in pages:
+                if self.watermarks.is_known(up_id, video.get('bvid'), video.get('created')):
+                    break
+                new_videos.append(video)
+                if video.get('created', 0) < window_start:
+                    break
+        except Exception as e:
+            print(f"UP主 {up_id} 投稿列表翻页中断: {str(e)}")
+            return new_videos, False
+        finally:
+            await pages.aclose()
+        return new_videos, True
+
+    async def fetch_up_videos(self, up_id: str, video_filter=None, page_size: int = BILI_ASYNC_PAGE_SIZE,
+                              window_start: float = None) -> list:
+        """获取UP主最新投稿，video_filter(video)返回False的视频被跳过
+
+        提供window_start（时间窗口起点的时间戳）时按水位增量获取：投稿逐个读取，读到水位或窗口起点之前即停止，
+        新投稿写入水位记录，返回记录中窗口内的全部投稿。同时翻页的UP主数受BILI_ASYNC_UP_CONCURRENCY限制
+        """
+        if window_start is None:
+            vlist = await self.fetch_video_page(up_id, 1, page_size)
+            videos = [build_space_video(item) for item in vlist or []]
+        else:
+            if self.watermarks.has_watermark(up_id):
+                page_size = WATERMARK_PROBE_PAGE_SIZE
+            async with self._up_semaphore:
+                new_videos, complete = await self.take_new_videos(up_id, page_size, window_start)
+            videos = self.watermarks.merge(up_id, new_videos, window_start, record=complete)
+            print(f"UP主 {up_id} 水位之后的新投稿 {len(new_videos)} 个")
+        if video_filter:
+            videos = [video for video in videos if video_filter(video)]
+        print(f"UP主 {up_id} 异步获取到 {len(videos)} 个限定时间内视频")
+        return videos
+
+    async def fetch_video_lists(self, up_ids: list, video_filter=None, window_start: float = None) -> list:
+        """并发获取多个UP主的投稿列表，返回合并后的视频信息列表"""
+
+        async def fetch_one(up_id):
+            try:
+                return await self.fetch_up_videos(up_id, video_filter, window_start=window_start)
+            except Exception as e:
+                print(f"UP主 {up_id} 异步获取视频列表异常：{str(e)}")
+                return []
+
+        return [video for videos in await asyncio.gather(*(fetch_one(up_id) for up_id in up_ids)) for video in videos]
+
+    async def fetch_subtitle(self, video: dict) -> dict:
+        """获取单个视频的元数据与字幕：view → player → 字幕JSON
+
+        Returns:
+            dict: 有字幕时 {'video', 'subtitle_content', 'subtitle_type': 'subtitle', 'cid'}；
+                  无字幕时 {'video', 'bvid', 'duration', 'needs_transcription': True}；失败时返回None
+        """
+        bvid = get_video_bvid(video)
+        if not bvid:
+            print(f"视频《{video['title']}》未能解析BV号，URL：{video.get('url')}")
+            return None
+        referer = f"https://www.bilibili.com/video/{bvid}"
+        try:
+            view = await self.get_json(VIDEO_VIEW_URL, params={"bvid": bvid}, referer=referer)
+            if view.get('code') != 0:
+                print(f"视频《{video['title']}》获取视频信息失败: {view.get('message', '未知错误')}")
+                return None
+            view_data = view['data']
+            player = await self.get_json(PLAYER_URL, params={"aid": view_data.get('aid'), "cid": view_data.get('cid')},
+                                         referer=referer)
+            subtitles = (((player.get('data') or {}).get('subtitle')) or {}).get('subtitles') or []
+            subtitle_url = select_subtitle_url(subtitles) if player.get('code') == 0 else None
+            if not subtitle_url:
+                print(f"视频《{video['title']}》无字幕，需要语音识别")
+                return {
+                    'video': video,
+                    'bvid': bvid,
+                    'duration': view_data.get('duration'),
+                    'needs_transcription': True
+                }
+            subtitle = subtitle_json_to_text(await self.get_json(subtitle_url))
+            print(f"视频《{video['title']}》字幕获取成功,字幕长度:{len(subtitle)}")
+            return {
+                'video': video,
+                'subtitle_content': subtitle,
+                'subtitle_type': 'subtitle',
+                'cid': view_data.get('cid')
+            }
+        except Exception as e:
+            print(f"视频《{video['title']}》异步获取字幕失败：{str(e)}")
+            return None
+
+    async def crawl_videos(self, videos: list, prefetched=None) -> list:
+        """并发获取一批视频的字幕，prefetched(video)返回结果字典时直接使用该结果、不发请求
+
+        prefetched通常会扫描目录、读取磁盘文件，放到默认线程池中执行，不阻塞事件循环中的其他请求
+        """
+        loop = asyncio.get_running_loop()
+
+        async def crawl_one(video):
+            ready = await loop.run_in_executor(None, prefetched, video) if prefetched else None
+            return ready if ready is not None else await self.fetch_subtitle(video)
+
+        results = await asyncio.gather(*(crawl_one(video) for video in videos))
+        return [result for result in results if result]
+
+    async def crawl(self, up_ids: list, video_filter=None, prefetched=None, window_start: float = None) -> dict:
+        """列表 → 元数据 → 字幕的完整流水线，每个UP主的列表返回后立即开始获取其视频字幕
+
+        Returns:
+            dict: {'videos': 视频信息列表, 'results': 字幕结果列表}
+        """
+
+        async def crawl_up(up_id):
+            try:
+                videos = await self.fetch_up_videos(up_id, video_filter, window_start=window_start)
+            except Exception as e:
+                print(f"UP主 {up_id} 异步获取视频列表异常：{str(e)}")
+                return [], []
+            return videos, await self.crawl_videos(videos, prefetched)
+
+        all_videos, all_results = [], []
+        for videos, results in await asyncio.gather(*(crawl_up(up_id) for up_id in up_ids)):
+            all_videos.extend(videos)
+            all_results.extend(results)
+        return {'videos': all_videos, 'results': all_results}
+
+
+def crawl_bilibili(up_ids: list, video_filter=None, prefetched=None, host_limits: dict = None,
+                   window_start: float = None) -> dict:
+    """同步入口：运行完整的异步流水线，返回 {'videos': 视频信息列表, 'results': 字幕结果列表}
+
+    提供window_start时视频列表按UP主水位增量获取（见bili_watermark）
+    """
+
+    async def run():
+        async with BiliAsyncCrawler(host_limits) as crawler:
+            started = time.perf_counter()
+            result = await crawler.crawl(up_ids, video_filter, prefetched, window_start)
+            print(f"异步爬取完成：{len(up_ids)} 个UP主，{len(result['videos'])} 个视频，"
+                  f"{crawler.request_count} 次请求（重试 {crawler.retry_count} 次），"
+                  f"耗时 {time.perf_counter() - started:.1f} 秒")
+            return result
+
+    return asyncio.run(run())
+
+
+def crawl_bilibili_video_lists(up_ids: list, video_filter=None, host_limits: dict = None,
+                               window_start: float = None) -> list:
+    """同步入口：并发获取多个UP主的投稿列表"""
+
+    async def run():
+        async with BiliAsyncCrawler(host_limits) as crawler:
+            return await crawler.fetch_video_lists(up_ids, video_filter, window_start)
+
+    return asyncio.run(run())
+
+
+def crawl_bilibili_subtitles(videos: list, prefetched=None, host_limits: dict = None) -> list:
+    """同步入口：并发获取已知视频列表的字幕，返回字幕结果列表"""
+
+    async def run():
+        async with BiliAsyncCrawler(host_limits) as crawler:
+            return await crawler.crawl_videos(videos, prefetched)
+
+    return asyncio.run(run())
@@ -3,23 +3,19 @@ import json
 import os
 import time
 import shutil
-from datetime import datetime, timedelta
+from datetime import datetime
 import concurrent.futures
 import threading
+import atexit
 
 import random
 import re
+import queue
+import itertools
 
 # 第三方库导入
 import requests
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
-from seleniumwire import webdriver  # 替换原生webdriver
+# selenium/selenium-wire在需要启动浏览器时才导入，纯API方式的运行不加载
 import subprocess
 import tempfile
 import os
@@ -27,13 +23,38 @@ import json
 
 from extract_subtitle import extract_subtitle_from_url
 from deepseek_summary import deepseek_summary
-from date_utils import get_current_analysis_date, ensure_archive_folder, print_date_info, get_friday_date_for_weekend
+from chunked_summary import map_reduce_summary
+from whisper_transcriber import (prewarm_whisper_model, transcribe_to_srt, transcribe_stream_to_srt, format_time,
+                                 WHISPER_SAMPLING_RATE)
+from transcript_store import get_transcript_store, get_video_bvid
+from bili_api import get_bili_api_client, select_subtitle_url, build_space_video
+from bili_async_crawler import crawl_bilibili, crawl_bilibili_video_lists, crawl_bilibili_subtitles
+from bili_watermark import get_watermark_store, take_new_videos, WATERMARK_PROBE_PAGE_SIZE, WATERMARK_MAX_PAGES
+from browser_pool import BrowserPool
+from browser_utils import (create_chrome_service, wait_for_page_ready, wait_for_element, RequestWatcher,
+                           clear_captured_requests)
+from date_utils import get_current_analysis_date, ensure_archive_folder, print_date_info
+from time_window import TimeWindow, get_time_window, refresh_time_window
 
 LIMIT_HOURS = 18  # 平时限定小时内（18小时），周末只收录周五收盘后发布的内容
+WHISPER_PREWARM = True  # 获取视频列表的同时在后台预加载whisper模型
+TRANSCRIBE_MAX_WORKERS = 1  # 语音识别队列的工作线程数（CPU密集，单个任务内部已按核数并行）
+SUMMARY_MAX_CONCURRENCY = 8  # 字幕总结并发数上限，实际请求速率由llm_rate_limiter统一控制
+BILI_BROWSER_POOL_SIZE = 2  # 浏览器池中已登录浏览器实例的上限
+BILI_BROWSER_MAX_USES = 20  # 单个浏览器实例的最大使用次数，达到后关闭重建
+BILI_BROWSER_HEADLESS = True  # 已有cookie时浏览器池使用无头模式（首次扫码登录仍打开可见窗口）
+SUBTITLE_BUTTON_TIMEOUT = 20  # 等待播放器字幕按钮可点击的超时（秒）
+SUBTITLE_REQUEST_TIMEOUT = 5  # 点击字幕按钮后等待字幕请求发出的超时（秒）
+BILI_WIRE_SCOPES = [r'.*aisubtitle\.hdslb\.com.*', r'.*api\.bilibili\.com.*']  # selenium-wire只抓取字幕与API请求
+BILI_WIRE_EXCLUDE_HOSTS = ['*.bilivideo.com', '*.bilivideo.cn', '*.akamaized.net']  # 视频分片CDN直连，不经过selenium-wire代理
+BILI_WIRE_MAX_STORED_REQUESTS = 50  # 内存中最多保存的请求数，超出后丢弃最早的请求
+SUBTITLE_BUTTON_ATTEMPTS = 3  # 点击字幕按钮的最大尝试次数
+BILI_VIDEO_LIST_MAX_WORKERS = 3  # API方式同时获取投稿列表的UP主数上限（每个UP主内部按页顺序请求）
+BILI_ASYNC_CRAWL = True  # API方式使用异步爬虫（bili_async_crawler），列表、元数据与字幕在一个事件循环中并发获取
 
 # 全局配置（集中管理）
 BILI_SPACE = "https://space.bilibili.com/"
-BILI_API = "https://api.bilibili.com/x/space/arc/search"
+BILI_API = "https://api.bilibili.com/x/space/wbi/arc/search"  # 需要WBI签名（见bili_api.sign_wbi_params）
 UP_MIDS = [
             "1609483218",  #江浙陈某
             #"2137589551", #李大霄
@@ -43,10 +64,16 @@ UP_MIDS = [
             "515688213", #连板
           ]  # B站UP主用户ID
 COOKIE_PATH = "bili_cookies.json"  # 统一cookie路径配置
+BILI_ADVICE_USERPROMPT = '''这些是最近一两天的财经博主内容总结，请基于以下所有总结内容，给出未来几天的投资建议，包括：\n1. 整体市场判断\n2. 重点行业/板块分析\n3. 具体投资策略\n4. 风险提示。\n\n请详细分析并以自然文本格式给出专业建议。\n\n最后，请将所有涉及到的重点关注的指数和股票以严格的JSON格式附加在末尾，格式如下：\n```json\n{\n    "indices": [\n        {"code": "000001", "name": "上证指数"},\n        {"code": "399006", "name": "创业板指"}\n    ],\n    "stocks": [\n        {"code": "600519", "name": "贵州茅台"},\n        {"code": "000858", "name": "五粮液"}\n    ]\n}\n```\n注意：\n1. 指数代码格式：上证指数"000001"，深证成指"399001"，创业板指"399006"，科创50"000688"等\n2. 股票代码格式：6位数字代码，如"600519"、"000001"等\n3. 只列出明确提到或强烈暗示值得关注的标的\n4. 如果没有相关标的，对应数组为空\n\n请开始分析：\n\n'''
 # 工具函数：浏览器初始化（反爬配置集中管理）
 # 修改setup_browser函数使用selenium-wire
-def setup_browser():
+def setup_browser(headless: bool = False):
+    from seleniumwire import webdriver  # 替换原生webdriver
+    
     options = webdriver.ChromeOptions()
+    if headless:
+        options.add_argument("--headless=new")
+        options.add_argument("--mute-audio")
     # 反指纹配置
     options.add_argument("--disable-blink-features=AutomationControlled")
     options.add_experimental_option("excludeSwitches", ["enable-automation"])
@@ -64,117 +91,44 @@ def setup_browser():
     # 初始化驱动
     # 使用selenium-wire的Chrome驱动
     driver = webdriver.Chrome(
-        service=Service(ChromeDriverManager().install()),
-        options=options
+        service=create_chrome_service(),  # 驱动路径缓存，不再每次检查版本
+        options=options,
+        seleniumwire_options={
+            'exclude_hosts': BILI_WIRE_EXCLUDE_HOSTS,
+            'request_storage': 'memory',
+            'request_storage_max_size': BILI_WIRE_MAX_STORED_REQUESTS
+        }
     )
+    # 范围外的请求直接透传，不保存也不经过拦截器
+    driver.scopes = BILI_WIRE_SCOPES
     # 设置浏览器窗口尺寸为100x100
     driver.set_window_size(800, 600)
     return driver
 
-# 工具函数：检查时间是否在限定小时内
+# 工具函数：检查时间是否在限定小时内（共享的time_window，每次运行只计算一次窗口）
 
-def is_within_limit_hours(publish_date: str) -> bool:
+def is_within_limit_hours(publish_date) -> bool:
     """
     检查发布时间是否在限定小时内
-    支持格式：'今天'、'X小时前'、'昨天'、'X天前'、'2025-01-01'等
-    周末运行时，收录周五收盘后所有时间的内容
-    周一早上9点前也使用周末逻辑（因为还未开盘）
+    支持格式：'刚刚'、'X分钟前'、'X小时前'、'今天'、'昨天 HH:MM'、'X天前'、'MM-DD'、'2025-01-01'、时间戳等
+    周末运行时（含周一早上9点前，因为还未开盘），收录周五收盘后所有时间的内容
     """
-    now = datetime.now()
-    
-    # 检查是否为周末 (周六或周日) 或周一早上9点前
-    weekday = now.weekday()  # 0=周一, 6=周日
-    is_weekend = weekday >= 5  # 5=周六, 6=周日
-    
-    # 周一早上9点前也使用周末逻辑
-    is_monday_early = weekday == 0 and now.hour < 9  # 周一且9点前
-    is_weekend_period = is_weekend or is_monday_early
-    
-    # 处理日期格式：'YYYY-MM-DD' 或 'MM-DD' 或 'M-D'
-    date_match = re.match(r'(\d{4}-)?(\d{1,2}-\d{1,2})', publish_date)
-    if date_match:
-        try:
-            date_part = date_match.group(2)  # 获取MM-DD部分
-            
-            # 如果有年份，直接使用；如果没有，使用当前年份
-            if date_match.group(1):
-                full_date_str = f"{date_match.group(1)}{date_part}"
-                video_date = datetime.strptime(full_date_str, '%Y-%m-%d')
-            else:
-                # 只有月日，使用当前年份
-                current_year = now.year
-                full_date_str = f"{current_year}-{date_part}"
-                video_date = datetime.strptime(full_date_str, '%Y-%m-%d')
-                
-                # 如果解析出的日期在未来，说明是去年的（比如1月1日刚过时）
-                if video_date > now:
-                    video_date = video_date.replace(year=current_year - 1)
-            
-            # 周末逻辑：收录周五收盘后所有内容
-            if is_weekend_period:
-                friday_date = get_friday_date_for_weekend(now)
-                friday_close_time = friday_date.replace(hour=15, minute=0, second=0, microsecond=0)
-                return video_date.date() >= friday_close_time.date()
-            else:
-                # 平时使用18小时限制
-                delta = now - video_date
-                hours_diff = delta.total_seconds() / 3600
-                return hours_diff <= LIMIT_HOURS
-        except ValueError:
-            return False
-
-    # 处理相对时间格式（今天、X小时前、X分钟前等）
-    if is_weekend_period:
-        friday_date = get_friday_date_for_weekend(now)
-        friday_close_time = friday_date.replace(hour=15, minute=0, second=0, microsecond=0)
-        
-        if "分钟" in publish_date or "今天" in publish_date:
-            return True
-            
-        if "小时前" in publish_date:
-            match = re.search(r'(\d+)小时前', publish_date)
-            if match:
-                hours = int(match.group(1))
-                publish_time = now - timedelta(hours=hours)
-                return publish_time >= friday_close_time
-            return True
-            
-        if "昨天" in publish_date:
-            return True
-            
-        if "天前" in publish_date:
-            match = re.search(r'(\d+)天前', publish_date)
-            if match:
-                days = int(match.group(1))
-                return days <= 2
-            return True
-            
-        return True
-    else:
-        # 平时的处理逻辑（周一至周五）
-        if "分钟" in publish_date:
-            return True
-        if "今天" in publish_date:
-            return True
-        if "小时前" in publish_date:
-            match = re.search(r'(\d+)小时前', publish_date)
-            if match:
-                hours = int(match.group(1))
-                return hours <= LIMIT_HOURS
-            return True  # 如果无法提取小时数，默认包含
-        if "昨天" in publish_date:
-            return True  # 昨天的内容总是包含
-        if "天前" in publish_date:
-            match = re.search(r'(\d+)天前', publish_date)
-            if match:
-                days = int(match.group(1))
-                return days <= 1  # 平时只包含昨天和今天的内容
-            return False
-            
-    return False  # 默认不包含
+    return get_time_window(LIMIT_HOURS).contains(publish_date)
+
+def get_limit_window_start(now: datetime = None) -> float:
+    """分析时间窗口起点的时间戳：平时为LIMIT_HOURS小时前，周末（含周一9点前）为周五收盘（15:00）"""
+    return (TimeWindow(now, LIMIT_HOURS) if now else get_time_window(LIMIT_HOURS)).start
+
+def parse_bili_publish_time(publish_date: str, now: datetime = None):
+    """把B站页面上的发布时间文字转换为时间戳，无法解析时返回None（只精确到天的日期取当天结束时刻）"""
+    return (TimeWindow(now, LIMIT_HOURS) if now else get_time_window(LIMIT_HOURS)).parse(publish_date)
 
 # 工具函数：登录与cookie管理（提前到主流程前定义）
 def login_and_save_cookie(driver) -> bool:
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    
     try:
         driver.get("https://www.bilibili.com")
         # 加载已保存的cookie
@@ -200,12 +154,90 @@ def login_and_save_cookie(driver) -> bool:
         # 保存新cookie
         with open(COOKIE_PATH, 'w', encoding='utf-8') as f:
             json.dump(driver.get_cookies(), f)
+        get_bili_api_client().reload_cookies()
         print("登录成功，已保存新cookie")
         return True
     return False
 
+def create_logged_in_browser():
+    """浏览器池的实例工厂：启动浏览器并完成登录，失败时返回None"""
+    headless = BILI_BROWSER_HEADLESS and os.path.exists(COOKIE_PATH)
+    driver = setup_browser(headless=headless)
+    try:
+        if login_and_save_cookie(driver):
+            return driver
+    except Exception as e:
+        print(f"浏览器登录异常：{str(e)}")
+    driver.quit()
+    return None
+
+_browser_pool = None
+_browser_pool_lock = threading.Lock()
+
+def get_bili_browser_pool() -> BrowserPool:
+    """获取进程内共享的B站浏览器池，实例在首次使用时才启动"""
+    global _browser_pool
+    if _browser_pool is None:
+        with _browser_pool_lock:
+            if _browser_pool is None:
+                _browser_pool = BrowserPool(create_logged_in_browser, max_size=BILI_BROWSER_POOL_SIZE,
+                                            max_uses=BILI_BROWSER_MAX_USES, reset=clear_captured_requests,
+                                            name="B站浏览器")
+                atexit.register(_browser_pool.close)
+    return _browser_pool
+
+def collect_window_videos(up_id: str, new_videos: list, window_start: float, record: bool = True) -> list:
+    """把水位之后的新投稿写入水位记录，返回记录中发布时间在时间窗口内的全部投稿
+    
+    record为False（翻页中途失败）时只合并、不推进水位，下次运行重新获取
+    """
+    videos = get_watermark_store().merge(up_id, new_videos, window_start, record=record)
+    print(f"UP主 {up_id} 水位之后的新投稿 {len(new_videos)} 个，限定时间内共 {len(videos)} 个视频")
+    for video in videos:
+        print(f"已添加限定时间内视频: {video['title']} ({video['date']})")
+    return videos
+
+def iter_videos_by_selenium(driver, up_id: str):
+    """按页面顺序（发布时间倒序）逐个产出UP主空间投稿页上的视频，调用方停止迭代后不再解析后续卡片"""
+    from selenium.webdriver.common.by import By
+    
+    for item in driver.find_elements(By.CSS_SELECTOR, 'div.upload-video-card.grid-mode'):
+        # 提取视频标题（保持原有逻辑）
+        title_elem = item.find_element(By.CSS_SELECTOR, '.bili-video-card__title a')
+        title = title_elem.text.strip()
+        
+        # 提取视频地址（保持原有逻辑）
+        link_elem = item.find_element(By.CSS_SELECTOR, 'a.bili-cover-card')
+        video_href = link_elem.get_attribute('href')
+        if video_href.startswith('//'):
+            video_url = f'https:{video_href}'
+        else:
+            video_url = video_href
+        
+        # 提取发布时间，转换为时间戳后与水位和时间窗口起点精确比较
+        date_elem = item.find_element(By.CSS_SELECTOR, '.bili-video-card__subtitle span')
+        publish_date = date_elem.text.strip()
+        created = parse_bili_publish_time(publish_date)
+        if created is None:
+            print(f"跳过无法解析发布时间的视频: {title} ({publish_date})")
+            continue
+        
+        yield {
+            "title": title,
+            "url": video_url,
+            "date": datetime.fromtimestamp(created).strftime('%Y-%m-%d %H:%M'),
+            "created": created,
+            "bvid": get_video_bvid({'url': video_url})
+        }
+
 # 主流程函数：获取UP主视频列表（逻辑清晰化）
-def get_videos_by_selenium(driver, up_id: str):
+def get_videos_by_selenium(driver, up_id: str, window_start: float = None):
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    
+    if window_start is None:
+        window_start = get_limit_window_start()
     # 步骤1：初始化浏览器
     try:
         # 步骤2：前置登录（现在由调用者确保登录状态）
@@ -216,63 +248,31 @@ def get_videos_by_selenium(driver, up_id: str):
         driver.get(video_page_url)
         print(f"访问URL：{video_page_url}")
         driver.refresh()
-        # 步骤4：加载视频列表（无需滚动，直接获取前3个）
+        # 步骤4：等待视频列表加载
         WebDriverWait(driver, 15).until(
             EC.presence_of_element_located((By.CSS_SELECTOR, 'div.upload-video-card.grid-mode'))
         )
-        # 直接获取所有视频项（无需滚动加载），取前5个
-        items = driver.find_elements(By.CSS_SELECTOR, 'div.upload-video-card.grid-mode')[:5]  # 关键修改：限制前3个
-        
-        # 提取每个视频的标题、URL和发布时间
-        videos = []
-        for item in items:  # 遍历前5个视频项
-            # 提取视频标题（保持原有逻辑）
-            title_elem = item.find_element(By.CSS_SELECTOR, '.bili-video-card__title a')
-            title = title_elem.text.strip()
-            
-            # 提取视频地址（保持原有逻辑）
-            link_elem = item.find_element(By.CSS_SELECTOR, 'a.bili-cover-card')
-            video_href = link_elem.get_attribute('href')
-            if video_href.startswith('//'):
-                video_url = f'https:{video_href}'
-            else:
-                video_url = video_href
-            
-            # 提取发布时间（保持原有逻辑）
-            date_elem = item.find_element(By.CSS_SELECTOR, '.bili-video-card__subtitle span')
-            publish_date = date_elem.text.strip()
-            
-            # 检查是否为限定小时内的视频（周末只收录周五收盘后发布的内容）
-            if is_within_limit_hours(publish_date):
-                videos.append({"title": title, "url": video_url, "date": publish_date})
-                print(f"已添加限定时间内视频: {title} ({publish_date})")
-            else:
-                print(f"跳过非限定时间内视频: {title} ({publish_date})")
-        return videos
+        # 逐个读取投稿卡片，遇到水位（已见过的投稿）或时间窗口之前的投稿即停止，不再限制固定条数
+        new_videos, complete = take_new_videos(get_watermark_store(), up_id,
+                                               iter_videos_by_selenium(driver, up_id), window_start)
+        return collect_window_videos(up_id, new_videos, window_start, record=complete)
     except Exception as e:
         print(f'爬取失败：{str(e)}')
         return []
 
 # 多线程版本：获取UP主视频列表
-def get_videos_by_selenium_threaded(up_ids: list, max_workers: int = 3):
+def get_videos_by_selenium_threaded(up_ids: list, max_workers: int = 3, window_start: float = None):
     """使用多线程并行获取多个UP主的视频列表"""
     all_videos = []
+    if window_start is None:
+        window_start = get_limit_window_start()
     
     def process_up_id(up_id):
         """处理单个UP主的视频列表获取"""
         try:
-            # 为每个线程创建独立的浏览器实例
-            driver = setup_browser()
-            logged_in = login_and_save_cookie(driver)
-            
-            if not logged_in:
-                print(f"UP主 {up_id} 登录失败")
-                driver.quit()
-                return []
-            
-            videos = get_videos_by_selenium(driver, up_id)
-            driver.quit()
-            return videos
+            # 从浏览器池取出已登录的实例，用完归还
+            with get_bili_browser_pool().driver() as driver:
+                return get_videos_by_selenium(driver, up_id, window_start)
         except Exception as e:
             print(f"UP主 {up_id} 处理失败：{str(e)}")
             return []
@@ -299,87 +299,85 @@ def get_videos_by_selenium_threaded(up_ids: list, max_workers: int = 3):
 
 # 主功能函数：获取字幕URL（复用现有浏览器实例）
 def get_subtitle_url(bvid: str, driver_video=None) -> str:
-    # 如果没有传入driver实例，则创建新的
+    from selenium.webdriver.common.by import By
+    
+    # 如果没有传入driver实例，则从浏览器池取出一个
     if driver_video is None:
-        driver_video = setup_browser()  # 初始化浏览器
-        LOGGED_IN_video  = login_and_save_cookie(driver_video)
-        should_quit = True  # 需要自己关闭浏览器
-    else:
-        LOGGED_IN_video = True  # 复用已登录的浏览器
-        should_quit = False  # 不需要自己关闭浏览器
+        with get_bili_browser_pool().driver() as driver_video:
+            return get_subtitle_url(bvid, driver_video)
     try:
-        # 登录前置（复用登录函数）
-        if not LOGGED_IN_video :
-            return None
-        # 访问视频页面
-        video_page_url = f'https://www.bilibili.com/video/{bvid}'
-        driver_video.get(video_page_url)
-        print(f"访问视频页面：{video_page_url}")
-
-        # 等待页面加载完成
-        time.sleep(10)
-        print("等待10秒后准备点击字幕按钮")
-
-        # 点击字幕按钮（循环6次，成功就跳出）
-        for attempt in range(6):
-            try:
-                subtitle_button = driver_video.find_element(By.CLASS_NAME, 'bpx-player-ctrl-subtitle')
-                subtitle_button.click()
-                print(f"已点击字幕按钮（第{attempt + 1}次尝试成功）")
-                time.sleep(2)
-                # 提取第一个匹配的请求URL
-                for request in driver_video.requests:
-                    if 'aisubtitle.hdslb.com' in request.url :
-                        print(f"找到字幕请求URL: {request.url}")
-                        # 直接返回请求URL
-                        return request.url
-                break
-            except Exception as e:
-                print(f"点击字幕按钮失败（第{attempt + 1}次尝试）")
-                if attempt < 4:  # 如果不是最后一次尝试，等待2秒后重试
-                    time.sleep(10)
-                else:
-                    print("字幕按钮点击尝试已达5次上限")
+        # 清空之前留下的抓包记录（调用方传入的实例不一定经过浏览器池的reset）
+        clear_captured_requests(driver_video)
+        # 拦截器在字幕请求发出的瞬间记录URL（播放器默认开启字幕时页面加载过程中就会请求）
+        with RequestWatcher(driver_video, 'aisubtitle.hdslb.com') as watcher:
+            # 访问视频页面
+            video_page_url = f'https://www.bilibili.com/video/{bvid}'
+            driver_video.get(video_page_url)
+            print(f"访问视频页面：{video_page_url}")
+            wait_for_page_ready(driver_video)
+            
+            for attempt in range(SUBTITLE_BUTTON_ATTEMPTS):
+                subtitle_url = watcher.wait(0)
+                if subtitle_url:
+                    print(f"找到字幕请求URL: {subtitle_url}")
+                    return subtitle_url
+                
+                # 等待字幕按钮可点击后立即点击，不再固定等待
+                subtitle_button = wait_for_element(driver_video, By.CLASS_NAME, 'bpx-player-ctrl-subtitle',
+                                                   timeout=SUBTITLE_BUTTON_TIMEOUT, clickable=True)
+                if subtitle_button is None:
+                    print(f"字幕按钮未出现（第{attempt + 1}次尝试）")
+                    continue
+                try:
+                    subtitle_button.click()
+                    print(f"已点击字幕按钮（第{attempt + 1}次尝试成功）")
+                except Exception as e:
+                    print(f"点击字幕按钮失败（第{attempt + 1}次尝试）")
+                    continue
+                
+                subtitle_url = watcher.wait(SUBTITLE_REQUEST_TIMEOUT)
+                if subtitle_url:
+                    print(f"找到字幕请求URL: {subtitle_url}")
+                    return subtitle_url
         print(f"未找到字幕请求URL")
         return None
     except Exception as e:
         print(f"获取字幕URL失败：{str(e)}")
-        # 打印所有请求URL以便调试
-        # print("所有请求URL:")
-        # for request in driver.requests:
-        #     print(f"- {request.url}")
         return None
-    finally:
-        # 只有自己创建的浏览器实例才需要关闭
-        if should_quit:
-            driver_video.quit()
 
-def run_bili_task(use_api_for_videos: bool = False):
-    """运行B站视频分析任务
+def fetch_bili_video_list(use_api_for_videos: bool = True, max_retries: int = 3):
+    """获取所有UP主限定时间内的视频列表（流水线阶段：获取列表）
     
     Args:
-        use_api_for_videos: 是否使用API方式获取视频列表，默认为True
-    """
-    pass
-
-    current_date, date_reason, archive_folder = get_current_analysis_date()
-    print_date_info()
+        use_api_for_videos: 是否使用API方式获取视频列表
+        max_retries: 未获取到视频时的最大尝试次数
     
-    ensure_archive_folder(archive_folder)
-
+    Returns:
+        list: 视频信息列表
+    """
+    if WHISPER_PREWARM:
+        # 列表获取需要较长时间，期间在后台加载模型，无字幕视频可直接开始识别
+        prewarm_whisper_model()
     
     print("开始使用多线程并行获取UP主视频列表...")
+    # 时间窗口由运行入口计算一次，各UP主按水位增量获取后与之精确比较
+    window = get_time_window(LIMIT_HOURS)
+    window_start = window.start
+    print(f"时间窗口：{window.describe()}")
     
-    max_retries = 3
     all_videos = []
-    
     for attempt in range(1, max_retries + 1):
-        if use_api_for_videos:
+        if use_api_for_videos and BILI_ASYNC_CRAWL:
+            print(f"使用异步API方式获取视频列表（第{attempt}次尝试）")
+            all_videos = crawl_bilibili_video_lists(UP_MIDS, is_video_within_limit_hours, window_start=window_start)
+        elif use_api_for_videos:
             print(f"使用API方式获取视频列表（第{attempt}次尝试）")
-            all_videos = get_videos_by_api_threaded(UP_MIDS, max_workers=1)
+            all_videos = get_videos_by_api_threaded(UP_MIDS, max_workers=BILI_VIDEO_LIST_MAX_WORKERS,
+                                                    window_start=window_start)
         else:
             print(f"使用浏览器方式获取视频列表（第{attempt}次尝试）")
-            all_videos = get_videos_by_selenium_threaded(UP_MIDS, max_workers=2)
+            all_videos = get_videos_by_selenium_threaded(UP_MIDS, max_workers=BILI_BROWSER_POOL_SIZE,
+                                                         window_start=window_start)
         
         print(f"总共获取到 {len(all_videos)} 个视频")
         
@@ -389,82 +387,319 @@ def run_bili_task(use_api_for_videos: bool = False):
         else:
             if attempt < max_retries:
                 print(f"第{attempt}次尝试未获取到视频，等待5秒后重试...")
-                import time
                 time.sleep(5)
             else:
                 print(f"已尝试{max_retries}次，仍未获取到视频列表")
     
-    if not all_videos:
-        print("没有找到任何新视频，程序结束")
+    return all_videos
+
+def is_video_within_limit_hours(video: dict) -> bool:
+    """异步爬虫使用的视频过滤条件，有发布时间戳时与时间窗口起点精确比较"""
+    if is_within_limit_hours(video['created'] if video.get('created') is not None else video['date']):
+        print(f"已添加限定时间内视频: {video['title']} ({video['date']})")
+        return True
+    print(f"跳过非限定时间内视频: {video['title']} ({video['date']})")
+    return False
+
+def find_existing_subtitle(video: dict, archive_folder: str, reuse_existing: bool = True):
+    """查找无需请求网络即可使用的字幕：当天归档中的字幕文件或字幕存储中的字幕，都没有时返回None
+    
+    reuse_existing为False时不使用当天归档中的字幕文件（可能已过期），只查字幕存储
+    """
+    subtitle_path = os.path.join(archive_folder, f"bili_{video['title']}.txt")
+    if reuse_existing and os.path.exists(subtitle_path):
+        print(f"视频《{video['title']}》字幕文件已存在，跳过获取字幕URL")
+        return {
+            'video': video,
+            'subtitle_url': 'local_file_exists'  # 特殊标记表示本地文件已存在
+        }
+    
+    # 按BV号查找字幕存储，之前任何一天获取或识别过的字幕都直接复用
+    stored_subtitle = get_transcript_store().get_transcript(get_video_bvid(video))
+    if stored_subtitle:
+        print(f"视频《{video['title']}》字幕存储中已有字幕，跳过获取字幕URL")
+        return {
+            'video': video,
+            'subtitle_content': stored_subtitle,
+            'subtitle_type': 'stored'
+        }
+    return None
+
+def save_bili_subtitle(result: dict, archive_folder: str, reuse_existing: bool = True):
+    """把字幕获取结果保存为归档文件夹中的字幕文件
+    
+    Args:
+        result: get_subtitle_urls_threaded / generate_subtitle_with_ytdlp_whisper 返回的结果
+        archive_folder: 归档文件夹路径
+        reuse_existing: 字幕文件已存在时是否直接复用，False时用本次结果覆盖
+    
+    Returns:
+        str: 字幕文件路径，失败时返回None
+    """
+    video = result['video']
+    subtitle_path = os.path.join(archive_folder, f"bili_{video['title']}.txt")
+    store = get_transcript_store()
+    bvid = get_video_bvid(video)
+    
+    # 检查字幕文件是否已存在
+    if reuse_existing and os.path.exists(subtitle_path):
+        print(f"视频《{video['title']}》字幕已存在，跳过提取")
+        # 归档中已有但字幕存储中没有的字幕补存一份，之后任何一天都可复用
+        if bvid and store.get_transcript(bvid) is None:
+            with open(subtitle_path, "r", encoding="utf-8") as f:
+                store.put_transcript(bvid, f.read(), title=video['title'], source="archive")
+        return subtitle_path
+    
+    # 处理不同类型的字幕结果
+    if 'subtitle_url' in result:
+        # 从subtitle_url提取字幕
+        subtitle = extract_subtitle_from_url(result['subtitle_url'])
+        if not subtitle:
+            print(f"视频《{video['title']}》字幕提取失败")
+            return None
+        print(f"视频《{video['title']}》字幕提取成功,字幕长度:{len(subtitle)}")
+        store.put_transcript(bvid, subtitle, title=video['title'], source="subtitle", cid=result.get('cid'))
+    elif 'subtitle_content' in result:
+        subtitle = result['subtitle_content']
+        if result.get('subtitle_type') == 'stored':
+            # 字幕存储中已有的字幕，直接写入当天归档
+            print(f"视频《{video['title']}》复用字幕存储中的字幕,字幕长度:{len(subtitle)}")
+        elif result.get('subtitle_type') == 'subtitle':
+            # 异步爬虫已下载的B站字幕
+            store.put_transcript(bvid, subtitle, title=video['title'], source="subtitle", cid=result.get('cid'))
+        else:
+            # 使用yt-dlp+whisper生成的字幕内容
+            print(f"视频《{video['title']}》使用语音识别生成字幕,字幕长度:{len(subtitle)}")
+            store.put_transcript(bvid, subtitle, title=video['title'], source="whisper")
+    else:
+        print(f"视频《{video['title']}》无有效字幕信息")
         return None
     
-    # 使用多线程并行获取所有视频的字幕URL（优先使用API方式）
-    print("开始使用多线程并行获取视频字幕URL（API方式）...")
-    subtitle_results = get_subtitle_urls_threaded(all_videos, archive_folder, max_workers=5, use_api=True)
-    print(f"成功获取到 {len(subtitle_results)} 个视频的字幕URL")
+    # 保存字幕到归档文件夹
+    with open(subtitle_path, "w", encoding="utf-8") as f:
+        f.write(subtitle)
+    print(f"字幕已保存到: {subtitle_path}")
+    return subtitle_path
+
+def fetch_bili_subtitles(videos: list, archive_folder: str, defer_transcription: bool = False,
+                         transcription_queue=None, subtitle_results: list = None, reuse_existing: bool = True):
+    """获取视频字幕并保存到归档文件夹（流水线阶段：获取内容）
+    
+    Args:
+        videos: 视频信息列表
+        archive_folder: 归档文件夹路径
+        defer_transcription: 为True时无字幕的视频不在此阶段语音识别，而是放入pending列表
+        transcription_queue: 无字幕的视频提交到该TranscriptionQueue异步识别
+        subtitle_results: 已由异步爬虫获取的字幕结果，提供时不再请求字幕
+        reuse_existing: 是否复用当天归档中已有的字幕文件（流水线中为False，以字幕内容哈希判断下游是否重跑）
     
-    # 处理获取到字幕的视频
+    Returns:
+        dict: {'subtitles': [{'video': 视频信息, 'path': 字幕文件路径}],
+               'pending': [{'video': 视频信息, 'bvid': BV号, 'duration': 时长秒数}]}
+    """
+    if subtitle_results is None and BILI_ASYNC_CRAWL:
+        print("开始使用异步爬虫获取视频字幕...")
+        subtitle_results = crawl_bilibili_subtitles(
+            videos, prefetched=lambda video: find_existing_subtitle(video, archive_folder, reuse_existing))
+    elif subtitle_results is None:
+        # 使用多线程并行获取所有视频的字幕URL（优先使用API方式）
+        print("开始使用多线程并行获取视频字幕URL（API方式）...")
+        subtitle_results = get_subtitle_urls_threaded(videos, archive_folder, max_workers=5, use_api=True,
+                                                      defer_transcription=defer_transcription,
+                                                      transcription_queue=transcription_queue,
+                                                      reuse_existing=reuse_existing)
+    print(f"成功获取到 {len(subtitle_results)} 个视频的字幕结果")
+    
+    subtitles = []
+    pending = []
     for result in subtitle_results:
         video = result['video']
-        
+        if result.get('needs_transcription'):
+            if defer_transcription:
+                pending.append({'video': video, 'bvid': result['bvid'], 'duration': result.get('duration')})
+                continue
+            if transcription_queue is not None:
+                transcription_queue.submit(video, result['bvid'], result.get('duration'))
+                continue
+            # 未提供语音识别队列时立即识别
+            result = generate_subtitle_with_ytdlp_whisper(result['bvid'], video, archive_folder,
+                                                          result.get('duration'))
+            if not result:
+                continue
         try:
-            # 检查字幕文件是否已存在
-            subtitle_path = os.path.join(archive_folder, f"bili_{video['title']}.txt")
-            if os.path.exists(subtitle_path):
-                print(f"视频《{video['title']}》字幕已存在，跳过提取")
-                # 读取已存在的字幕文件内容
-                with open(subtitle_path, "r", encoding="utf-8") as f:
-                    subtitle = f.read()
-                print(f"已读取现有字幕，长度:{len(subtitle)}")
-            else:
-                # 处理不同类型的字幕结果
-                if 'subtitle_url' in result:
-                    subtitle_url = result['subtitle_url']
-                    # 检查是否为本地文件已存在的标记
-                    if subtitle_url == 'local_file_exists':
-                        print(f"视频《{video['title']}》使用本地字幕文件")
-                    else:
-                        # 从subtitle_url提取字幕
-                        subtitle = extract_subtitle_from_url(subtitle_url)
-                        if not subtitle:
-                            print(f"视频《{video['title']}》字幕提取失败")
-                            continue
-                        else:
-                            print(f"视频《{video['title']}》字幕提取成功,字幕长度:{len(subtitle)}")
-                            # 保存字幕到归档文件夹
-                            with open(subtitle_path, "w", encoding="utf-8") as f:
-                                f.write(subtitle)
-                            print(f"字幕已保存到: {subtitle_path}")
-                elif 'subtitle_content' in result:
-                    # 使用yt-dlp+whisper生成的字幕内容
-                    subtitle = result['subtitle_content']
-                    print(f"视频《{video['title']}》使用语音识别生成字幕,字幕长度:{len(subtitle)}")
-                    # 保存字幕到归档文件夹
-                    with open(subtitle_path, "w", encoding="utf-8") as f:
-                        f.write(subtitle)
-                    print(f"字幕已保存到: {subtitle_path}")
-                else:
-                    print(f"视频《{video['title']}》无有效字幕信息")
-                    continue
-
-            # 检查总结文件是否已存在
-            summary_path = os.path.join(archive_folder, f"bili_{video['title']}_summary.txt")
-            if os.path.exists(summary_path):
-                print(f"视频《{video['title']}》总结已存在，跳过生成")
-            else:
-                print("使用deepseek总结")
-                summary = deepseek_summary(subtitle,
-                                            sysprompt = "你是一个专业的财经内容总结助手，擅长对视频字幕进行简洁明了的总结，并特别关注其中对于投资操作建议的内容。", 
-                                            userprompt = "请总结以下字幕内容：")
-                print(f"视频《{video['title']}》总结：{summary[:100]}...")
-                # 保存总结到归档文件夹
-                with open(summary_path, "w", encoding="utf-8") as f:
-                    f.write(summary)
-                print(f"总结已保存到: {summary_path}")
+            subtitle_path = save_bili_subtitle(result, archive_folder, reuse_existing)
+            if subtitle_path:
+                subtitles.append({'video': video, 'path': subtitle_path})
         except Exception as e:
             print(f"视频《{video['title']}》处理失败：{str(e)}")
     
-    #将所有总结一起给deepseek，让其给出后续投资建议
+    return {'subtitles': subtitles, 'pending': pending}
+
+def transcribe_pending_videos(pending: list, archive_folder: str, reuse_existing: bool = True):
+    """对没有字幕的视频使用yt-dlp+whisper生成字幕（流水线阶段：语音识别）
+    
+    Args:
+        pending: fetch_bili_subtitles返回的pending列表
+        archive_folder: 归档文件夹路径
+        reuse_existing: 字幕文件已存在时是否直接复用，False时用识别结果覆盖
+    
+    Returns:
+        list: [{'video': 视频信息, 'path': 字幕文件路径}]
+    """
+    transcription_queue = TranscriptionQueue(archive_folder, reuse_existing=reuse_existing)
+    for item in pending:
+        transcription_queue.submit(item['video'], item['bvid'], item.get('duration'))
+    return transcription_queue.wait()
+
+class TranscriptionQueue:
+    """独立的语音识别任务队列
+    
+    与字幕URL获取线程池分开，使用自己的有界工作线程；任务按视频时长从短到长调度（时长未知的排在最后），
+    先完成的短视频可以先进入总结。每个视频识别完成并保存字幕后调用on_done(video, subtitle_path)。
+    """
+    
+    def __init__(self, archive_folder: str, max_workers: int = TRANSCRIBE_MAX_WORKERS, on_done=None,
+                 reuse_existing: bool = True):
+        self.archive_folder = archive_folder
+        self.on_done = on_done
+        self.reuse_existing = reuse_existing
+        self._queue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._results = []
+        self._lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"bili_transcribe_{i}", daemon=True)
+            for i in range(max_workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+    
+    def submit(self, video: dict, bvid: str, duration=None):
+        """提交一个待语音识别的视频"""
+        priority = duration if duration else float('inf')
+        self._queue.put((priority, next(self._sequence), video, bvid, duration))
+    
+    def _worker(self):
+        while True:
+            _, _, video, bvid, duration = self._queue.get()
+            if video is None:
+                break
+            try:
+                result = generate_subtitle_with_ytdlp_whisper(bvid, video, self.archive_folder, duration)
+                subtitle_path = save_bili_subtitle(result, self.archive_folder, self.reuse_existing) if result else None
+                if subtitle_path:
+                    with self._lock:
+                        self._results.append({'video': video, 'path': subtitle_path})
+                    if self.on_done:
+                        self.on_done(video, subtitle_path)
+            except Exception as e:
+                print(f"视频《{video['title']}》语音识别失败：{str(e)}")
+    
+    def wait(self):
+        """不再接收新任务，等待队列中的任务全部完成，返回 [{'video': 视频信息, 'path': 字幕文件路径}]"""
+        # 结束标记排在所有任务之后
+        for _ in self._threads:
+            self._queue.put((float('inf'), next(self._sequence), None, None, None))
+        for thread in self._threads:
+            thread.join()
+        with self._lock:
+            return list(self._results)
+
+def summarize_one_subtitle(video: dict, subtitle_path: str, archive_folder: str, reuse_existing: bool = True):
+    """使用deepseek总结单个视频字幕并保存为_summary.txt
+    
+    reuse_existing为False时总结文件已存在也重新生成（字幕内容未变时由LLM缓存直接返回）
+    
+    Returns:
+        str: 总结文件路径，失败时返回None
+    """
+    try:
+        # 检查总结文件是否已存在
+        summary_path = os.path.join(archive_folder, f"bili_{video['title']}_summary.txt")
+        if reuse_existing and os.path.exists(summary_path):
+            print(f"视频《{video['title']}》总结已存在，跳过生成")
+            return summary_path
+        
+        with open(subtitle_path, "r", encoding="utf-8") as f:
+            subtitle = f.read()
+        print(f"已读取字幕，长度:{len(subtitle)}")
+        
+        print("使用deepseek总结")
+        summary = deepseek_summary(subtitle,
+                                    sysprompt = "你是一个专业的财经内容总结助手，擅长对视频字幕进行简洁明了的总结，并特别关注其中对于投资操作建议的内容。", 
+                                    userprompt = "请总结以下字幕内容：",
+                                    stage = "B站字幕总结")
+        print(f"视频《{video['title']}》总结：{summary[:100]}...")
+        # 保存总结到归档文件夹
+        with open(summary_path, "w", encoding="utf-8") as f:
+            f.write(summary)
+        print(f"总结已保存到: {summary_path}")
+        return summary_path
+    except Exception as e:
+        print(f"视频《{video['title']}》处理失败：{str(e)}")
+        return None
+
+class SummaryStage:
+    """并发字幕总结阶段
+    
+    字幕一提交就派发到有界线程池，请求速率与429退避由共享的llm_rate_limiter控制；
+    每个总结完成后立即写入_summary.txt，wait()只需等待最慢的一个总结。
+    """
+    
+    def __init__(self, archive_folder: str, max_concurrency: int = SUMMARY_MAX_CONCURRENCY,
+                 reuse_existing: bool = True):
+        self.archive_folder = archive_folder
+        self.reuse_existing = reuse_existing
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency,
+                                                               thread_name_prefix="bili_summary")
+        self._futures = []
+    
+    def submit(self, video: dict, subtitle_path: str):
+        """提交一个待总结的字幕文件"""
+        self._futures.append(self._executor.submit(summarize_one_subtitle, video, subtitle_path, self.archive_folder,
+                                                   self.reuse_existing))
+    
+    def wait(self):
+        """等待所有已提交的总结完成，返回成功的总结文件路径列表"""
+        summary_paths = []
+        try:
+            for future in concurrent.futures.as_completed(self._futures):
+                summary_path = future.result()
+                if summary_path:
+                    summary_paths.append(summary_path)
+        finally:
+            self._executor.shutdown(wait=True)
+        return summary_paths
+
+def summarize_bili_subtitles(subtitle_items: list, archive_folder: str,
+                             max_concurrency: int = SUMMARY_MAX_CONCURRENCY, reuse_existing: bool = True):
+    """使用deepseek并发总结所有字幕（流水线阶段：总结）
+    
+    Args:
+        subtitle_items: [{'video': 视频信息, 'path': 字幕文件路径}]
+        archive_folder: 归档文件夹路径
+        max_concurrency: 同时进行的总结请求数上限
+        reuse_existing: 总结文件已存在时是否直接复用（流水线中为False，字幕变化后重新总结）
+    
+    Returns:
+        list: 总结文件路径列表
+    """
+    stage = SummaryStage(archive_folder, max_concurrency=max_concurrency, reuse_existing=reuse_existing)
+    for item in subtitle_items:
+        stage.submit(item['video'], item['path'])
+    return stage.wait()
+
+def generate_bili_investment_advice(archive_folder: str, current_date: str, cancel_event=None):
+    """将所有总结一起给deepseek，生成投资建议（流水线阶段：投资建议）
+    
+    Args:
+        archive_folder: 归档文件夹路径
+        current_date: 分析日期
+        cancel_event: 生成期间被设置（任务超时）时不写入投资建议文件
+    
+    Returns:
+        str: 投资建议，没有任何总结或任务已取消时返回None
+    """
     print("收集所有总结文件...")
     all_summaries = []
     files = os.listdir(archive_folder)
@@ -473,6 +708,10 @@ def run_bili_task(use_api_for_videos: bool = False):
             filepath = os.path.join(archive_folder, file)
             with open(filepath, 'r', encoding='utf-8') as f:
                 all_summaries.append(f.read())
+    
+    if not all_summaries:
+        print("没有任何视频总结，跳过投资建议生成")
+        return None
 
     # 合并所有总结
     combined_summary = '\n\n'.join(all_summaries)
@@ -480,93 +719,89 @@ def run_bili_task(use_api_for_videos: bool = False):
 
     # 调用deepseek获取投资建议
     print("发送所有总结给deepseek，获取投资建议...")
-    investment_advice = deepseek_summary(
+    investment_advice = map_reduce_summary(
         combined_summary,
         sysprompt="你是一个专业的金融分析师，擅长基于多份市场分析报告给出投资建议。",
-        userprompt='''这些是最近一两天的财经博主内容总结，请基于以下所有总结内容，给出未来几天的投资建议，包括：\n1. 整体市场判断\n2. 重点行业/板块分析\n3. 具体投资策略\n4. 风险提示。\n\n请详细分析并以自然文本格式给出专业建议。\n\n最后，请将所有涉及到的重点关注的指数和股票以严格的JSON格式附加在末尾，格式如下：\n```json\n{\n    "indices": [\n        {"code": "000001", "name": "上证指数"},\n        {"code": "399006", "name": "创业板指"}\n    ],\n    "stocks": [\n        {"code": "600519", "name": "贵州茅台"},\n        {"code": "000858", "name": "五粮液"}\n    ]\n}\n```\n注意：\n1. 指数代码格式：上证指数"000001"，深证成指"399001"，创业板指"399006"，科创50"000688"等\n2. 股票代码格式：6位数字代码，如"600519"、"000001"等\n3. 只列出明确提到或强烈暗示值得关注的标的\n4. 如果没有相关标的，对应数组为空\n\n请开始分析：\n\n'''
+        userprompt=BILI_ADVICE_USERPROMPT,
+        stage="B站投资建议"
     )
 
+    if cancel_event is not None and cancel_event.is_set():
+        print("B站任务已取消，不保存投资建议")
+        return None
+    
     # 保存投资建议到归档文件夹
     advice_path = os.path.join(archive_folder, f"bili_投资建议_{current_date}.txt")
     with open(advice_path, "w", encoding="utf-8") as f:
         f.write(investment_advice)
     print(f"投资建议已保存到: {advice_path}")
+    return investment_advice
+
+def run_bili_task(use_api_for_videos: bool = True, reuse_existing: bool = True, cancel_event=None):
+    """运行B站视频分析任务
+    
+    Args:
+        use_api_for_videos: 是否使用API方式（WBI签名）获取视频列表，默认为True；False时使用浏览器方式
+        reuse_existing: 是否复用当天归档中已有的字幕与总结文件，False时全部重新生成
+        cancel_event: 被设置（任务超时）时在下一个阶段前停止，不再总结、不写入投资建议
+    """
+    current_date, date_reason, archive_folder = get_current_analysis_date()
+    print_date_info()
+    
+    ensure_archive_folder(archive_folder)
+    
+    subtitle_results = None
+    if use_api_for_videos and BILI_ASYNC_CRAWL:
+        # 列表 → 元数据 → 字幕一个异步流水线，某个UP主的列表返回后立即开始获取其视频字幕
+        if WHISPER_PREWARM:
+            prewarm_whisper_model()
+        window = get_time_window(LIMIT_HOURS)
+        print(f"时间窗口：{window.describe()}")
+        crawl_result = crawl_bilibili(UP_MIDS, is_video_within_limit_hours,
+                                      prefetched=lambda video: find_existing_subtitle(video, archive_folder,
+                                                                                      reuse_existing),
+                                      window_start=window.start)
+        all_videos, subtitle_results = crawl_result['videos'], crawl_result['results']
+    else:
+        all_videos = fetch_bili_video_list(use_api_for_videos)
+    if not all_videos:
+        print("没有找到任何新视频，程序结束")
+        return None
+    if cancel_event is not None and cancel_event.is_set():
+        print("B站任务已取消，停止获取字幕")
+        return None
+    
+    # 有字幕的视频立即进入总结；无字幕的视频进入独立的语音识别队列，识别完成后再提交总结
+    summary_stage = SummaryStage(archive_folder, reuse_existing=reuse_existing)
+    transcription_queue = TranscriptionQueue(archive_folder, on_done=summary_stage.submit,
+                                             reuse_existing=reuse_existing)
+    subtitle_result = fetch_bili_subtitles(all_videos, archive_folder, transcription_queue=transcription_queue,
+                                           subtitle_results=subtitle_results, reuse_existing=reuse_existing)
+    for item in subtitle_result['subtitles']:
+        summary_stage.submit(item['video'], item['path'])
+    transcription_queue.wait()
+    summary_stage.wait()
+    if cancel_event is not None and cancel_event.is_set():
+        print("B站任务已取消，跳过投资建议生成")
+        return None
+    
+    investment_advice = generate_bili_investment_advice(archive_folder, current_date, cancel_event)
     
     print("B站任务完成")
     return investment_advice
 
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
 # 工具函数：加载cookie用于API请求
 def load_cookies_for_api():
-    """从cookie文件加载cookie，用于API请求"""
-    try:
-        if os.path.exists(COOKIE_PATH):
-            with open(COOKIE_PATH, 'r', encoding='utf-8') as f:
-                cookies = json.load(f)
-                
-            # 将cookie转换为requests库可用的格式
-            cookie_dict = {}
-            for cookie in cookies:
-                if 'name' in cookie and 'value' in cookie:
-                    cookie_dict[cookie['name']] = cookie['value']
-            
-            return cookie_dict
-        else:
-            print("Cookie文件不存在，API请求将使用未登录状态")
-            return {}
-    except Exception as e:
-        print(f"加载cookie失败: {str(e)}")
-        return {}
+    """返回共享API客户端已加载的cookie（cookie文件只读取一次）"""
+    return get_bili_api_client().cookies
 
 def get_video_info_via_api(bvid: str):
     """通过B站API获取视频信息，包括aid和cid"""
     url = f'https://api.bilibili.com/x/web-interface/view?bvid={bvid}'
     
-    # 添加合适的请求头来避免412错误
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        'Referer': f'https://www.bilibili.com/video/{bvid}',
-        'Origin': 'https://www.bilibili.com',
-        'Accept': 'application/json, text/plain, */*',
-        'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-        'Accept-Encoding': 'gzip, deflate, br',
-    }
-    
-    # 加载cookie用于API请求
-    cookies = load_cookies_for_api()
-    
     try:
-        response = requests.get(url, headers=headers, cookies=cookies, timeout=10)
+        # 共享会话复用连接与cookie，Referer避免412错误
+        response = get_bili_api_client().get(url, referer=f'https://www.bilibili.com/video/{bvid}')
         response.raise_for_status()
         data = response.json()
         
@@ -591,10 +826,16 @@ def get_video_info_via_api(bvid: str):
         print(f"API获取视频信息异常: {str(e)}")
         return None
 
-def get_subtitle_url_via_api(bvid: str):
-    """通过B站API获取字幕URL"""
+def get_subtitle_url_via_api(bvid: str, video_info: dict = None):
+    """通过B站API获取字幕URL
+    
+    Args:
+        bvid: 视频BV号
+        video_info: 已获取的get_video_info_via_api结果，未提供时重新获取
+    """
     # 首先获取视频信息
-    video_info = get_video_info_via_api(bvid)
+    if not video_info:
+        video_info = get_video_info_via_api(bvid)
     if not video_info:
         return None
     
@@ -604,21 +845,8 @@ def get_subtitle_url_via_api(bvid: str):
     # 使用获取到的aid和cid请求字幕信息
     subtitle_url = f'https://api.bilibili.com/x/player/wbi/v2?aid={aid}&cid={cid}'
     
-    # 添加合适的请求头
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        'Referer': f'https://www.bilibili.com/video/{bvid}',
-        'Origin': 'https://www.bilibili.com',
-        'Accept': 'application/json, text/plain, */*',
-        'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-        'Accept-Encoding': 'gzip, deflate, br',
-    }
-    
-    # 加载cookie用于API请求
-    cookies = load_cookies_for_api()
-    
     try:
-        response = requests.get(subtitle_url, headers=headers, cookies=cookies, timeout=10)
+        response = get_bili_api_client().get(subtitle_url, referer=f'https://www.bilibili.com/video/{bvid}')
         response.raise_for_status()
         data = response.json()
         
@@ -633,32 +861,11 @@ def get_subtitle_url_via_api(bvid: str):
             for i, subtitle in enumerate(subtitles):
                 print(f"  字幕 {i+1}: lan={subtitle.get('lan')}, lan_doc={subtitle.get('lan_doc')}")
             
-            for subtitle in subtitles:
-                if subtitle.get('lan') == 'ai-zh':
-                    subtitle_url = subtitle.get('subtitle_url')
-                    if subtitle_url:
-                        # 确保URL是完整的
-                        if subtitle_url.startswith('//'):
-                            subtitle_url = f'https:{subtitle_url}'
-                        elif not subtitle_url.startswith('http'):
-                            subtitle_url = f'https://{subtitle_url}'
-                        
-                        print(f"找到AI中文字幕URL: {subtitle_url}")
-                        return subtitle_url
-            
-            # 如果没有找到ai-zh字幕，尝试其他中文字幕
-            for subtitle in subtitles:
-                if subtitle.get('lan_doc') == '中文' or subtitle.get('lan') == 'zh':
-                    subtitle_url = subtitle.get('subtitle_url')
-                    if subtitle_url:
-                        # 确保URL是完整的
-                        if subtitle_url.startswith('//'):
-                            subtitle_url = f'https:{subtitle_url}'
-                        elif not subtitle_url.startswith('http'):
-                            subtitle_url = f'https://{subtitle_url}'
-                        
-                        print(f"找到中文字幕URL: {subtitle_url}")
-                        return subtitle_url
+            # 优先AI生成的中文字幕 (lan: "ai-zh")，其次其他中文字幕
+            subtitle_url = select_subtitle_url(subtitles)
+            if subtitle_url:
+                print(f"找到中文字幕URL: {subtitle_url}")
+                return subtitle_url
             
             print(f"视频 {bvid} 没有找到可用的字幕")
             return None
@@ -671,7 +878,9 @@ def get_subtitle_url_via_api(bvid: str):
         return None
 
 # 改进的多线程版本：获取多个视频的字幕URL（支持API方式）
-def get_subtitle_urls_threaded(videos: list, archive_folder: str, max_workers: int = 3, use_api: bool = True):
+def get_subtitle_urls_threaded(videos: list, archive_folder: str, max_workers: int = 3, use_api: bool = True,
+                               defer_transcription: bool = False, transcription_queue=None,
+                               reuse_existing: bool = True):
     """使用多线程并行获取多个视频的字幕URL，可选择使用API或浏览器方式
     
     Args:
@@ -679,21 +888,19 @@ def get_subtitle_urls_threaded(videos: list, archive_folder: str, max_workers: i
         archive_folder: 归档文件夹路径
         max_workers: 最大线程数
         use_api: 是否使用API方式
+        defer_transcription: API方式无字幕时不立即语音识别，而是返回带needs_transcription标记的结果
+        transcription_queue: API方式无字幕时把视频提交到该TranscriptionQueue，本线程立即返回
+        reuse_existing: 是否复用当天归档中已有的字幕文件
     """
     subtitle_results = []
     
     def process_video(video):
         """处理单个视频的字幕URL获取"""
         try:
-            # 检查字幕文件是否已存在
-            subtitle_path = os.path.join(archive_folder, f"bili_{video['title']}.txt")
-            
-            if os.path.exists(subtitle_path):
-                print(f"视频《{video['title']}》字幕文件已存在，跳过获取字幕URL")
-                return {
-                    'video': video,
-                    'subtitle_url': 'local_file_exists'  # 特殊标记表示本地文件已存在
-                }
+            # 当天归档或字幕存储中已有字幕时直接使用
+            existing = find_existing_subtitle(video, archive_folder, reuse_existing)
+            if existing:
+                return existing
             
             # 从video['url']中提取BVID
             url = video['url']
@@ -705,18 +912,33 @@ def get_subtitle_urls_threaded(videos: list, archive_folder: str, max_workers: i
                 return None
             
             if use_api:
-                # 使用API方式获取字幕URL
-                subtitle_url = get_subtitle_url_via_api(bvid)
+                # 使用API方式获取字幕URL，视频时长用于语音识别队列的排序
+                video_info = get_video_info_via_api(bvid)
+                duration = ((video_info or {}).get('data') or {}).get('duration')
+                subtitle_url = get_subtitle_url_via_api(bvid, video_info)
                 if subtitle_url:
                     print(f"视频《{video['title']}》API字幕URL获取成功")
                     return {
                         'video': video,
-                        'subtitle_url': subtitle_url
+                        'subtitle_url': subtitle_url,
+                        'cid': (video_info or {}).get('cid')
+                    }
+                elif defer_transcription:
+                    print(f"视频《{video['title']}》API方式无字幕，加入待语音识别列表")
+                    return {
+                        'video': video,
+                        'bvid': bvid,
+                        'duration': duration,
+                        'needs_transcription': True
                     }
+                elif transcription_queue is not None:
+                    print(f"视频《{video['title']}》API方式无字幕，加入语音识别队列")
+                    transcription_queue.submit(video, bvid, duration)
+                    return None
                 else:
                     print(f"视频《{video['title']}》API方式无字幕，尝试使用ytdlp+whisper方式")
                     # API方式失败时回退到yt-dlp+whisper方式
-                    return generate_subtitle_with_ytdlp_whisper(bvid, video, archive_folder)
+                    return generate_subtitle_with_ytdlp_whisper(bvid, video, archive_folder, duration)
             else:
                 # 使用浏览器方式获取字幕URL
                 return get_subtitle_url_browser_fallback(bvid, video, archive_folder)
@@ -734,17 +956,8 @@ def get_subtitle_urls_threaded(videos: list, archive_folder: str, max_workers: i
             archive_folder: 归档文件夹路径
         """
         try:
-            # 创建独立的浏览器实例
-            driver = setup_browser()
-            logged_in = login_and_save_cookie(driver)
-            
-            if not logged_in:
-                print(f"视频 {video['title']} 登录失败")
-                driver.quit()
-                return None
-            
-            subtitle_url = get_subtitle_url(bvid, driver)
-            driver.quit()
+            # 使用浏览器池中已登录的实例
+            subtitle_url = get_subtitle_url(bvid)
             
             if subtitle_url:
                 print(f"视频《{video['title']}》浏览器字幕URL获取成功")
@@ -777,14 +990,17 @@ def get_subtitle_urls_threaded(videos: list, archive_folder: str, max_workers: i
     return subtitle_results
     
 
-def get_videos_by_api(up_id: str, page: int = 1, page_size: int = 10, max_retries: int = 3):
-    """使用API获取UP主视频列表
+def get_video_page_by_api(up_id: str, page: int = 1, page_size: int = 10, max_retries: int = 3):
+    """使用API获取UP主投稿列表的一页（按发布时间倒序）
     
     Args:
         up_id: UP主ID
         page: 页码，默认为1
-        page_size: 每页数量，默认为30
+        page_size: 每页数量，默认为10
         max_retries: 最大重试次数，默认为3
+    
+    Returns:
+        list: 接口返回的投稿列表（vlist），失败时返回None
     """
     for attempt in range(max_retries):
         try:
@@ -792,29 +1008,21 @@ def get_videos_by_api(up_id: str, page: int = 1, page_size: int = 10, max_retrie
             cookies = load_cookies_for_api()
             if not cookies:
                 print(f"UP主 {up_id} API请求失败：无法加载cookie")
-                return []
-            
-            # 构建API URL
-            api_url = f"https://api.bilibili.com/x/space/arc/search?mid={up_id}&pn={page}&ps={page_size}"
-            
-            # 设置请求头
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                'Referer': f'https://space.bilibili.com/{up_id}/video',
-                'Origin': 'https://space.bilibili.com'
-            }
+                return None
             
             print(f"API请求UP主 {up_id} 的视频列表，页码: {page} (尝试 {attempt + 1}/{max_retries})")
             
-            # 发送API请求
-            response = requests.get(api_url, headers=headers, cookies=cookies, timeout=10)
+            # 发送WBI签名的API请求（共享会话，连接与cookie复用）
+            response = get_bili_api_client().get_signed(
+                BILI_API, params={'mid': up_id, 'pn': page, 'ps': page_size, 'order': 'pubdate'},
+                referer=f'https://space.bilibili.com/{up_id}/video', origin='https://space.bilibili.com')
             
             if response.status_code != 200:
                 print(f"API请求失败，状态码: {response.status_code}")
                 if attempt < max_retries - 1:
                     time.sleep(2)  # 等待2秒后重试
                     continue
-                return []
+                return None
             
             data = response.json()
             
@@ -829,65 +1037,77 @@ def get_videos_by_api(up_id: str, page: int = 1, page_size: int = 10, max_retrie
                         print(f"频率限制，等待 {wait_time} 秒后重试...")
                         time.sleep(wait_time)
                         continue
-                return []
-            
-            # 解析视频列表
-            videos = []
-            vlist = data.get('data', {}).get('list', {}).get('vlist', [])
-            
-            for video_data in vlist:
-                title = video_data.get('title', '')
-                bvid = video_data.get('bvid', '')
-                created_timestamp = video_data.get('created', 0)
-                
-                # 转换时间戳为日期字符串
-                created_date = datetime.fromtimestamp(created_timestamp).strftime('%Y-%m-%d %H:%M')
-                
-                # 构建视频URL
-                video_url = f"https://www.bilibili.com/video/{bvid}"
-                
-                # 检查是否为限定小时内的视频（周末只收录周五收盘后发布的内容）
-                if is_within_limit_hours(created_date):
-                    videos.append({
-                        "title": title,
-                        "url": video_url,
-                        "date": created_date,
-                        "bvid": bvid,
-                        "aid": video_data.get('aid'),
-                        "play": video_data.get('play', 0),
-                        "comment": video_data.get('comment', 0)
-                    })
-                    print(f"已添加限定时间内视频: {title} ({created_date})")
-                else:
-                    print(f"跳过非限定时间内视频: {title} ({created_date})")
+                return None
             
-            print(f"API获取到 {len(videos)} 个限定时间内视频")
-            return videos
+            return ((data.get('data') or {}).get('list') or {}).get('vlist') or []
             
         except requests.exceptions.RequestException as e:
             print(f"API网络请求异常: {e}")
             if attempt < max_retries - 1:
                 time.sleep(2)
                 continue
-            return []
+            return None
         except Exception as e:
             print(f"API处理异常: {e}")
             if attempt < max_retries - 1:
                 time.sleep(2)
                 continue
-            return []
+            return None
     
-    return []
+    return None
 
-# 多线程版本：获取UP主视频列表（API方式）
-def get_videos_by_api_threaded(up_ids: list, max_workers: int = 1):
+def iter_videos_by_api(up_id: str, page_size: int = 10, max_retries: int = 3, start_page: int = 1,
+                       max_pages: int = WATERMARK_MAX_PAGES):
+    """按发布时间倒序逐个产出UP主的投稿，分页按需请求：调用方停止迭代后不再请求后续页
+    
+    某页获取失败时抛出RuntimeError
+    """
+    for page in range(start_page, start_page + max_pages):
+        vlist = get_video_page_by_api(up_id, page, page_size, max_retries)
+        if vlist is None:
+            raise RuntimeError(f"第{page}页获取失败")
+        for video_data in vlist:
+            yield build_space_video(video_data)
+        if len(vlist) < page_size:
+            return
+
+def get_videos_by_api(up_id: str, page: int = 1, page_size: int = 10, max_retries: int = 3,
+                      window_start: float = None):
+    """使用API获取UP主限定时间内的视频列表，按水位增量获取
+    
+    投稿按发布时间倒序逐个读取，读到已见过的投稿或时间窗口起点之前的投稿即停止，不会多请求一页；
+    已有水位时每页只请求WATERMARK_PROBE_PAGE_SIZE个投稿。新投稿写入水位记录，
+    返回记录中发布时间在时间窗口内的全部投稿（发布时间戳精确比较）
+    
+    Args:
+        up_id: UP主ID
+        page: 起始页码，默认为1
+        page_size: 没有水位时的每页数量，默认为10
+        max_retries: 每页的最大重试次数，默认为3
+        window_start: 时间窗口起点的时间戳，默认由get_limit_window_start计算
+    """
+    if window_start is None:
+        window_start = get_limit_window_start()
+    store = get_watermark_store()
+    if store.has_watermark(up_id):
+        page_size = WATERMARK_PROBE_PAGE_SIZE
+    
+    new_videos, complete = take_new_videos(store, up_id, iter_videos_by_api(up_id, page_size, max_retries, page),
+                                           window_start)
+    videos = collect_window_videos(up_id, new_videos, window_start, record=complete)
+    print(f"API获取到 {len(videos)} 个限定时间内视频")
+    return videos
+
+def get_videos_by_api_threaded(up_ids: list, max_workers: int = 1, window_start: float = None):
     """使用多线程并行获取多个UP主的视频列表（API方式）"""
     all_videos = []
+    if window_start is None:
+        window_start = get_limit_window_start()
     
     def process_up_id(up_id):
         """处理单个UP主的视频列表获取"""
         try:
-            videos = get_videos_by_api(up_id)
+            videos = get_videos_by_api(up_id, window_start=window_start)
             return videos
         except Exception as e:
             print(f"UP主 {up_id} API处理失败：{str(e)}")
@@ -928,6 +1148,77 @@ def get_videos_by_api_threaded(up_ids: list, max_workers: int = 1):
 
 
 
+YTDLP_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+YTDLP_TIMEOUT = 1800  # yt-dlp下载超时（30分钟）
+AUDIO_STREAMING = True  # 无字幕视频通过yt-dlp→ffmpeg管道直接把音频流送入语音识别，不落盘WAV
+AUDIO_STREAM_BLOCK_SECONDS = 30  # 流式读取时每个PCM数据块的时长
+
+def find_ffmpeg_location():
+    """返回ffmpeg所在目录；ffmpeg在系统PATH中或找不到时返回None"""
+    # 尝试检测ffmpeg位置，如果失败则不指定路径
+    try:
+        import shutil
+        if shutil.which('ffmpeg'):
+            # ffmpeg在系统PATH中，无需额外配置
+            return None
+        # 尝试常见路径
+        common_ffmpeg_paths = [
+            "D:\\Program Files\\MediaCoder\\codecs64\\ffmpeg.exe",
+            "C:\\ffmpeg\\bin\\ffmpeg.exe",
+            "C:\\Program Files\\ffmpeg\\bin\\ffmpeg.exe"
+        ]
+        for ffmpeg_path in common_ffmpeg_paths:
+            if os.path.exists(ffmpeg_path):
+                return os.path.dirname(ffmpeg_path)
+    except:
+        pass
+    return None
+
+def build_ytdlp_common_args(output_dir: str) -> list:
+    """yt-dlp的公共参数：请求头、cookies、ffmpeg位置"""
+    args = [
+        '--user-agent', YTDLP_USER_AGENT,
+        '--add-header', 'Referer:https://www.bilibili.com',
+        '--add-header', 'Origin:https://www.bilibili.com',
+        '--no-check-certificate',  # 不检查证书
+    ]
+    
+    # 加载cookies文件（如果存在）
+    if os.path.exists(COOKIE_PATH):
+        # 将浏览器cookies转换为Netscape格式（yt-dlp需要的格式）
+        try:
+            with open(COOKIE_PATH, 'r', encoding='utf-8') as f:
+                cookies = json.load(f)
+            
+            # 确保输出目录存在
+            os.makedirs(output_dir, exist_ok=True)
+            
+            # 创建临时cookies文件（Netscape格式）
+            cookies_txt_path = os.path.join(output_dir, 'cookies.txt')
+            with open(cookies_txt_path, 'w', encoding='utf-8') as f:
+                f.write("# Netscape HTTP Cookie File\n")
+                for cookie in cookies:
+                    if 'name' in cookie and 'value' in cookie:
+                        domain = cookie.get('domain', '.bilibili.com')
+                        path = cookie.get('path', '/')
+                        secure = 'TRUE' if cookie.get('secure', False) else 'FALSE'
+                        # Netscape cookies 格式: domain domain_specified path secure expiration name value
+                        # domain_specified: TRUE if domain starts with '.', FALSE otherwise
+                        domain_specified = 'TRUE' if domain.startswith('.') else 'FALSE'
+                        f.write(f"{domain}\t{domain_specified}\t{path}\t{secure}\t0\t{cookie['name']}\t{cookie['value']}\n")
+            
+            args.extend(['--cookies', cookies_txt_path])
+            print("已加载cookies文件用于yt-dlp下载")
+        except Exception as e:
+            print(f"加载cookies失败: {str(e)}，将使用未登录状态下载")
+    else:
+        print(f"Cookie文件不存在: {COOKIE_PATH}，将使用未登录状态下载")
+    
+    ffmpeg_location = find_ffmpeg_location()
+    if ffmpeg_location:
+        args.extend(['--ffmpeg-location', ffmpeg_location])
+    return args
+
 def download_video_with_ytdlp(video_url: str, output_dir: str) -> str:
     """使用yt-dlp下载视频音频
     
@@ -945,71 +1236,15 @@ def download_video_with_ytdlp(video_url: str, output_dir: str) -> str:
             '-x',  # 提取音频
             '--audio-format', 'wav',  # 转换为wav格式
             '--audio-quality', '0',  # 最高质量
-            '--user-agent', 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            '--add-header', 'Referer:https://www.bilibili.com',
-            '--add-header', 'Origin:https://www.bilibili.com',
             '--ignore-errors',  # 忽略错误继续下载（处理充电视频）
-            '--no-check-certificate',  # 不检查证书
             '--output', os.path.join(output_dir, '%(title)s.%(ext)s'),
         ]
-        
-        # 加载cookies文件（如果存在）
-        if os.path.exists(COOKIE_PATH):
-            # 将浏览器cookies转换为Netscape格式（yt-dlp需要的格式）
-            try:
-                with open(COOKIE_PATH, 'r', encoding='utf-8') as f:
-                    cookies = json.load(f)
-                
-                # 确保输出目录存在
-                os.makedirs(output_dir, exist_ok=True)
-                
-                # 创建临时cookies文件（Netscape格式）
-                cookies_txt_path = os.path.join(output_dir, 'cookies.txt')
-                with open(cookies_txt_path, 'w', encoding='utf-8') as f:
-                    f.write("# Netscape HTTP Cookie File\n")
-                    for cookie in cookies:
-                        if 'name' in cookie and 'value' in cookie:
-                            domain = cookie.get('domain', '.bilibili.com')
-                            path = cookie.get('path', '/')
-                            secure = 'TRUE' if cookie.get('secure', False) else 'FALSE'
-                            # Netscape cookies 格式: domain domain_specified path secure expiration name value
-                            # domain_specified: TRUE if domain starts with '.', FALSE otherwise
-                            domain_specified = 'TRUE' if domain.startswith('.') else 'FALSE'
-                            f.write(f"{domain}\t{domain_specified}\t{path}\t{secure}\t0\t{cookie['name']}\t{cookie['value']}\n")
-                
-                cmd.extend(['--cookies', cookies_txt_path])
-                print("已加载cookies文件用于yt-dlp下载")
-            except Exception as e:
-                print(f"加载cookies失败: {str(e)}，将使用未登录状态下载")
-        else:
-            print(f"Cookie文件不存在: {COOKIE_PATH}，将使用未登录状态下载")
-        
+        cmd.extend(build_ytdlp_common_args(output_dir))
         cmd.append(video_url)
         
-        # 尝试检测ffmpeg位置，如果失败则不指定路径
-        try:
-            import shutil
-            if shutil.which('ffmpeg'):
-                # ffmpeg在系统PATH中，无需额外配置
-                pass
-            else:
-                # 尝试常见路径
-                common_ffmpeg_paths = [
-                    "D:\\Program Files\\MediaCoder\\codecs64\\ffmpeg.exe",
-                    "C:\\ffmpeg\\bin\\ffmpeg.exe",
-                    "C:\\Program Files\\ffmpeg\\bin\\ffmpeg.exe"
-                ]
-                for ffmpeg_path in common_ffmpeg_paths:
-                    if os.path.exists(ffmpeg_path):
-                        cmd.insert(1, '--ffmpeg-location')
-                        cmd.insert(2, os.path.dirname(ffmpeg_path))
-                        break
-        except:
-            pass
-        
         print(f"开始下载音频: {video_url}")
         print(f"yt-dlp命令: {' '.join(cmd)}")
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=1800)  # 30分钟超时
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=YTDLP_TIMEOUT)
         
         print(f"yt-dlp返回码: {result.returncode}")
         print(f"yt-dlp标准输出: {result.stdout[:500]}")  # 只显示前500字符避免日志过长
@@ -1026,7 +1261,7 @@ def download_video_with_ytdlp(video_url: str, output_dir: str) -> str:
                 cmd_retry.insert(2, 'worst[ext=mp4]/worst')
                 
                 print(f"重试命令: {' '.join(cmd_retry)}")
-                result_retry = subprocess.run(cmd_retry, capture_output=True, text=True, timeout=1800)
+                result_retry = subprocess.run(cmd_retry, capture_output=True, text=True, timeout=YTDLP_TIMEOUT)
                 
                 print(f"重试返回码: {result_retry.returncode}")
                 if result_retry.stdout:
@@ -1073,6 +1308,83 @@ def download_video_with_ytdlp(video_url: str, output_dir: str) -> str:
         print(f"yt-dlp下载异常: {e}")
         return None
 
+def stream_audio_with_ytdlp(video_url: str, output_dir: str, block_seconds: float = AUDIO_STREAM_BLOCK_SECONDS):
+    """通过yt-dlp→ffmpeg管道边下载边解码音频，逐块产出16kHz单声道float32采样数组，不写音频文件
+    
+    yt-dlp把最佳音频流写到标准输出，ffmpeg从管道读取并转为16kHz单声道PCM；
+    HTTP 412且尚未收到数据时改用最低质量格式重试一次。
+    
+    Args:
+        video_url: 视频URL
+        output_dir: cookies.txt的存放目录
+        block_seconds: 每个数据块的时长
+    
+    Raises:
+        RuntimeError: yt-dlp或ffmpeg执行失败
+    """
+    import numpy as np
+    
+    common_args = build_ytdlp_common_args(output_dir)
+    ffmpeg_location = find_ffmpeg_location()
+    ffmpeg_bin = os.path.join(ffmpeg_location, 'ffmpeg') if ffmpeg_location else 'ffmpeg'
+    ffmpeg_cmd = [ffmpeg_bin, '-loglevel', 'error', '-i', 'pipe:0',
+                  '-f', 's16le', '-ac', '1', '-ar', str(WHISPER_SAMPLING_RATE), 'pipe:1']
+    block_bytes = int(block_seconds * WHISPER_SAMPLING_RATE) * 2
+    
+    for audio_format in ('bestaudio/best', 'worst[ext=mp4]/worst'):
+        ytdlp_cmd = ['yt-dlp', '-f', audio_format, '--quiet', '--no-progress', '--no-part',
+                     *common_args, '--output', '-', video_url]
+        print(f"开始流式获取音频: {video_url}（格式: {audio_format}）")
+        ytdlp_err = tempfile.TemporaryFile()
+        ffmpeg_err = tempfile.TemporaryFile()
+        ytdlp = subprocess.Popen(ytdlp_cmd, stdout=subprocess.PIPE, stderr=ytdlp_err)
+        ffmpeg = subprocess.Popen(ffmpeg_cmd, stdin=ytdlp.stdout, stdout=subprocess.PIPE, stderr=ffmpeg_err)
+        ytdlp.stdout.close()  # 只由ffmpeg持有读取端，ffmpeg退出时yt-dlp能收到SIGPIPE
+        # 超时后结束两个进程，读取循环随之结束
+        watchdog = threading.Timer(YTDLP_TIMEOUT, lambda: (ytdlp.kill(), ffmpeg.kill()))
+        watchdog.start()
+        
+        received = 0
+        pending = b''
+        try:
+            while True:
+                data = ffmpeg.stdout.read(block_bytes)
+                if not data:
+                    break
+                data = pending + data
+                # 管道可能返回奇数字节，多出的半个采样留到下一块
+                usable = len(data) - len(data) % 2
+                pending = data[usable:]
+                received += usable
+                if usable:
+                    yield np.frombuffer(data[:usable], dtype=np.int16).astype(np.float32) / 32768.0
+            ffmpeg.wait()
+            ytdlp.wait()
+        finally:
+            watchdog.cancel()
+            for process in (ffmpeg, ytdlp):
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+            ffmpeg.stdout.close()
+        
+        ytdlp_err.seek(0)
+        ytdlp_stderr = ytdlp_err.read().decode('utf-8', errors='replace')
+        ffmpeg_err.seek(0)
+        ffmpeg_stderr = ffmpeg_err.read().decode('utf-8', errors='replace')
+        ytdlp_err.close()
+        ffmpeg_err.close()
+        
+        if ytdlp.returncode == 0 and ffmpeg.returncode == 0:
+            print(f"音频流接收完成: {received / 2 / WHISPER_SAMPLING_RATE / 60:.1f} 分钟")
+            return
+        if received == 0 and 'HTTP Error 412' in ytdlp_stderr:
+            print("检测到HTTP 412错误，尝试获取较低质量版本...")
+            continue
+        raise RuntimeError(f"音频流获取失败（yt-dlp返回码: {ytdlp.returncode}，ffmpeg返回码: {ffmpeg.returncode}）: "
+                           f"{(ytdlp_stderr or ffmpeg_stderr)[:500]}")
+    raise RuntimeError("音频流获取失败: HTTP 412")
+
 def transcribe_audio_with_whisper(audio_path: str, output_dir: str) -> str:
     """使用faster-whisper进行语音识别
     
@@ -1092,46 +1404,14 @@ def transcribe_audio_with_whisper(audio_path: str, output_dir: str) -> str:
             print(f"字幕文件已存在，跳过生成: {srt_path}")
             return srt_path
         
-        # 检查是否安装了faster-whisper
+        # CPU上的长音频在静音处切段并行转写，其余情况使用进程内共享的模型顺序转写
+        print(f"开始语音识别: {audio_path}")
         try:
-            from faster_whisper import WhisperModel
+            transcribe_to_srt(audio_path, srt_path)
         except ImportError:
             print("未安装faster-whisper，请运行: pip install faster-whisper")
             return None
         
-        # 检测GPU可用性并选择设备
-        try:
-            import torch
-            if torch.cuda.is_available():
-                device = "cuda"
-                compute_type = "float16"  # GPU上使用float16以获得更好性能
-                print("检测到GPU可用，使用CUDA设备进行语音识别")
-            else:
-                device = "cpu"
-                compute_type = "int8"
-                print("未检测到GPU，使用CPU进行语音识别")
-        except ImportError:
-            device = "cpu"
-            compute_type = "int8"
-            print("torch未安装，使用CPU进行语音识别")
-        
-        # 初始化模型（使用small模型，速度较快）
-        print(f"加载faster-whisper模型 (设备: {device}, 计算类型: {compute_type})...")
-        model = WhisperModel("small", device=device, compute_type=compute_type)
-        
-        print(f"开始语音识别: {audio_path}")
-        segments, info = model.transcribe(audio_path, beam_size=5, language="zh")
-        
-        with open(srt_path, 'w', encoding='utf-8') as f:
-            for i, segment in enumerate(segments, 1):
-                # 转换时间格式
-                start_time = format_time(segment.start)
-                end_time = format_time(segment.end)
-                
-                f.write(f"{i}\n")
-                f.write(f"{start_time} --> {end_time}\n")
-                f.write(f"{segment.text}\n\n")
-        
         print(f"字幕生成成功: {srt_path}")
         return srt_path
         
@@ -1139,13 +1419,6 @@ def transcribe_audio_with_whisper(audio_path: str, output_dir: str) -> str:
         print(f"语音识别异常: {e}")
         return None
 
-def format_time(seconds: float) -> str:
-    """将秒数格式化为SRT时间格式"""
-    hours = int(seconds // 3600)
-    minutes = int((seconds % 3600) // 60)
-    seconds = seconds % 60
-    return f"{hours:02d}:{minutes:02d}:{seconds:06.3f}".replace('.', ',')
-
 def extract_text_from_srt(srt_content: str) -> str:
     """从SRT字幕内容中提取纯文本，去除时间标签等无关元素
     
@@ -1186,18 +1459,48 @@ def extract_text_from_srt(srt_content: str) -> str:
     # 用换行符连接所有文本行
     return '\n'.join(text_lines)
 
-def generate_subtitle_with_ytdlp_whisper(bvid: str, video: dict, archive_folder: str) -> dict:
+def read_srt_text(srt_path: str) -> str:
+    """读取SRT字幕并提取纯文本，随后删除SRT文件"""
+    # 读取字幕内容
+    with open(srt_path, 'r', encoding='utf-8') as f:
+        srt_content = f.read()
+    
+    # 提取纯文本内容，去除时间标签等无关元素
+    subtitle_content = extract_text_from_srt(srt_content)
+    
+    print(f"字幕文件已保存到: {srt_path}")
+    
+    # 删除SRT文件（已提取内容，不再需要）
+    try:
+        if os.path.exists(srt_path):
+            os.remove(srt_path)
+            print(f"已删除SRT字幕文件: {srt_path}")
+    except Exception as delete_error:
+        print(f"删除SRT字幕文件失败: {delete_error}")
+    return subtitle_content
+
+def generate_subtitle_with_ytdlp_whisper(bvid: str, video: dict, archive_folder: str, duration=None) -> dict:
     """使用yt-dlp+faster-whisper方式生成字幕
     
     Args:
         bvid: 视频BV号
         video: 视频信息字典
         archive_folder: 归档文件夹路径
+        duration: 视频时长（秒），已知时用于决定流式识别是否使用并行进程池
         
     Returns:
         dict: 包含视频和字幕URL的信息
     """
     try:
+        stored_subtitle = get_transcript_store().get_transcript(bvid)
+        if stored_subtitle:
+            print(f"视频《{video['title']}》字幕存储中已有字幕，跳过语音识别")
+            return {
+                'video': video,
+                'subtitle_content': stored_subtitle,
+                'subtitle_type': 'stored'
+            }
+        
         print(f"视频《{video['title']}》使用yt-dlp+whisper方式生成字幕")
         
         # 直接使用归档文件夹，不再使用临时目录
@@ -1206,6 +1509,25 @@ def generate_subtitle_with_ytdlp_whisper(bvid: str, video: dict, archive_folder:
         audio_filename = "".join(c for c in audio_filename if c.isalnum() or c in (' ', '-', '_', '.')).rstrip()
         audio_path = os.path.join(archive_folder, audio_filename)
         
+        if AUDIO_STREAMING:
+            # 音频流经ffmpeg管道直接送入语音识别，不写WAV文件，下载未结束时识别就已开始
+            srt_path = os.path.splitext(audio_path)[0] + '.srt'
+            try:
+                transcribe_stream_to_srt(stream_audio_with_ytdlp(video['url'], archive_folder), srt_path,
+                                         duration_seconds=duration)
+                return {
+                    'video': video,
+                    'subtitle_content': read_srt_text(srt_path),
+                    'subtitle_type': 'whisper_generated'
+                }
+            except ImportError:
+                print("未安装faster-whisper，请运行: pip install faster-whisper")
+                return None
+            except Exception as stream_error:
+                print(f"流式语音识别失败: {stream_error}，改为下载音频文件后识别")
+                if os.path.exists(srt_path):
+                    os.remove(srt_path)
+        
         # 下载音频到归档文件夹
         audio_path = download_video_with_ytdlp(video['url'], archive_folder)
         if not audio_path or not os.path.exists(audio_path):
@@ -1227,31 +1549,7 @@ def generate_subtitle_with_ytdlp_whisper(bvid: str, video: dict, archive_folder:
                 print(f"删除音频文件失败: {delete_error}")
             return None
         
-        # 读取字幕内容
-        with open(srt_path, 'r', encoding='utf-8') as f:
-            srt_content = f.read()
-        
-        # 提取纯文本内容，去除时间标签等无关元素
-        subtitle_content = extract_text_from_srt(srt_content)
-        
-        print(f"字幕文件已保存到: {srt_path}")
-        
-        # 删除SRT文件（已提取内容，不再需要）
-        try:
-            if os.path.exists(srt_path):
-                os.remove(srt_path)
-                print(f"已删除SRT字幕文件: {srt_path}")
-        except Exception as delete_error:
-            print(f"删除SRT字幕文件失败: {delete_error}")
-        
-        # 清理GPU内存（如果使用GPU）
-        try:
-            import torch
-            if torch.cuda.is_available():
-                torch.cuda.empty_cache()
-                print("已清理GPU内存缓存")
-        except:
-            pass
+        subtitle_content = read_srt_text(srt_path)
         
         # 删除音频文件，保留字幕文件
         try:
@@ -1289,18 +1587,8 @@ def get_subtitle_url_browser_fallback(bvid, video, archive_folder: str = None):
         archive_folder: 归档文件夹路径
     """
     try:
-        # 创建独立的浏览器实例
-        driver = setup_browser()
-        logged_in = login_and_save_cookie(driver)
-        
-        if not logged_in:
-            print(f"视频 {video['title']} 登录失败")
-            driver.quit()
-            # 登录失败时尝试使用yt-dlp+whisper方式
-            return generate_subtitle_with_ytdlp_whisper(bvid, video, archive_folder)
-        
-        subtitle_url = get_subtitle_url(bvid, driver)
-        driver.quit()
+        # 使用浏览器池中已登录的实例（登录失败时抛出异常，转为yt-dlp+whisper方式）
+        subtitle_url = get_subtitle_url(bvid)
         
         if subtitle_url:
             print(f"视频《{video['title']}》浏览器字幕URL获取成功")
@@ -1318,5 +1606,6 @@ def get_subtitle_url_browser_fallback(bvid, video, archive_folder: str = None):
         return generate_subtitle_with_ytdlp_whisper(bvid, video, archive_folder)
 
 if __name__ == "__main__":
-    run_bili_task(use_api_for_videos=False)
+    refresh_time_window(LIMIT_HOURS)
+    run_bili_task(use_api_for_videos=True)
     
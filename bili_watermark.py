@@ -0,0 +1,141 @@
+"""
+UP主投稿水位模块 - 按UP主持久化已见过的投稿，视频列表增量获取
+
+每个UP主记录最新一条投稿的BV号与发布时间戳（水位），以及近几天见过的投稿。
+获取列表时按发布时间倒序逐个读取投稿（分页按需请求），遇到水位以内的投稿（已记录的BV号或早于水位时间）
+或早于时间窗口起点的投稿即停止，不再请求后续页；
+新投稿写入记录后，与记录中的投稿一起按发布时间戳和分析时间窗口起点精确比较，
+当天多次运行时每个UP主只需一次小分页请求，之前运行见过的窗口内视频也不会丢失。
+"""
+
+import os
+import json
+import time
+import threading
+
+WATERMARK_FILE = ".bili_watermarks.json"  # 水位记录文件
+WATERMARK_RETENTION_SECONDS = 7 * 24 * 3600  # 投稿记录保留时长（7天），覆盖长假的时间窗口
+WATERMARK_PROBE_PAGE_SIZE = 5  # 已有水位时每页请求的投稿数，通常第一页就能碰到水位
+WATERMARK_MAX_PAGES = 10  # 单个UP主单次运行最多翻页数（长假期间高产UP主的投稿也能取全）
+
+
+class UpWatermarkStore:
+    """UP主投稿水位记录，线程安全，每次更新后写入文件
+
+    记录格式：{up_id: {'last_bvid', 'last_created', 'checked_at', 'videos': {bvid: 视频信息}}}，
+    视频信息需包含bvid与created（发布时间戳）。
+    """
+
+    def __init__(self, path: str = WATERMARK_FILE, retention_seconds: float = WATERMARK_RETENTION_SECONDS):
+        self.path = path
+        self.retention_seconds = retention_seconds
+        self._lock = threading.Lock()
+        self._data = self._load()
+
+    def _load(self) -> dict:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"读取UP主水位记录失败，将全量获取视频列表: {str(e)}")
+            return {}
+
+    def _save(self):
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"写入UP主水位记录失败: {str(e)}")
+
+    def has_watermark(self, up_id) -> bool:
+        with self._lock:
+            return str(up_id) in self._data
+
+    def is_known(self, up_id, bvid: str, created: float = None) -> bool:
+        """投稿是否在水位以内：BV号已记录，或发布时间早于水位时间"""
+        with self._lock:
+            entry = self._data.get(str(up_id))
+            if not entry:
+                return False
+            if bvid and bvid in entry['videos']:
+                return True
+            return created is not None and created < entry.get('last_created', 0)
+
+    def update(self, up_id, videos: list):
+        """记录新见到的投稿，推进水位并淘汰超过保留时长的记录（水位对应的投稿始终保留）"""
+        now = time.time()
+        with self._lock:
+            entry = self._data.setdefault(str(up_id), {'last_bvid': None, 'last_created': 0, 'videos': {}})
+            for video in videos:
+                if video.get('bvid') and video.get('created') is not None:
+                    entry['videos'][video['bvid']] = dict(video)
+                    if video['created'] >= entry['last_created']:
+                        entry['last_bvid'], entry['last_created'] = video['bvid'], video['created']
+            entry['videos'] = {
+                bvid: video for bvid, video in entry['videos'].items()
+                if now - video['created'] <= self.retention_seconds or bvid == entry['last_bvid']
+            }
+            entry['checked_at'] = now
+            self._save()
+
+    def merge(self, up_id, new_videos: list, window_start: float, record: bool = True) -> list:
+        """合并水位之后的新投稿与记录中的投稿，返回时间窗口内的全部投稿（按发布时间倒序）
+
+        record为False时只合并不写入记录（翻页中途失败、新投稿可能不完整，推进水位会漏掉未取到的投稿）
+        """
+        if record:
+            self.update(up_id, new_videos)
+            return self.videos_since(up_id, window_start)
+        videos = {video['bvid']: video for video in self.videos_since(up_id, window_start)}
+        for video in new_videos:
+            if video.get('bvid') and video.get('created', 0) >= window_start:
+                videos[video['bvid']] = dict(video)
+        return sorted(videos.values(), key=lambda video: video['created'], reverse=True)
+
+    def videos_since(self, up_id, window_start: float) -> list:
+        """记录中发布时间不早于window_start的投稿，按发布时间倒序"""
+        with self._lock:
+            entry = self._data.get(str(up_id)) or {'videos': {}}
+            videos = [dict(video) for video in entry['videos'].values() if video['created'] >= window_start]
+        return sorted(videos, key=lambda video: video['created'], reverse=True)
+
+
+def take_new_videos(store: UpWatermarkStore, up_id, videos, window_start: float):
+    """从按发布时间倒序的投稿迭代器中取出水位之后的新投稿
+
+    遇到水位以内的投稿即停止（不包含该投稿）；遇到早于窗口起点的投稿时包含它（用于推进水位）后停止。
+    videos为惰性分页迭代器时，停止后不会再请求后续页。
+
+    Returns:
+        tuple: (新投稿列表, 是否完整)；迭代中途出错时返回已取到的部分与False
+    """
+    new_videos = []
+    try:
+        for video in videos:
+            if store.is_known(up_id, video.get('bvid'), video.get('created')):
+                break
+            new_videos.append(video)
+            if video.get('created', 0) < window_start:
+                break
+    except Exception as e:
+        print(f"UP主 {up_id} 投稿列表翻页中断: {str(e)}")
+        return new_videos, False
+    return new_videos, True
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_watermark_store() -> UpWatermarkStore:
+    """获取进程内共享的UP主水位记录"""
+    global _default_store
+    if _default_store is None:
+        with _default_store_lock:
+            if _default_store is None:
+                _default_store = UpWatermarkStore()
+    return _default_store
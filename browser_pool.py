@@ -0,0 +1,169 @@
+"""
+浏览器池模块 - 可复用的已登录Selenium浏览器实例
+
+浏览器启动、ChromeDriver检查、注入cookie与登录验证每次要十几秒，而实际抓取往往只是一次页面加载。
+BrowserPool按需创建至多max_size个浏览器（由factory负责启动并登录），用完归还而不是quit，
+下次取出前做健康检查，已崩溃或使用次数达到max_uses的实例会被关闭并重新创建，避免长时间运行后内存上涨或状态异常。
+本模块不依赖selenium，浏览器的创建与登录逻辑由调用方的factory提供。
+"""
+
+import time
+import threading
+import contextlib
+
+BROWSER_POOL_SIZE = 2  # 同时存在的浏览器实例上限
+BROWSER_MAX_USES = 20  # 单个实例的最大使用次数，达到后关闭并重建
+BROWSER_CHECKOUT_TIMEOUT = 600  # 等待空闲实例的超时（秒）
+
+
+def is_driver_alive(driver) -> bool:
+    """默认健康检查：浏览器进程与窗口仍然可用"""
+    try:
+        return bool(driver.window_handles) and driver.current_url is not None
+    except Exception:
+        return False
+
+
+def quit_driver(driver):
+    try:
+        driver.quit()
+    except Exception:
+        pass
+
+
+class BrowserPool:
+    """有界浏览器池，线程安全
+
+    Args:
+        factory: 无参函数，返回已就绪（已登录）的浏览器实例，失败时返回None或抛出异常
+        max_size: 同时存在的实例上限
+        max_uses: 单个实例的最大使用次数
+        health_check: 取出前的健康检查函数，返回False的实例会被丢弃
+        reset: 归还时调用的清理函数（如清空抓包记录），失败的实例会被丢弃
+        name: 用于日志的池名称
+    """
+
+    def __init__(self, factory, max_size: int = BROWSER_POOL_SIZE, max_uses: int = BROWSER_MAX_USES,
+                 health_check=is_driver_alive, reset=None, name: str = "浏览器"):
+        self.factory = factory
+        self.max_size = max_size
+        self.max_uses = max_uses
+        self.health_check = health_check
+        self.reset = reset
+        self.name = name
+        self.created_count = 0
+        self.recycled_count = 0
+        self._idle = []
+        self._uses = {}
+        self._size = 0
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def _discard(self, driver, reason: str):
+        """关闭实例并释放名额，调用方需持有锁"""
+        self._uses.pop(id(driver), None)
+        self._size -= 1
+        self.recycled_count += 1
+        print(f"{self.name}池：关闭一个实例（{reason}）")
+        self._condition.notify()
+
+    def checkout(self, timeout: float = BROWSER_CHECKOUT_TIMEOUT):
+        """取出一个可用实例，池已满时等待其他线程归还"""
+        deadline = time.monotonic() + timeout
+        while True:
+            expired = False
+            with self._condition:
+                if self._closed:
+                    raise RuntimeError(f"{self.name}池已关闭")
+                if self._idle:
+                    driver = self._idle.pop()
+                    expired = self._uses.get(id(driver), 0) >= self.max_uses
+                    if expired:
+                        self._discard(driver, f"已使用{self.max_uses}次")
+                elif self._size < self.max_size:
+                    # 先占用名额，在锁外创建实例
+                    self._size += 1
+                    driver = None
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(f"等待空闲{self.name}超时")
+                    self._condition.wait(remaining)
+                    continue
+
+            if driver is None:
+                driver = self._create()
+            elif expired:
+                quit_driver(driver)
+                continue
+            elif self.health_check and not self.health_check(driver):
+                with self._condition:
+                    self._discard(driver, "健康检查失败")
+                quit_driver(driver)
+                continue
+
+            with self._condition:
+                self._uses[id(driver)] = self._uses.get(id(driver), 0) + 1
+            return driver
+
+    def _create(self):
+        """创建新实例，名额已在调用前占用，失败时归还名额并抛出异常"""
+        try:
+            driver = self.factory()
+            if driver is None:
+                raise RuntimeError(f"{self.name}创建或登录失败")
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self.created_count += 1
+        print(f"{self.name}池：新建实例（当前 {self._size}/{self.max_size}）")
+        return driver
+
+    def release(self, driver, broken: bool = False):
+        """归还实例，broken为True或清理失败时直接关闭"""
+        if not broken and self.reset:
+            try:
+                self.reset(driver)
+            except Exception:
+                broken = True
+        with self._condition:
+            if broken or self._closed:
+                self._discard(driver, "已损坏" if broken else "池已关闭")
+            else:
+                self._idle.append(driver)
+                self._condition.notify()
+                return
+        quit_driver(driver)
+
+    @contextlib.contextmanager
+    def driver(self, timeout: float = BROWSER_CHECKOUT_TIMEOUT):
+        """取出实例并在使用后归还；使用过程中浏览器崩溃时由下次取出前的健康检查发现"""
+        driver = self.checkout(timeout)
+        try:
+            yield driver
+        finally:
+            self.release(driver)
+
+    def close(self):
+        """关闭所有空闲实例，之后归还的实例也会被关闭"""
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            for driver in idle:
+                self._uses.pop(id(driver), None)
+                self._size -= 1
+            self._condition.notify_all()
+        for driver in idle:
+            quit_driver(driver)
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "created": self.created_count,
+                "recycled": self.recycled_count
+            }
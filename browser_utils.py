@@ -0,0 +1,190 @@
+"""
+浏览器工具模块 - ChromeDriver路径缓存与延迟导入的Chrome服务
+
+ChromeDriverManager().install() 每次都会检查Chrome版本、查询驱动版本并扫描缓存目录。
+这里把解析出的驱动路径在进程内缓存，并写入 .chromedriver_path.json（带有效期），
+同一台机器上的后续运行在有效期内直接复用路径，驱动文件被删除或过期时才重新解析。
+selenium与webdriver_manager只在真正需要启动浏览器时才导入，纯API方式的运行无需加载它们。
+
+页面等待工具以文档就绪、网络空闲（Resource Timing中的资源数不再增长）和DOM条件代替固定的sleep，
+RequestWatcher通过selenium-wire的请求拦截器在目标请求发出的瞬间拿到URL，页面需要多久就等多久。
+selenium-wire默认把页面发出的每个请求及响应体都保存下来（包括视频分片），长期复用的浏览器需要限定抓包范围
+（driver.scopes）并在每个视频之间用clear_captured_requests清空已保存的请求，内存才能保持平稳。
+"""
+
+import os
+import json
+import time
+import threading
+
+CHROMEDRIVER_CACHE_FILE = ".chromedriver_path.json"  # 驱动路径缓存文件
+CHROMEDRIVER_CACHE_TTL_SECONDS = 24 * 3600  # 驱动路径缓存有效期（1天），过期后重新检查版本
+PAGE_READY_TIMEOUT = 15  # 等待document.readyState为complete的超时（秒）
+NETWORK_IDLE_SECONDS = 0.8  # 资源请求数保持不变多久视为网络空闲（秒）
+NETWORK_IDLE_TIMEOUT = 8  # 等待网络空闲的超时（秒），页面持续轮询时最多等这么久
+WAIT_POLL_INTERVAL = 0.2  # 条件轮询间隔（秒）
+
+_driver_path = None
+_driver_path_lock = threading.Lock()
+
+
+def _read_cached_driver_path(cache_file: str, ttl_seconds: float):
+    """读取未过期且文件仍存在的驱动路径，没有时返回None"""
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        path = cached.get('path')
+        if path and os.path.exists(path) and time.time() - cached.get('resolved_at', 0) < ttl_seconds:
+            return path
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def get_chromedriver_path(cache_file: str = CHROMEDRIVER_CACHE_FILE,
+                          ttl_seconds: float = CHROMEDRIVER_CACHE_TTL_SECONDS) -> str:
+    """返回ChromeDriver路径：进程内缓存 > 未过期的缓存文件 > ChromeDriverManager解析"""
+    global _driver_path
+    if _driver_path and os.path.exists(_driver_path):
+        return _driver_path
+    with _driver_path_lock:
+        if _driver_path and os.path.exists(_driver_path):
+            return _driver_path
+        path = _read_cached_driver_path(cache_file, ttl_seconds)
+        if path is None:
+            from webdriver_manager.chrome import ChromeDriverManager
+            started = time.perf_counter()
+            path = ChromeDriverManager().install()
+            print(f"ChromeDriver路径解析完成，耗时 {time.perf_counter() - started:.1f} 秒: {path}")
+            try:
+                with open(cache_file, 'w', encoding='utf-8') as f:
+                    json.dump({'path': path, 'resolved_at': time.time()}, f)
+            except OSError as e:
+                print(f"写入ChromeDriver路径缓存失败: {str(e)}")
+        _driver_path = path
+        return path
+
+
+def create_chrome_service():
+    """创建使用缓存驱动路径的Chrome Service"""
+    from selenium.webdriver.chrome.service import Service
+    return Service(get_chromedriver_path())
+
+
+def _wait_until(driver, condition, timeout: float) -> bool:
+    """在timeout内轮询condition，满足返回True，超时返回False"""
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.support.ui import WebDriverWait
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=WAIT_POLL_INTERVAL).until(condition)
+        return True
+    except TimeoutException:
+        return False
+
+
+def wait_for_page_ready(driver, timeout: float = PAGE_READY_TIMEOUT) -> bool:
+    """等待页面文档加载完成"""
+    return _wait_until(driver, lambda d: d.execute_script("return document.readyState") == "complete", timeout)
+
+
+def wait_for_network_idle(driver, idle_seconds: float = NETWORK_IDLE_SECONDS,
+                          timeout: float = NETWORK_IDLE_TIMEOUT) -> bool:
+    """等待页面加载完成且资源请求数在idle_seconds内不再增长（基于Resource Timing，对普通selenium同样适用）"""
+    state = {"count": None, "since": time.monotonic()}
+
+    def idle(d):
+        count = d.execute_script(
+            "if (performance.setResourceTimingBufferSize) { performance.setResourceTimingBufferSize(5000); }"
+            "return document.readyState === 'complete' ? performance.getEntriesByType('resource').length : -1;"
+        )
+        now = time.monotonic()
+        if count is None or count < 0 or count != state["count"]:
+            state["count"], state["since"] = count, now
+            return False
+        return now - state["since"] >= idle_seconds
+
+    return _wait_until(driver, idle, timeout)
+
+
+def wait_for_element(driver, by, selector: str, timeout: float = PAGE_READY_TIMEOUT, clickable: bool = False):
+    """等待元素出现（或可点击），返回元素，超时返回None"""
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    condition = EC.element_to_be_clickable if clickable else EC.presence_of_element_located
+    try:
+        return WebDriverWait(driver, timeout, poll_frequency=WAIT_POLL_INTERVAL).until(condition((by, selector)))
+    except TimeoutException:
+        return None
+
+
+def wait_for_any_selector(driver, selectors: list, timeout: float = PAGE_READY_TIMEOUT):
+    """等待任一CSS选择器匹配到元素，返回(选择器, 元素列表)，超时返回(None, [])"""
+    from selenium.webdriver.common.by import By
+    found = {}
+
+    def any_present(d):
+        for selector in selectors:
+            elements = d.find_elements(By.CSS_SELECTOR, selector)
+            if elements:
+                found["selector"], found["elements"] = selector, elements
+                return True
+        return False
+
+    if _wait_until(driver, any_present, timeout):
+        return found["selector"], found["elements"]
+    return None, []
+
+
+def scroll_and_wait(driver, timeout: float = NETWORK_IDLE_TIMEOUT) -> bool:
+    """滚动到页面底部，等待页面高度增长（新内容加载）后再等网络空闲，返回是否加载了新内容"""
+    height = driver.execute_script("return document.body.scrollHeight")
+    driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+    started = time.monotonic()
+    grown = _wait_until(driver, lambda d: d.execute_script("return document.body.scrollHeight") > height, timeout)
+    if grown:
+        wait_for_network_idle(driver, timeout=max(0.0, timeout - (time.monotonic() - started)))
+    return grown
+
+
+def clear_captured_requests(driver):
+    """清空selenium-wire已保存的请求与响应（普通selenium驱动直接跳过），可作为BrowserPool的reset"""
+    if hasattr(driver, 'backend'):
+        del driver.requests
+
+
+class RequestWatcher:
+    """selenium-wire请求拦截器：URL包含pattern的第一个请求发出时立即记录，无需事后扫描driver.requests
+
+    用法：
+        with RequestWatcher(driver, 'aisubtitle.hdslb.com') as watcher:
+            driver.get(url)
+            ...
+            subtitle_url = watcher.wait(timeout)
+    """
+
+    def __init__(self, driver, pattern: str):
+        self.driver = driver
+        self.pattern = pattern
+        self.url = None
+        self._event = threading.Event()
+
+    def _intercept(self, request):
+        # 在selenium-wire代理线程中调用，只记录不修改请求
+        if not self._event.is_set() and self.pattern in request.url:
+            self.url = request.url
+            self._event.set()
+
+    def __enter__(self):
+        self.driver.request_interceptor = self._intercept
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            del self.driver.request_interceptor
+        except Exception:
+            pass
+
+    def wait(self, timeout: float):
+        """等待匹配的请求出现，返回其URL，超时返回None"""
+        return self.url if self._event.wait(timeout) else None
@@ -0,0 +1,174 @@
+"""
+分块总结模块 - 对超长输入做map-reduce总结
+
+内容按token估算切分成块，各块并行做"map"提炼；map结果按原始顺序逐段打包，
+一段连续的结果凑满预算即立即发起中间"reduce"压缩，不必等所有块完成；
+最后一次调用使用原始的系统/用户提示词，因此输出格式（如末尾的标的JSON）与单次调用一致。
+输入本身不超过分块预算时直接单次调用，行为与deepseek_summary相同。
+"""
+
+import re
+import concurrent.futures
+
+from deepseek_summary import deepseek_summary
+
+CHUNK_TOKENS = 12000  # 单个map块的内容token预算，未超过时不分块
+REDUCE_TOKENS = 24000  # 单次reduce调用的内容token预算
+MAP_MAX_CONCURRENCY = 4  # map/reduce并发调用数
+
+MAP_SYSPROMPT = "你是一个专业的财经内容整理助手，擅长从大量原始财经内容中提炼关键信息。"
+MAP_USERPROMPT = "以下是一批原始财经内容（完整内容的一部分），请提炼其中的整体市场判断、行业/板块观点、具体投资操作建议和风险提示，并完整保留提到的指数和股票名称及代码。只做提炼，不要加入你自己的观点：\n\n"
+REDUCE_SYSPROMPT = MAP_SYSPROMPT
+REDUCE_USERPROMPT = "以下是多段财经内容的提炼结果，请合并去重为一份提炼，保留所有市场判断、板块观点、操作建议、风险提示以及指数和股票名称及代码：\n\n"
+
+# DeepSeek官方估算：1个中文字符约0.6个token，1个英文字符约0.3个token
+_CJK_PATTERN = re.compile(r'[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]')
+_PARAGRAPH_PATTERN = re.compile(r'\n\s*\n')
+
+
+def estimate_tokens(text: str) -> int:
+    """按字符类型粗略估算token数"""
+    if not text:
+        return 0
+    cjk_count = len(_CJK_PATTERN.findall(text))
+    return int(cjk_count * 0.6 + (len(text) - cjk_count) * 0.3) + 1
+
+
+def _split_oversized(text: str, max_tokens: int) -> list:
+    """把单个超出预算的段落按行、再按字符切开"""
+    pieces = []
+    current = ""
+    for line in text.split('\n'):
+        if estimate_tokens(line) > max_tokens:
+            # 单行仍然超出预算，按估算比例切字符
+            step = max(1, int(len(line) * max_tokens / estimate_tokens(line)))
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.extend(line[i:i + step] for i in range(0, len(line), step))
+            continue
+        candidate = f"{current}\n{line}" if current else line
+        if estimate_tokens(candidate) > max_tokens:
+            pieces.append(current)
+            current = line
+        else:
+            current = candidate
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_into_chunks(text: str, max_tokens: int = CHUNK_TOKENS) -> list:
+    """按段落边界贪心打包，使每块估算token数不超过max_tokens"""
+    chunks = []
+    current = []
+    current_tokens = 0
+    for paragraph in _PARAGRAPH_PATTERN.split(text):
+        if not paragraph.strip():
+            continue
+        tokens = estimate_tokens(paragraph)
+        if tokens > max_tokens:
+            if current:
+                chunks.append('\n\n'.join(current))
+                current, current_tokens = [], 0
+            chunks.extend(_split_oversized(paragraph, max_tokens))
+            continue
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append('\n\n'.join(current))
+            current, current_tokens = [], 0
+        current.append(paragraph)
+        current_tokens += tokens
+    if current:
+        chunks.append('\n\n'.join(current))
+    return chunks
+
+
+def _pack_ready_groups(results: list, start: int, budget: int):
+    """从start开始把已完成的连续结果按预算打包
+
+    只有确定不会再有后续结果加入的组才算闭合：要么到了末尾，要么下一个已完成的结果放不下。
+
+    Returns:
+        tuple: (闭合组的(起, 止)下标列表, 下一次打包的起点)
+    """
+    groups = []
+    while start < len(results):
+        end = start
+        tokens = 0
+        while end < len(results) and results[end] is not None:
+            item_tokens = estimate_tokens(results[end])
+            if end > start and tokens + item_tokens > budget:
+                break
+            tokens += item_tokens
+            end += 1
+        if end == start:
+            break
+        if end < len(results) and results[end] is None:
+            break
+        groups.append((start, end))
+        start = end
+    return groups, start
+
+
+def _compress(parts: list, stage: str = None) -> str:
+    if len(parts) == 1:
+        return parts[0]
+    return deepseek_summary('\n\n'.join(parts), sysprompt=REDUCE_SYSPROMPT, userprompt=REDUCE_USERPROMPT,
+                            stage=f"{stage}/reduce" if stage else None)
+
+
+def map_reduce_summary(content: str, sysprompt: str, userprompt: str,
+                       chunk_tokens: int = CHUNK_TOKENS, reduce_tokens: int = REDUCE_TOKENS,
+                       max_concurrency: int = MAP_MAX_CONCURRENCY, stage: str = None) -> str:
+    """对可能超长的内容做map-reduce总结，参数含义与deepseek_summary一致
+
+    Args:
+        content: 待总结内容
+        sysprompt: 最终调用使用的系统提示词
+        userprompt: 最终调用使用的用户提示词
+        chunk_tokens: 单个map块的token预算
+        reduce_tokens: 单次reduce调用的token预算
+        max_concurrency: 并发调用数
+        stage: 调用统计中所属的阶段名，map/reduce调用分别记为"<阶段>/map"、"<阶段>/reduce"
+    """
+    if estimate_tokens(content) <= chunk_tokens:
+        return deepseek_summary(content, sysprompt=sysprompt, userprompt=userprompt, stage=stage)
+
+    chunks = split_into_chunks(content, chunk_tokens)
+    print(f"内容约 {estimate_tokens(content)} tokens，切分为 {len(chunks)} 块并行提炼")
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="map_reduce") as executor:
+        map_results = [None] * len(chunks)
+        future_to_index = {
+            executor.submit(deepseek_summary, chunk, sysprompt=MAP_SYSPROMPT, userprompt=MAP_USERPROMPT,
+                            stage=f"{stage}/map" if stage else None): i
+            for i, chunk in enumerate(chunks)
+        }
+
+        # 第一层reduce与map重叠：连续的map结果凑满预算即发起压缩
+        reduce_futures = []
+        next_start = 0
+        for future in concurrent.futures.as_completed(future_to_index):
+            map_results[future_to_index[future]] = future.result()
+            groups, next_start = _pack_ready_groups(map_results, next_start, reduce_tokens)
+            if groups == [(0, len(chunks))]:
+                # 全部结果一次就能放下，直接进入最终调用
+                reduce_futures = None
+                break
+            for start, end in groups:
+                reduce_futures.append(executor.submit(_compress, map_results[start:end], stage))
+        print(f"{len(chunks)} 块提炼完成")
+
+        partials = map_results if reduce_futures is None else [f.result() for f in reduce_futures]
+
+        # 后续层级：仍放不下时继续分组压缩，直到能放进一次调用
+        while reduce_futures is not None and len(partials) > 1:
+            groups, _ = _pack_ready_groups(partials, 0, reduce_tokens)
+            if len(groups) == 1:
+                break
+            if len(groups) == len(partials):
+                print("警告: 单段提炼结果已超出reduce预算，直接进行最终总结")
+                break
+            partials = list(executor.map(lambda group: _compress(partials[group[0]:group[1]], stage), groups))
+
+    return deepseek_summary('\n\n'.join(partials), sysprompt=sysprompt, userprompt=userprompt, stage=stage)
@@ -0,0 +1,163 @@
+"""
+DeepSeek客户端模块 - 进程内共享、延迟创建的OpenAI兼容客户端
+
+deepseek_summary、extract_key_targets等所有模型调用共用同一个客户端，底层httpx连接池保持keep-alive连接和TLS会话，
+并发调用时按连接池大小复用热连接，不再每次调用都重新读取密钥文件、新建客户端和握手。
+"""
+
+import os
+import time
+import threading
+
+import httpx
+from openai import OpenAI
+
+DEEPSEEK_BASE_URL = "https://api.deepseek.com"
+API_KEY_FILE = "deepseek_api_key.txt"
+# 环境变量覆盖，可把所有模型调用指向本地桩服务（见deepseek_stub_server.py）
+BASE_URL_ENV = "DEEPSEEK_BASE_URL"
+API_KEY_ENV = "DEEPSEEK_API_KEY"
+
+# 连接池配置：按并发调用方数量设置，超出部分排队等待空闲连接
+POOL_MAX_CONNECTIONS = 16
+POOL_MAX_KEEPALIVE_CONNECTIONS = 16
+POOL_KEEPALIVE_EXPIRY = 120  # 空闲连接保持时间（秒）
+REQUEST_TIMEOUT = httpx.Timeout(600.0, connect=10.0)
+
+_client = None
+_api_key = None
+_client_lock = threading.Lock()
+_overrides = {}
+
+
+def load_api_key_from_file():
+    """从deepseek_api_key.txt文件读取key值"""
+    try:
+        with open(API_KEY_FILE, "r", encoding="utf-8") as f:
+            api_key = f.read().strip()
+            if not api_key:
+                print(f"警告: {API_KEY_FILE}文件为空")
+                return ""
+            return api_key
+    except FileNotFoundError:
+        print(f"错误: 未找到{API_KEY_FILE}文件")
+        return ""
+    except Exception as e:
+        print(f"读取key文件时出错: {e}")
+        return ""
+
+
+def get_api_key():
+    """返回缓存的API密钥，首次调用时从文件读取；未读到密钥时不缓存，补上key文件后下次调用即可生效"""
+    global _api_key
+    if not _api_key:
+        with _client_lock:
+            if not _api_key:
+                api_key = _overrides.get("api_key") or os.environ.get(API_KEY_ENV) or load_api_key_from_file()
+                if not api_key:
+                    return ""
+                _api_key = api_key
+    return _api_key
+
+
+def get_base_url():
+    """返回当前生效的API地址：configure_deepseek_client > 环境变量 > 默认地址"""
+    return _overrides.get("base_url") or os.environ.get(BASE_URL_ENV) or DEEPSEEK_BASE_URL
+
+
+def _create_client(api_key):
+    http_client = httpx.Client(
+        limits=httpx.Limits(
+            max_connections=POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=POOL_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=POOL_KEEPALIVE_EXPIRY
+        ),
+        timeout=_overrides.get("timeout") or REQUEST_TIMEOUT
+    )
+    # 重试统一由llm_rate_limiter处理，关闭SDK自带的重试避免叠加
+    return OpenAI(api_key=api_key, base_url=get_base_url(), http_client=http_client, max_retries=0)
+
+
+def get_deepseek_client():
+    """获取共享的DeepSeek客户端，首次调用时创建"""
+    global _client
+    if _client is None:
+        api_key = get_api_key()
+        if not api_key:
+            # 没有密钥时不缓存客户端，避免补上key文件后仍沿用无密钥的客户端
+            return _create_client(api_key)
+        with _client_lock:
+            if _client is None:
+                _client = _create_client(api_key)
+    return _client
+
+
+def reset_deepseek_client():
+    """关闭并丢弃共享客户端（例如更换API密钥后），下次调用时重新创建"""
+    global _client, _api_key
+    with _client_lock:
+        if _client is not None:
+            try:
+                _client.close()
+            except Exception:
+                pass
+        _client = None
+        _api_key = None
+
+
+def configure_deepseek_client(base_url=None, api_key=None, timeout=None):
+    """覆盖共享客户端的API地址、密钥和超时（主要用于本地桩服务基准测试），并丢弃已创建的客户端
+
+    Args:
+        base_url: API地址，None表示使用环境变量或默认地址
+        api_key: API密钥，None表示使用环境变量或密钥文件
+        timeout: 请求超时秒数或httpx.Timeout，None表示使用REQUEST_TIMEOUT
+    """
+    reset_deepseek_client()
+    _overrides.clear()
+    if base_url:
+        _overrides["base_url"] = base_url
+    if api_key:
+        _overrides["api_key"] = api_key
+    if timeout is not None:
+        _overrides["timeout"] = timeout if isinstance(timeout, httpx.Timeout) else httpx.Timeout(timeout, connect=min(timeout, 10.0))
+
+
+def benchmark_client_overhead(iterations: int = 50):
+    """对比每次调用新建客户端与复用共享客户端的额外开销
+
+    旧方式每次调用都会读取密钥文件并新建OpenAI客户端（含httpx连接池与SSL上下文），
+    复用方式只在第一次创建。这里只统计客户端准备阶段的耗时，不包含网络请求；
+    实际请求中复用连接还可省去每次的TCP与TLS握手（通常为1~2个RTT）。
+    """
+    def legacy_call():
+        api_key = load_api_key_from_file()
+        client = OpenAI(api_key=api_key or "sk-benchmark", base_url=DEEPSEEK_BASE_URL)
+        client.close()
+
+    def shared_call():
+        get_deepseek_client()
+
+    # 没有密钥时共享客户端不会缓存，临时使用占位密钥，保证测到的是复用路径
+    previous_overrides = dict(_overrides)
+    if not get_api_key():
+        configure_deepseek_client(**dict(previous_overrides, api_key="sk-benchmark"))
+    results = {}
+    try:
+        for name, func in (("每次新建客户端", legacy_call), ("复用共享客户端", shared_call)):
+            start = time.perf_counter()
+            for _ in range(iterations):
+                func()
+            results[name] = (time.perf_counter() - start) / iterations * 1000
+    finally:
+        if _overrides != previous_overrides:
+            configure_deepseek_client(**previous_overrides)
+
+    print(f"客户端准备开销（{iterations} 次平均）:")
+    for name, ms in results.items():
+        print(f"- {name}: {ms:.3f} ms/次")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark_client_overhead()
@@ -0,0 +1,310 @@
+"""
+DeepSeek桩服务模块 - 本地OpenAI兼容的 /chat/completions 模拟服务
+
+用于在不调用付费API的情况下测试和压测deepseek_summary、extract_key_targets、merge_investment_advice等调用路径。
+支持普通响应和SSE流式响应，可配置首字延迟、输出速度、输出长度，并可按比例注入故障：
+429限流（带Retry-After）、500错误、超时（挂起后断开）、截断的JSON/SSE响应。
+
+单独运行本文件即启动服务，随后设置环境变量 DEEPSEEK_BASE_URL=http://127.0.0.1:<端口> 即可让整个项目连接桩服务。
+"""
+
+import json
+import time
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_HOST = "127.0.0.1"
+STUB_PORT = 8765
+
+# 模拟输出使用的文本片段，按需重复到目标长度
+STUB_SUMMARY_TEXT = "整体市场震荡上行，成交量温和放大。科技与消费板块轮动，建议控制仓位、逢低关注业绩确定性较高的标的，注意外部风险。"
+STUB_TARGETS = {
+    "indices": [{"code": "000001", "name": "上证指数", "reason": "桩服务模拟数据"}],
+    "stocks": [{"code": "600519", "name": "贵州茅台", "reason": "桩服务模拟数据"}]
+}
+
+
+class StubConfig:
+    """桩服务行为配置，运行中可直接修改属性，对后续请求生效
+
+    Args:
+        latency: 首个token前的延迟（秒）
+        latency_jitter: 延迟的随机抖动上限（秒）
+        tokens_per_second: 输出速度，<=0表示不限速
+        output_tokens: 每次响应的输出长度（以字符近似token）
+        chunk_tokens: 流式响应每个数据块包含的字符数
+        rate_429: 返回429限流的概率
+        retry_after: 429响应中Retry-After头的秒数
+        rate_500: 返回500错误的概率
+        rate_timeout: 挂起不响应的概率
+        hang_seconds: 超时故障的挂起时长（秒），之后直接断开连接
+        rate_truncated: 响应体被截断（JSON不完整或SSE中途断开）的概率
+        seed: 随机种子，便于复现故障序列
+    """
+
+    def __init__(self, latency: float = 0.2, latency_jitter: float = 0.05, tokens_per_second: float = 200.0,
+                 output_tokens: int = 400, chunk_tokens: int = 8, rate_429: float = 0.0, retry_after: float = 1.0,
+                 rate_500: float = 0.0, rate_timeout: float = 0.0, hang_seconds: float = 30.0,
+                 rate_truncated: float = 0.0, seed=None):
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.tokens_per_second = tokens_per_second
+        self.output_tokens = output_tokens
+        self.chunk_tokens = chunk_tokens
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.rate_500 = rate_500
+        self.rate_timeout = rate_timeout
+        self.hang_seconds = hang_seconds
+        self.rate_truncated = rate_truncated
+        self.random = random.Random(seed)
+        self._random_lock = threading.Lock()
+
+    def draw_failure(self):
+        """按配置的概率抽取本次请求的故障类型，无故障返回None"""
+        with self._random_lock:
+            roll = self.random.random()
+        for name, rate in (("429", self.rate_429), ("500", self.rate_500),
+                           ("timeout", self.rate_timeout), ("truncated", self.rate_truncated)):
+            if roll < rate:
+                return name
+            roll -= rate
+        return None
+
+    def draw_latency(self) -> float:
+        with self._random_lock:
+            return self.latency + self.random.uniform(0, self.latency_jitter)
+
+
+def build_stub_content(messages, output_tokens: int) -> str:
+    """根据请求内容生成模拟输出：要求JSON格式时返回标的JSON，否则返回指定长度的总结文本"""
+    prompt = "".join(str(m.get("content", "")) for m in messages if m.get("role") in ("system", "user"))
+    if "JSON" in prompt or "json" in prompt:
+        return json.dumps(STUB_TARGETS, ensure_ascii=False)
+    repeat = output_tokens // len(STUB_SUMMARY_TEXT) + 1
+    return (STUB_SUMMARY_TEXT * repeat)[:output_tokens]
+
+
+class StubStats:
+    """按结果类型统计请求数，线程安全"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {}
+
+    def record(self, outcome: str):
+        with self._lock:
+            self.counts[outcome] = self.counts.get(outcome, 0) + 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.counts)
+
+    def reset(self):
+        with self._lock:
+            self.counts = {}
+
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    """OpenAI兼容的 /chat/completions 处理器，配置与统计从所属服务对象读取"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _pace(self, tokens: int):
+        tps = self.server.config.tokens_per_second
+        if tps > 0 and tokens > 0:
+            time.sleep(tokens / tps)
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"未知路径: {self.path}", "type": "invalid_request_error"}})
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": {"message": "请求体不是合法JSON", "type": "invalid_request_error"}})
+            return
+
+        config = self.server.config
+        stats = self.server.stats
+        failure = config.draw_failure()
+
+        if failure == "429":
+            stats.record("429")
+            self._send_json(429, {"error": {"message": "Rate limit reached", "type": "rate_limit_error"}},
+                            headers={"Retry-After": str(config.retry_after)})
+            return
+        if failure == "500":
+            stats.record("500")
+            self._send_json(500, {"error": {"message": "Internal server error", "type": "server_error"}})
+            return
+        if failure == "timeout":
+            stats.record("timeout")
+            time.sleep(config.hang_seconds)
+            self.close_connection = True
+            return
+
+        content = build_stub_content(request.get("messages", []), config.output_tokens)
+        model = request.get("model", "deepseek-chat")
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in request.get("messages", []))
+        completion_id = f"chatcmpl-stub-{int(time.time() * 1000)}"
+        time.sleep(config.draw_latency())
+
+        if request.get("stream"):
+            include_usage = bool((request.get("stream_options") or {}).get("include_usage"))
+            self._stream(content, model, completion_id, prompt_tokens, include_usage, truncated=failure == "truncated")
+        else:
+            self._complete(content, model, completion_id, prompt_tokens, truncated=failure == "truncated")
+        stats.record("truncated" if failure == "truncated" else "ok")
+
+    def _complete(self, content: str, model: str, completion_id: str, prompt_tokens: int, truncated: bool):
+        self._pace(len(content))
+        body = json.dumps({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(content),
+                "total_tokens": prompt_tokens + len(content)
+            }
+        }, ensure_ascii=False).encode("utf-8")
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        if truncated:
+            # 声明完整长度但只发送一半后断开，客户端会读到不完整的JSON
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, content: str, model: str, completion_id: str, prompt_tokens: int, include_usage: bool,
+                truncated: bool):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def send_event(data: str):
+            self.wfile.write(f"data: {data}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        def chunk_payload(delta: dict, finish_reason=None) -> str:
+            return json.dumps({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            }, ensure_ascii=False)
+
+        step = max(1, self.server.config.chunk_tokens)
+        pieces = [content[i:i + step] for i in range(0, len(content), step)]
+        cut_at = len(pieces) // 2 if truncated else None
+        try:
+            send_event(chunk_payload({"role": "assistant", "content": ""}))
+            for i, piece in enumerate(pieces):
+                if i == cut_at:
+                    # 发送半个数据块后断开，模拟流中途中断
+                    payload = chunk_payload({"content": piece})
+                    self.wfile.write(f"data: {payload[:len(payload) // 2]}".encode("utf-8"))
+                    self.wfile.flush()
+                    return
+                self._pace(len(piece))
+                send_event(chunk_payload({"content": piece}))
+            send_event(chunk_payload({}, finish_reason="stop"))
+            if include_usage:
+                send_event(json.dumps({
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": len(content),
+                        "total_tokens": prompt_tokens + len(content)
+                    }
+                }, ensure_ascii=False))
+            send_event("[DONE]")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class DeepSeekStubServer(ThreadingHTTPServer):
+    """多线程桩服务，可在后台线程中启动和关闭"""
+
+    daemon_threads = True
+
+    def __init__(self, host: str = STUB_HOST, port: int = STUB_PORT, config: StubConfig = None):
+        super().__init__((host, port), StubRequestHandler)
+        self.config = config or StubConfig()
+        self.stats = StubStats()
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """在后台线程中启动服务，返回服务地址"""
+        self._thread = threading.Thread(target=self.serve_forever, name="deepseek_stub", daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+
+def start_stub_server(config: StubConfig = None, host: str = STUB_HOST, port: int = 0) -> DeepSeekStubServer:
+    """启动后台桩服务，port为0时自动选择空闲端口"""
+    server = DeepSeekStubServer(host, port, config)
+    server.start()
+    return server
+
+
+if __name__ == "__main__":
+    server = DeepSeekStubServer(STUB_HOST, STUB_PORT)
+    print(f"DeepSeek桩服务已启动: {server.base_url}")
+    print(f"设置环境变量 DEEPSEEK_BASE_URL={server.base_url} 后运行项目即可连接桩服务，按Ctrl+C停止")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"请求统计: {server.stats.snapshot()}")
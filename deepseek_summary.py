@@ -1,32 +1,38 @@
 
-from openai import OpenAI
-
-
-def load_api_key_from_file():
-    """从deepseek_api_key.txt文件读取key值"""
-    try:
-        with open("deepseek_api_key.txt", "r", encoding="utf-8") as f:
-            cookie = f.read().strip()
-            if not cookie:
-                print("警告: deepseek_api_key.txt文件为空")
-                return ""
-            return cookie
-    except FileNotFoundError:
-        print("错误: 未找到deepseek_api_key.txt文件")
-        return ""
-    except Exception as e:
-        print(f"读取key文件时出错: {e}")
-        return ""
+import os
+import time
+
+from deepseek_client import get_deepseek_client
+from llm_cache import get_llm_cache, make_cache_key
+from llm_metrics import record_llm_call
+from llm_rate_limiter import (call_with_retry, get_rate_limiter, is_retryable, StreamInterruptedError,
+                              LLM_MAX_RETRIES)
+
+DEEPSEEK_MODEL = "deepseek-chat"
 
 def deepseek_summary(subtitle, 
                     sysprompt = "你是一个专业的内容总结助手，擅长对视频字幕进行简洁明了的总结。", 
-                    userprompt = "请总结以下字幕内容："):
+                    userprompt = "请总结以下字幕内容：",
+                    use_cache = True,
+                    stage = None):
+    
+    started_at = time.perf_counter()
+    prompt_chars = len(sysprompt) + len(userprompt) + len(subtitle)
+    cache = get_llm_cache() if use_cache else None
+    if cache:
+        cache_key = make_cache_key(DEEPSEEK_MODEL, sysprompt, userprompt, subtitle)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            print("命中LLM缓存，跳过API调用")
+            record_llm_call(stage, DEEPSEEK_MODEL, prompt_chars, len(cached), started_at, cached=True)
+            return cached
     
-    DEEPSEEK_API_KEY = load_api_key_from_file()
-    client = OpenAI(api_key=DEEPSEEK_API_KEY, base_url="https://api.deepseek.com")
+    client = get_deepseek_client()
 
-    response = client.chat.completions.create(
-        model="deepseek-chat",
+    response = call_with_retry(
+        client.chat.completions.create,
+        description="deepseek总结",
+        model=DEEPSEEK_MODEL,
         messages=[
             {"role": "system", "content": sysprompt},
             {"role": "user", "content": f"{userprompt}{subtitle}"}
@@ -34,4 +40,151 @@ def deepseek_summary(subtitle,
         stream=False
     )
 
-    return response.choices[0].message.content
\ No newline at end of file
+    result = response.choices[0].message.content
+    record_llm_call(stage, DEEPSEEK_MODEL, prompt_chars, len(result or ""), started_at,
+                    usage=getattr(response, "usage", None))
+    if cache:
+        cache.set(cache_key, result)
+    return result
+
+
+STREAM_CONTINUE_PROMPT = "你的上一条回答在中途被截断了，请紧接着截断处继续输出剩余内容，不要重复已经输出的部分，也不要添加任何说明。"
+MAX_STREAM_CONTINUATIONS = 2  # 因长度限制被截断时自动续写的最大次数
+
+
+def deepseek_summary_stream(subtitle,
+                            sysprompt = "你是一个专业的内容总结助手，擅长对视频字幕进行简洁明了的总结。",
+                            userprompt = "请总结以下字幕内容：",
+                            partial = "",
+                            state = None):
+    """以流式方式调用deepseek，逐段产出模型输出的生成器
+    
+    Args:
+        subtitle: 待总结内容
+        sysprompt: 系统提示词
+        userprompt: 用户提示词
+        partial: 之前已收到的部分输出，非空时要求模型从截断处继续
+        state: 可选字典，流结束后写入finish_reason和usage
+    """
+    messages = [
+        {"role": "system", "content": sysprompt},
+        {"role": "user", "content": f"{userprompt}{subtitle}"}
+    ]
+    if partial:
+        messages.append({"role": "assistant", "content": partial})
+        messages.append({"role": "user", "content": STREAM_CONTINUE_PROMPT})
+    
+    client = get_deepseek_client()
+    stream = client.chat.completions.create(
+        model=DEEPSEEK_MODEL,
+        messages=messages,
+        stream=True,
+        stream_options={"include_usage": True}
+    )
+    
+    for chunk in stream:
+        if getattr(chunk, "usage", None) and state is not None:
+            state["usage"] = chunk.usage
+        if not chunk.choices:
+            continue
+        choice = chunk.choices[0]
+        if choice.delta and choice.delta.content:
+            yield choice.delta.content
+        if choice.finish_reason and state is not None:
+            state["finish_reason"] = choice.finish_reason
+
+
+def stream_summary_to_file(target_path, subtitle,
+                           sysprompt = "你是一个专业的内容总结助手，擅长对视频字幕进行简洁明了的总结。",
+                           userprompt = "请总结以下字幕内容：",
+                           header = "",
+                           on_progress = None,
+                           use_cache = True,
+                           stage = None):
+    """流式生成总结，并在收到内容时实时追加写入归档文件
+    
+    生成过程中模型输出追加写入 target_path + ".<请求哈希>.partial"，完整结束后写入 header + 全部输出到target_path并删除.partial。
+    流中途断开、超时或被限流时经共享限流器退避后从已收到的内容处续写；重试耗尽抛出异常时.partial保留已收到的内容，
+    以相同输入再次调用会从断点续写而不是重新生成；
+    因长度限制被截断时自动续写，最多MAX_STREAM_CONTINUATIONS次。
+    
+    Args:
+        target_path: 最终输出文件路径
+        header: 写在最终文件开头的内容
+        on_progress: 可选回调 on_progress(已接收字符数, 首个token耗时秒数)，每收到一段内容调用一次
+        use_cache: 是否使用LLM缓存
+        stage: 调用统计中所属的阶段名
+    
+    Returns:
+        str: 完整的模型输出（不含header）
+    """
+    started_at = time.perf_counter()
+    prompt_chars = len(sysprompt) + len(userprompt) + len(subtitle)
+    cache_key = make_cache_key(DEEPSEEK_MODEL, sysprompt, userprompt, subtitle)
+    cache = get_llm_cache() if use_cache else None
+    if cache:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            print("命中LLM缓存，跳过API调用")
+            record_llm_call(stage, DEEPSEEK_MODEL, prompt_chars, len(cached), started_at, cached=True)
+            with open(target_path, "w", encoding="utf-8") as f:
+                f.write(header + cached)
+            return cached
+    
+    # 断点文件名带上请求哈希，输入变化后不会误接上旧的输出
+    partial_path = f"{target_path}.{cache_key[:12]}.partial"
+    output = ""
+    if os.path.exists(partial_path):
+        with open(partial_path, "r", encoding="utf-8") as f:
+            output = f.read()
+        if output:
+            print(f"发现未完成的输出（{len(output)}字符），从断点继续生成")
+    
+    limiter = get_rate_limiter()
+    start_time = time.time()
+    first_token_time = None
+    continuations = 0
+    attempt = 0
+    usage = {"prompt_tokens": 0, "completion_tokens": 0}
+    with open(partial_path, "a", encoding="utf-8") as f:
+        while True:
+            state = {}
+            try:
+                with limiter.slot():
+                    for piece in deepseek_summary_stream(subtitle, sysprompt, userprompt, partial=output, state=state):
+                        if first_token_time is None:
+                            first_token_time = time.time() - start_time
+                        f.write(piece)
+                        f.flush()
+                        output += piece
+                        if on_progress:
+                            on_progress(len(output), first_token_time)
+                if not state.get("finish_reason"):
+                    raise StreamInterruptedError("流式响应未收到结束标记")
+                limiter.on_success()
+                # 续写时每段都会重新发送输入，token用量逐段累加
+                if state.get("usage") is not None:
+                    usage["prompt_tokens"] += getattr(state["usage"], "prompt_tokens", 0) or 0
+                    usage["completion_tokens"] += getattr(state["usage"], "completion_tokens", 0) or 0
+            except Exception as e:
+                if not is_retryable(e) or attempt >= LLM_MAX_RETRIES:
+                    raise
+                delay = limiter.record_failure(e, attempt)
+                attempt += 1
+                print(f"流式输出中断（{type(e).__name__}），已接收{len(output)}字符，{delay:.1f} 秒后从断点重试（第{attempt}次）")
+                time.sleep(delay)
+                continue
+            if state.get("finish_reason") != "length" or continuations >= MAX_STREAM_CONTINUATIONS:
+                break
+            continuations += 1
+            print(f"输出因长度限制被截断，自动续写（第{continuations}次）")
+    
+    with open(target_path, "w", encoding="utf-8") as f:
+        f.write(header + output)
+    os.remove(partial_path)
+    record_llm_call(stage, DEEPSEEK_MODEL, prompt_chars, len(output), started_at,
+                    usage=usage if usage["prompt_tokens"] or usage["completion_tokens"] else None)
+    
+    if cache:
+        cache.set(cache_key, output)
+    return output
@@ -1,5 +1,5 @@
 import json
-import requests
+from bili_api import get_bili_api_client
 
 def extract_content_to_txt(json_file, output_file):
     # 读取JSON文件
@@ -16,21 +16,16 @@ def extract_content_to_txt(json_file, output_file):
         for content in contents:
             f.write(content + '\n')
 
+def subtitle_json_to_text(data):
+    """把B站字幕JSON转换为纯文本，每条字幕一行"""
+    return '\n'.join(item['content'] for item in data['body'])
+
 def extract_subtitle_from_url(subtitle_url):
     # 从URL获取JSON数据
     try:
-        response = requests.get(subtitle_url)
+        response = get_bili_api_client().get(subtitle_url)
         response.raise_for_status()  # 检查请求是否成功
-        data = response.json()
-        
-        # 提取所有content内容
-        contents = []
-        for item in data['body']:
-            contents.append(item['content'])
-        
-        # 将内容连接成字符串
-        subtitle = '\n'.join(contents)
-        return subtitle
+        return subtitle_json_to_text(response.json())
     except Exception as e:
         print(f"从URL提取字幕失败: {str(e)}")
         return None
@@ -1,12 +1,24 @@
 import os
 import json
+import argparse
+import time
+import threading
+import concurrent.futures
 from datetime import datetime, timedelta
 from date_utils import get_current_analysis_date, ensure_archive_folder, print_date_info, get_friday_date_for_weekend
-from bili_summary import run_bili_task
-from wechat_get import run_wechat_task
-from weibo_get import run_weibo_task
-from deepseek_summary import deepseek_summary
-from momentum_analyzer import run_momentum_analysis
+from bili_summary import (run_bili_task, fetch_bili_video_list, fetch_bili_subtitles, transcribe_pending_videos,
+                          summarize_bili_subtitles, generate_bili_investment_advice, LIMIT_HOURS as BILI_LIMIT_HOURS)
+from wechat_get import (run_wechat_task, get_all_accounts_daily_content, collect_all_articles_content,
+                        generate_investment_advice, list_article_files as list_wechat_article_files,
+                        LIMIT_HOURS as WECHAT_LIMIT_HOURS)
+from weibo_get import (run_weibo_task, fetch_weibo_contents, collect_all_weibo_content, generate_weibo_investment_advice,
+                       LIMIT_HOURS as WEIBO_LIMIT_HOURS)
+from time_window import refresh_time_window
+from deepseek_summary import stream_summary_to_file
+from momentum_analyzer import run_momentum_analysis, extract_all_targets
+from pipeline_dag import PipelineDAG, PipelineNode, snapshot_files
+from llm_cache import get_cache_stats
+from llm_metrics import get_llm_metrics, print_metrics_table
 
 COOKIE_FILES = {
     "weibo": "weibo_cookies.json",
@@ -14,6 +26,19 @@ COOKIE_FILES = {
     "wechat": "wechat_cookies.json"
 }
 
+PLATFORM_NAMES = {
+    "weibo": "微博",
+    "wechat": "微信",
+    "bili": "B站"
+}
+
+# 并行模式下各平台任务的超时时间（秒），超时后不再等待该平台结果
+PLATFORM_TIMEOUTS = {
+    "weibo": 30 * 60,
+    "wechat": 60 * 60,
+    "bili": 120 * 60
+}
+
 def check_cookie_exists(platform: str) -> bool:
     """检查指定平台的cookie文件是否存在"""
     cookie_file = COOKIE_FILES.get(platform)
@@ -73,8 +98,7 @@ def login_weibo_standalone():
     try:
         from selenium import webdriver
         from selenium.webdriver.chrome.options import Options
-        from selenium.webdriver.chrome.service import Service
-        from webdriver_manager.chrome import ChromeDriverManager
+        from browser_utils import create_chrome_service
         
         print("正在启动微博登录浏览器...")
         options = webdriver.ChromeOptions()
@@ -83,7 +107,7 @@ def login_weibo_standalone():
         options.add_experimental_option("useAutomationExtension", False)
         
         driver = webdriver.Chrome(
-            service=Service(ChromeDriverManager().install()),
+            service=create_chrome_service(),
             options=options
         )
         driver.set_window_size(1000, 800)
@@ -128,8 +152,7 @@ def login_bili_standalone():
     try:
         from selenium import webdriver
         from selenium.webdriver.chrome.options import Options
-        from selenium.webdriver.chrome.service import Service
-        from webdriver_manager.chrome import ChromeDriverManager
+        from browser_utils import create_chrome_service
         from selenium.webdriver.common.by import By
         from selenium.webdriver.support.ui import WebDriverWait
         from selenium.webdriver.support import expected_conditions as EC
@@ -141,7 +164,7 @@ def login_bili_standalone():
         options.add_experimental_option("useAutomationExtension", False)
         
         driver = webdriver.Chrome(
-            service=Service(ChromeDriverManager().install()),
+            service=create_chrome_service(),
             options=options
         )
         driver.set_window_size(800, 600)
@@ -193,15 +216,19 @@ class KOLAnalyzer:
         print_date_info()
         
         ensure_archive_folder(self.archive_folder)
+        self.platform_timings = {}
+        self._timed_out_platforms = set()  # 已判定超时的平台，后台线程结束时不覆盖其"超时"状态
+        self._timings_lock = threading.Lock()
     
-    def run_bili_task(self):
-        """运行B站视频分析任务"""
+    def run_bili_task(self, reuse_existing: bool = True, cancel_event=None):
+        """运行B站视频分析任务，reuse_existing为False时不复用当天已有的投资建议、字幕与总结文件，
+        cancel_event被设置（超时）时在下一个阶段前停止"""
         print("\n" + "="*50)
         print("开始执行B站视频分析任务")
         print("="*50)
         
         bili_advice_path = os.path.join(self.archive_folder, f"bili_投资建议_{self.current_date}.txt")
-        if os.path.exists(bili_advice_path):
+        if reuse_existing and os.path.exists(bili_advice_path):
             print(f"B站投资建议文件已存在: {bili_advice_path}")
             print("跳过B站任务执行")
             try:
@@ -214,21 +241,22 @@ class KOLAnalyzer:
                 return None
         
         try:
-            bili_advice = run_bili_task()
+            bili_advice = run_bili_task(reuse_existing=reuse_existing, cancel_event=cancel_event)
             print(f"B站任务完成，返回投资建议: {bili_advice is not None}")
             return bili_advice
         except Exception as e:
             print(f"B站任务执行失败: {str(e)}")
             return None
     
-    def run_wechat_task(self):
-        """运行微信公众号文章分析任务"""
+    def run_wechat_task(self, reuse_existing: bool = True, cancel_event=None):
+        """运行微信公众号文章分析任务，reuse_existing为False时不复用当天已有的投资建议文件，
+        cancel_event被设置（超时）时在下一个阶段前停止"""
         print("\n" + "="*50)
         print("开始执行微信公众号文章分析任务")
         print("="*50)
         
         wechat_advice_path = os.path.join(self.archive_folder, f"wechat_投资建议_{self.current_date}.txt")
-        if os.path.exists(wechat_advice_path):
+        if reuse_existing and os.path.exists(wechat_advice_path):
             print(f"微信投资建议文件已存在: {wechat_advice_path}")
             print("跳过微信任务执行")
             try:
@@ -241,21 +269,22 @@ class KOLAnalyzer:
                 return None
         
         try:
-            wechat_advice = run_wechat_task()
+            wechat_advice = run_wechat_task(cancel_event=cancel_event)
             print(f"微信任务完成，返回投资建议: {wechat_advice is not None}")
             return wechat_advice
         except Exception as e:
             print(f"微信任务执行失败: {str(e)}")
             return None
     
-    def run_weibo_task(self):
-        """运行微博分析任务"""
+    def run_weibo_task(self, reuse_existing: bool = True, cancel_event=None):
+        """运行微博分析任务，reuse_existing为False时不复用当天已有的投资建议文件，
+        cancel_event被设置（超时）时在下一个阶段前停止"""
         print("\n" + "="*50)
         print("开始执行微博分析任务")
         print("="*50)
         
         weibo_advice_path = os.path.join(self.archive_folder, f"weibo_投资建议_{self.current_date}.txt")
-        if os.path.exists(weibo_advice_path):
+        if reuse_existing and os.path.exists(weibo_advice_path):
             print(f"微博投资建议文件已存在: {weibo_advice_path}")
             print("跳过微博任务执行")
             try:
@@ -268,21 +297,51 @@ class KOLAnalyzer:
                 return None
         
         try:
-            weibo_advice = run_weibo_task()
+            weibo_advice = run_weibo_task(reuse_existing=reuse_existing, cancel_event=cancel_event)
             print(f"微博任务完成，返回投资建议: {weibo_advice is not None}")
             return weibo_advice
         except Exception as e:
             print(f"微博任务执行失败: {str(e)}")
             return None
     
-    def merge_investment_advice(self, bili_advice, wechat_advice, weibo_advice):
-        """使用DeepSeek合并B站、微信和微博的投资建议"""
+    def run_momentum_stage(self, bili_advice=None, wechat_advice=None, weibo_advice=None, merged_targets=None):
+        """运行动量分析并保存报告，返回报告文本"""
+        momentum_report, momentum_results = run_momentum_analysis(
+            bili_advice=bili_advice,
+            wechat_advice=wechat_advice,
+            weibo_advice=weibo_advice,
+            merged_targets=merged_targets
+        )
+        
+        if momentum_report:
+            momentum_report_path = os.path.join(self.archive_folder, f"动量分析报告_{self.current_date}.txt")
+            try:
+                with open(momentum_report_path, "w", encoding="utf-8") as f:
+                    f.write(momentum_report)
+                print(f"动量分析报告已保存到: {momentum_report_path}")
+            except Exception as e:
+                print(f"保存动量分析报告失败: {str(e)}")
+        
+        return momentum_report
+    
+    def merge_investment_advice(self, bili_advice, wechat_advice, weibo_advice,
+                                momentum_report=None, run_momentum: bool = True, reuse_existing: bool = True):
+        """使用DeepSeek合并B站、微信和微博的投资建议
+        
+        Args:
+            bili_advice: B站投资建议
+            wechat_advice: 微信投资建议
+            weibo_advice: 微博投资建议
+            momentum_report: 已生成的动量分析报告
+            run_momentum: 是否在合并前运行动量分析（已提供momentum_report时应为False）
+            reuse_existing: 综合投资建议文件已存在时是否直接复用
+        """
         print("\n" + "="*50)
         print("开始合并投资建议")
         print("="*50)
         
         merged_advice_path = os.path.join(self.archive_folder, f"综合投资建议_{self.current_date}.txt")
-        if os.path.exists(merged_advice_path):
+        if reuse_existing and os.path.exists(merged_advice_path):
             print(f"综合投资建议文件已存在: {merged_advice_path}")
             print("跳过投资建议合并")
             try:
@@ -298,20 +357,8 @@ class KOLAnalyzer:
             print("没有可用的投资建议，跳过合并")
             return None
         
-        momentum_report, momentum_results = run_momentum_analysis(
-            bili_advice=bili_advice,
-            wechat_advice=wechat_advice,
-            weibo_advice=weibo_advice
-        )
-        
-        if momentum_report:
-            momentum_report_path = os.path.join(self.archive_folder, f"动量分析报告_{self.current_date}.txt")
-            try:
-                with open(momentum_report_path, "w", encoding="utf-8") as f:
-                    f.write(momentum_report)
-                print(f"动量分析报告已保存到: {momentum_report_path}")
-            except Exception as e:
-                print(f"保存动量分析报告失败: {str(e)}")
+        if run_momentum:
+            momentum_report = self.run_momentum_stage(bili_advice, wechat_advice, weibo_advice)
         
         combined_content = ""
         if bili_advice:
@@ -327,19 +374,29 @@ class KOLAnalyzer:
         print(f"准备合并的投资建议内容长度: {len(combined_content)}字符")
         
         try:
-            merged_advice = deepseek_summary(
+            header = (f"综合投资建议 - {self.current_date}\n"
+                      f"生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+                      + "="*50 + "\n\n")
+            progress = {"first_token": False, "reported_chars": 0}
+            
+            def report_progress(received_chars, first_token_seconds):
+                if not progress["first_token"]:
+                    progress["first_token"] = True
+                    print(f"首个token耗时: {first_token_seconds:.2f} 秒")
+                if received_chars - progress["reported_chars"] >= 500:
+                    progress["reported_chars"] = received_chars
+                    print(f"已接收综合投资建议 {received_chars} 字符...")
+            
+            merged_advice = stream_summary_to_file(
+                merged_advice_path,
                 combined_content,
                 sysprompt="你是一个资深的投资策略分析师，擅长综合多个信息源的投资建议，给出全面、客观、专业的综合投资建议。你需要考虑不同信息源的权重、时效性和可靠性，同时结合动量分析数据评估标的的技术面状态。",
-                userprompt="以下是来自B站财经视频分析、微信公众号文章分析和微博分析的投资建议，以及重点关注标的的动量分析数据。请综合分析并给出未来几天的综合投资建议，包括：\n1. 整体市场判断\n2. 重点行业/板块分析\n3. 具体投资策略（结合动量分析数据，对提到的标的给出操作建议）\n4. 风险提示\n5. 综合建议\n\n请详细分析并给出专业建议，并判断是否入场进行操作还是继续场外观察：\n\n"
+                userprompt="以下是来自B站财经视频分析、微信公众号文章分析和微博分析的投资建议，以及重点关注标的的动量分析数据。请综合分析并给出未来几天的综合投资建议，包括：\n1. 整体市场判断\n2. 重点行业/板块分析\n3. 具体投资策略（结合动量分析数据，对提到的标的给出操作建议）\n4. 风险提示\n5. 综合建议\n\n请详细分析并给出专业建议，并判断是否入场进行操作还是继续场外观察：\n\n",
+                header=header,
+                on_progress=report_progress,
+                stage="综合投资建议"
             )
             
-            merged_advice_path = os.path.join(self.archive_folder, f"综合投资建议_{self.current_date}.txt")
-            with open(merged_advice_path, "w", encoding="utf-8") as f:
-                f.write(f"综合投资建议 - {self.current_date}\n")
-                f.write(f"生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write("="*50 + "\n\n")
-                f.write(merged_advice)
-            
             print(f"综合投资建议已保存到: {merged_advice_path}")
             print("投资建议合并完成")
             return merged_advice
@@ -348,11 +405,131 @@ class KOLAnalyzer:
             print(f"合并投资建议失败: {str(e)}")
             return None
     
-    def run_all_tasks(self, skip_login: bool = False):
-        """顺序运行所有任务并合并投资建议
+    def refresh_time_windows(self):
+        """在启动各平台任务之前统一计算本次运行的时间窗口，各平台运行期间只读取、不再重算"""
+        for limit_hours in sorted({BILI_LIMIT_HOURS, WECHAT_LIMIT_HOURS, WEIBO_LIMIT_HOURS}):
+            window = refresh_time_window(limit_hours)
+            print(f"时间窗口：{window.describe()}")
+    
+    def _run_platform_timed(self, platform: str, task):
+        """运行单个平台任务并记录耗时，任何异常都只影响该平台"""
+        start_time = time.time()
+        status = "完成"
+        try:
+            advice = task()
+            if not advice:
+                status = "无结果"
+        except Exception as e:
+            print(f"{PLATFORM_NAMES[platform]}任务异常: {str(e)}")
+            advice = None
+            status = "失败"
+        with self._timings_lock:
+            if platform not in self._timed_out_platforms:
+                self.platform_timings[platform] = {
+                    "seconds": time.time() - start_time,
+                    "status": status
+                }
+        return advice
+    
+    def _start_platform_thread(self, platform: str, task) -> concurrent.futures.Future:
+        """在守护线程中运行平台任务，超时被放弃的线程不会阻止解释器退出"""
+        future = concurrent.futures.Future()
+        
+        def worker():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(self._run_platform_timed(platform, task))
+            except BaseException as e:
+                future.set_exception(e)
+        
+        threading.Thread(target=worker, name=f"kol_platform_{platform}", daemon=True).start()
+        return future
+    
+    def run_platform_tasks_concurrently(self, platform_timeouts: dict = None, reuse_existing: bool = True):
+        """并行运行微博、微信、B站任务
+        
+        各平台访问不同站点且互不共享状态，每个平台独立捕获异常并拥有独立超时，
+        超时的平台结果按None处理，并设置该平台的取消事件：后台线程无法被强制终止，
+        但会在下一个阶段前停止，不再调用模型、不写入投资建议文件；线程为守护线程，不会阻止程序退出。
+        
+        Args:
+            platform_timeouts: 各平台超时时间（秒），未指定的平台使用PLATFORM_TIMEOUTS
+            reuse_existing: 是否复用当天已有的投资建议等文件
+        
+        Returns:
+            dict: 平台名到投资建议的映射
+        """
+        timeouts = dict(PLATFORM_TIMEOUTS)
+        if platform_timeouts:
+            timeouts.update(platform_timeouts)
+        
+        cancel_events = {platform: threading.Event() for platform in ("weibo", "wechat", "bili")}
+        tasks = {
+            "weibo": lambda: self.run_weibo_task(reuse_existing, cancel_events["weibo"]),
+            "wechat": lambda: self.run_wechat_task(reuse_existing, cancel_events["wechat"]),
+            "bili": lambda: self.run_bili_task(reuse_existing, cancel_events["bili"])
+        }
+        results = {platform: None for platform in tasks}
+        
+        start_time = time.time()
+        future_to_platform = {
+            self._start_platform_thread(platform, task): platform
+            for platform, task in tasks.items()
+        }
+        deadlines = {platform: start_time + timeouts[platform] for platform in tasks}
+        
+        pending = set(future_to_platform)
+        try:
+            while pending:
+                next_deadline = min(deadlines[future_to_platform[f]] for f in pending)
+                done, pending = concurrent.futures.wait(
+                    pending,
+                    timeout=max(0, next_deadline - time.time()),
+                    return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    platform = future_to_platform[future]
+                    results[platform] = future.result()
+                    timing = self.platform_timings.get(platform, {})
+                    print(f"\n>>> {PLATFORM_NAMES[platform]}任务结束（{timing.get('status', '未知')}），耗时 {timing.get('seconds', 0):.1f} 秒")
+                
+                now = time.time()
+                for future in [f for f in pending if now >= deadlines[future_to_platform[f]]]:
+                    platform = future_to_platform[future]
+                    pending.discard(future)
+                    cancel_events[platform].set()
+                    with self._timings_lock:
+                        self._timed_out_platforms.add(platform)
+                        self.platform_timings[platform] = {
+                            "seconds": now - start_time,
+                            "status": "超时"
+                        }
+                    print(f"\n>>> {PLATFORM_NAMES[platform]}任务超过 {timeouts[platform]} 秒未完成，已通知其停止")
+        finally:
+            # 异常退出（如Ctrl+C）时同样通知仍在运行的平台停止
+            for future in pending:
+                cancel_events[future_to_platform[future]].set()
+        
+        return results
+    
+    def print_platform_timings(self):
+        """打印各平台任务的耗时统计"""
+        if not self.platform_timings:
+            return
+        print("\n各平台任务耗时:")
+        for platform, timing in self.platform_timings.items():
+            print(f"- {PLATFORM_NAMES[platform]}: {timing['seconds']:.1f} 秒（{timing['status']}）")
+    
+    def run_all_tasks(self, skip_login: bool = False, concurrent_mode: bool = True, platform_timeouts: dict = None,
+                      reuse_existing: bool = True):
+        """运行所有平台任务并合并投资建议
         
         Args:
             skip_login: 是否跳过统一登录流程
+            concurrent_mode: 是否并行运行三个平台任务，False时按 微博 → 微信 → B站 顺序运行
+            platform_timeouts: 并行模式下各平台的超时时间（秒）
+            reuse_existing: 是否复用当天已生成的投资建议、字幕与总结文件，False时全部重新生成
         """
         print("\n" + "="*60)
         print(f"开始执行KOL分析任务 - {self.current_date}")
@@ -364,30 +541,202 @@ class KOLAnalyzer:
         else:
             print("\n>>> 跳过统一登录流程，直接执行任务...")
         
-        print("\n>>> 任务执行顺序: 微博 → 微信 → B站")
+        self.platform_timings = {}
+        self._timed_out_platforms = set()
+        self.refresh_time_windows()
+        if concurrent_mode:
+            print("\n>>> 任务执行方式: 微博、微信、B站并行执行")
+            results = self.run_platform_tasks_concurrently(platform_timeouts, reuse_existing)
+            weibo_advice = results["weibo"]
+            wechat_advice = results["wechat"]
+            bili_advice = results["bili"]
+        else:
+            print("\n>>> 任务执行顺序: 微博 → 微信 → B站")
+            weibo_advice = self._run_platform_timed("weibo", lambda: self.run_weibo_task(reuse_existing))
+            wechat_advice = self._run_platform_timed("wechat", lambda: self.run_wechat_task(reuse_existing))
+            bili_advice = self._run_platform_timed("bili", lambda: self.run_bili_task(reuse_existing))
         
-        weibo_advice = self.run_weibo_task()
-        wechat_advice = self.run_wechat_task()
-        bili_advice = self.run_bili_task()
+        self.print_platform_timings()
         
-        merged_advice = self.merge_investment_advice(bili_advice, wechat_advice, weibo_advice)
+        merged_advice = self.merge_investment_advice(bili_advice, wechat_advice, weibo_advice,
+                                                     reuse_existing=reuse_existing)
         
         print("\n" + "="*60)
         print("所有KOL分析任务完成")
         print("="*60)
+        self.report_llm_metrics()
         
         return {
             "bili_advice": bili_advice,
             "wechat_advice": wechat_advice,
             "weibo_advice": weibo_advice,
             "merged_advice": merged_advice,
+            "platform_timings": self.platform_timings,
+            "date": self.current_date
+        }
+    
+    def report_llm_metrics(self):
+        """打印模型调用统计与缓存命中情况，并写入归档文件夹的llm_metrics_<日期>.json"""
+        cache_stats = get_cache_stats()
+        print(f"LLM缓存: 命中 {cache_stats['hits']} 次, 未命中 {cache_stats['misses']} 次, 共 {cache_stats['entries']} 条记录")
+        metrics = get_llm_metrics()
+        print_metrics_table(metrics.calls())
+        try:
+            metrics_path = metrics.save(self.archive_folder, self.current_date)
+            print(f"模型调用统计已保存到: {metrics_path}")
+        except Exception as e:
+            print(f"保存模型调用统计失败: {str(e)}")
+    
+    def build_pipeline(self, use_api_for_videos: bool = True, max_workers: int = 4, refresh_fetch: bool = False):
+        """构建带检查点的分析流水线
+        
+        各平台: 获取列表 → 获取内容 → 语音识别 → 总结 → 投资建议，
+        汇总: 提取标的 → 动量分析 → 合并投资建议。
+        检查点保存在归档文件夹的pipeline_checkpoint.json中。
+        各阶段不再因为归档文件已存在而跳过，是否重跑只由检查点（参数与上游输出的内容哈希）决定。
+        获取阶段默认只以分析日期为输入，同一天内再次运行（如崩溃后续跑）直接复用已完成的抓取；
+        refresh_fetch为True时以本次运行时间作为输入强制重新抓取，抓取结果未变化时下游阶段仍复用检查点。
+        """
+        archive_folder = self.archive_folder
+        current_date = self.current_date
+        params = {"date": current_date}
+        fetch_params = dict(params, run_at=time.time()) if refresh_fetch else params
+        dag = PipelineDAG(os.path.join(archive_folder, "pipeline_checkpoint.json"), max_workers=max_workers)
+        
+        def subtitle_paths(items):
+            return [item['path'] for item in items or []]
+        
+        # B站
+        def bili_content(bili_list):
+            if not bili_list:
+                return None
+            result = fetch_bili_subtitles(bili_list, archive_folder, defer_transcription=True, reuse_existing=False)
+            result['files'] = snapshot_files(subtitle_paths(result['subtitles']))
+            return result
+        
+        def bili_transcribe(bili_content):
+            pending = (bili_content or {}).get('pending', [])
+            if not pending:
+                return []
+            subtitles = transcribe_pending_videos(pending, archive_folder, reuse_existing=False)
+            if not subtitles:
+                # 全部失败时不写检查点，下次运行重新识别
+                raise RuntimeError(f"{len(pending)} 个待识别视频均未生成字幕")
+            return subtitles
+        
+        def bili_summarize(bili_content, bili_transcribe):
+            items = (bili_content or {}).get('subtitles', []) + (bili_transcribe or [])
+            if not items:
+                return None
+            return snapshot_files(summarize_bili_subtitles(items, archive_folder, reuse_existing=False))
+        
+        def bili_advice(bili_summarize):
+            return generate_bili_investment_advice(archive_folder, current_date) if bili_summarize else None
+        
+        dag.add_node(PipelineNode("bili_list", lambda: fetch_bili_video_list(use_api_for_videos),
+                                  params=dict(fetch_params, use_api=use_api_for_videos)))
+        dag.add_node(PipelineNode("bili_content", bili_content, deps=["bili_list"],
+                                  output_files=lambda output: subtitle_paths((output or {}).get('subtitles'))))
+        dag.add_node(PipelineNode("bili_transcribe", bili_transcribe, deps=["bili_content"],
+                                  output_files=subtitle_paths, checkpoint_empty=True))
+        dag.add_node(PipelineNode("bili_summarize", bili_summarize, deps=["bili_content", "bili_transcribe"],
+                                  output_files=lambda output: list(output or {})))
+        dag.add_node(PipelineNode("bili_advice", bili_advice, deps=["bili_summarize"], params=params))
+        
+        # 微信
+        def wechat_fetch():
+            get_all_accounts_daily_content()
+            return snapshot_files(list_wechat_article_files(current_date))
+        
+        def wechat_advice(wechat_fetch):
+            if not wechat_fetch:
+                return None
+            content = collect_all_articles_content(current_date)
+            return generate_investment_advice(content, current_date) if content.strip() else None
+        
+        dag.add_node(PipelineNode("wechat_fetch", wechat_fetch, params=fetch_params,
+                                  output_files=lambda output: list(output or {})))
+        dag.add_node(PipelineNode("wechat_advice", wechat_advice, deps=["wechat_fetch"], params=params))
+        
+        # 微博
+        def weibo_advice(weibo_fetch):
+            if not weibo_fetch:
+                return None
+            content = collect_all_weibo_content(archive_folder)
+            return generate_weibo_investment_advice(content, archive_folder, current_date) if content.strip() else None
+        
+        dag.add_node(PipelineNode("weibo_fetch", lambda: snapshot_files(fetch_weibo_contents(archive_folder)),
+                                  params=fetch_params, output_files=lambda output: list(output or {})))
+        dag.add_node(PipelineNode("weibo_advice", weibo_advice, deps=["weibo_fetch"], params=params))
+        
+        # 汇总
+        dag.add_node(PipelineNode(
+            "targets",
+            lambda bili_advice, wechat_advice, weibo_advice: extract_all_targets(bili_advice, wechat_advice, weibo_advice),
+            deps=["bili_advice", "wechat_advice", "weibo_advice"]
+        ))
+        dag.add_node(PipelineNode(
+            "momentum",
+            lambda targets: self.run_momentum_stage(merged_targets=targets) if targets else None,
+            deps=["targets"],
+            params=params
+        ))
+        dag.add_node(PipelineNode(
+            "merge",
+            lambda bili_advice, wechat_advice, weibo_advice, momentum: self.merge_investment_advice(
+                bili_advice, wechat_advice, weibo_advice,
+                momentum_report=momentum, run_momentum=False, reuse_existing=False),
+            deps=["bili_advice", "wechat_advice", "weibo_advice", "momentum"],
+            params=params
+        ))
+        return dag
+    
+    def run_pipeline(self, skip_login: bool = False, use_api_for_videos: bool = True, max_workers: int = 4,
+                     refresh_fetch: bool = False):
+        """以DAG流水线方式运行所有任务，已完成且输入未变化的阶段直接复用检查点
+        
+        Args:
+            skip_login: 是否跳过统一登录流程
+            use_api_for_videos: B站是否使用API方式获取视频列表
+            max_workers: 并行执行的最大阶段数
+            refresh_fetch: 是否重新抓取各平台内容，默认复用当天已完成的获取阶段检查点
+        """
+        print("\n" + "="*60)
+        print(f"开始执行KOL分析流水线 - {self.current_date}")
+        print("="*60)
+        
+        if not skip_login:
+            perform_unified_login()
+        
+        self.refresh_time_windows()
+        dag = self.build_pipeline(use_api_for_videos=use_api_for_videos, max_workers=max_workers,
+                                  refresh_fetch=refresh_fetch)
+        outputs = dag.run()
+        dag.print_summary()
+        self.report_llm_metrics()
+        
+        return {
+            "bili_advice": outputs.get("bili_advice"),
+            "wechat_advice": outputs.get("wechat_advice"),
+            "weibo_advice": outputs.get("weibo_advice"),
+            "merged_advice": outputs.get("merge"),
+            "pipeline_status": dag.node_status,
             "date": self.current_date
         }
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="KOL投资建议分析")
+    parser.add_argument("--pipeline", action="store_true", help="以DAG流水线方式运行，已完成的阶段复用检查点（断点续跑）")
+    parser.add_argument("--refresh-fetch", action="store_true", help="流水线模式下重新抓取各平台内容，不复用当天的获取阶段检查点")
+    parser.add_argument("--skip-login", action="store_true", help="跳过统一登录流程")
+    args = parser.parse_args()
+    
     analyzer = KOLAnalyzer()
-    result = analyzer.run_all_tasks()
+    if args.pipeline:
+        result = analyzer.run_pipeline(skip_login=args.skip_login, refresh_fetch=args.refresh_fetch)
+    else:
+        result = analyzer.run_all_tasks(skip_login=args.skip_login)
     
     print("\n任务执行结果:")
     print(f"- B站投资建议: {'有' if result['bili_advice'] else '无'}")
@@ -0,0 +1,181 @@
+"""
+LLM调用基准测试模块 - 基于本地桩服务离线压测总结调用路径
+
+启动deepseek_stub_server桩服务并把共享客户端指向它，LLM缓存指向临时目录，
+在不同并发度和故障配置下驱动以下调用路径，统计p50/p95延迟、吞吐量和失败数：
+- summary: deepseek_summary（B站字幕总结、各平台投资建议）
+- stream: stream_summary_to_file（综合投资建议的流式写入）
+- targets: extract_key_targets（标的提取）
+- map_reduce: map_reduce_summary（超长输入的分块总结）
+"""
+
+import io
+import os
+import time
+import shutil
+import tempfile
+import contextlib
+import concurrent.futures
+
+from deepseek_client import configure_deepseek_client
+from deepseek_summary import deepseek_summary, stream_summary_to_file
+from chunked_summary import map_reduce_summary
+from momentum_analyzer import extract_key_targets
+from llm_cache import LLMCache, set_llm_cache
+from llm_rate_limiter import configure_rate_limiter, reset_rate_limiter
+from deepseek_stub_server import StubConfig, start_stub_server
+
+CONCURRENCY_LEVELS = (1, 4, 8, 16)
+REQUESTS_PER_LEVEL = 24
+CLIENT_TIMEOUT = 5.0  # 基准测试时的客户端超时（秒），需小于桩服务的挂起时长才能测到超时故障
+BENCHMARK_LIMITER_RATE = 100.0  # 基准测试时限流器的初始与最高速率，远高于桩服务吞吐，测的是调用路径本身
+
+# 故障配置：名称 -> StubConfig参数
+FAILURE_PROFILES = {
+    "正常": {},
+    "限流10%": {"rate_429": 0.10, "retry_after": 0.5},
+    "故障混合": {"rate_429": 0.05, "retry_after": 0.5, "rate_timeout": 0.02, "hang_seconds": 8.0,
+                 "rate_truncated": 0.03, "rate_500": 0.02},
+}
+
+SAMPLE_SUBTITLE = "今天我们来聊一聊最近的市场走势，上证指数在三千点附近反复震荡，成交量有所萎缩。半导体和新能源板块分化明显，资金更偏向高股息的银行和公用事业。"
+
+
+def _percentile(values: list, percent: float) -> float:
+    """最近秩法计算百分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(round(percent / 100 * len(ordered))))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def _scenario_summary(index: int, work_dir: str) -> bool:
+    return bool(deepseek_summary(f"{SAMPLE_SUBTITLE}（样本{index}）"))
+
+
+def _scenario_stream(index: int, work_dir: str) -> bool:
+    target_path = os.path.join(work_dir, f"stream_{index}.txt")
+    return bool(stream_summary_to_file(target_path, f"{SAMPLE_SUBTITLE}（样本{index}）", header="基准测试\n"))
+
+
+def _scenario_targets(index: int, work_dir: str) -> bool:
+    targets = extract_key_targets(f"{SAMPLE_SUBTITLE}（样本{index}）", source_name="基准")
+    return bool(targets.get("indices") or targets.get("stocks"))
+
+
+def _scenario_map_reduce(index: int, work_dir: str) -> bool:
+    paragraphs = [f"第{i}段（样本{index}）：{SAMPLE_SUBTITLE * 3}" for i in range(12)]
+    return bool(map_reduce_summary("\n\n".join(paragraphs), sysprompt="基准测试系统提示词", userprompt="请总结：",
+                                   chunk_tokens=600, reduce_tokens=1200))
+
+
+SCENARIOS = {
+    "summary": _scenario_summary,
+    "stream": _scenario_stream,
+    "targets": _scenario_targets,
+    "map_reduce": _scenario_map_reduce,
+}
+
+
+def run_level(scenario, concurrency: int, requests: int, work_dir: str) -> dict:
+    """以指定并发度执行requests次调用，返回延迟和吞吐统计"""
+    latencies = []
+    failures = 0
+
+    def timed_call(index):
+        start = time.perf_counter()
+        try:
+            ok = scenario(index, work_dir)
+        except Exception:
+            ok = False
+        return ok, time.perf_counter() - start
+
+    wall_start = time.perf_counter()
+    # 调用路径内部会逐次打印进度，压测期间屏蔽输出避免干扰统计表
+    with contextlib.redirect_stdout(io.StringIO()):
+        with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for ok, seconds in executor.map(timed_call, range(requests)):
+                if ok:
+                    latencies.append(seconds)
+                else:
+                    failures += 1
+    wall_seconds = time.perf_counter() - wall_start
+
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "failures": failures,
+        "p50": _percentile(latencies, 50),
+        "p95": _percentile(latencies, 95),
+        "throughput": len(latencies) / wall_seconds if wall_seconds > 0 else 0.0,
+        "wall_seconds": wall_seconds
+    }
+
+
+def limiter_settings_for(concurrency: int, overrides: dict = None) -> dict:
+    """某个并发度使用的限流器参数：默认突发与并发名额等于并发度、速率不设限，overrides覆盖其中的项"""
+    return {"rate": BENCHMARK_LIMITER_RATE, "max_rate": BENCHMARK_LIMITER_RATE, "burst": concurrency,
+            "max_concurrency": concurrency, **(overrides or {})}
+
+
+def run_benchmark(scenarios=None, profiles=None, concurrency_levels=CONCURRENCY_LEVELS,
+                  requests_per_level: int = REQUESTS_PER_LEVEL, stub_options: dict = None,
+                  limiter_settings: dict = None) -> list:
+    """在桩服务上执行基准测试并打印结果表
+
+    每个 (故障配置, 调用路径, 并发度) 都使用新建的共享限流器，上一轮的429退避不会带入下一轮。
+
+    Args:
+        scenarios: 要测试的调用路径名称列表，默认全部
+        profiles: 要测试的故障配置名称列表，默认全部
+        concurrency_levels: 并发度列表
+        requests_per_level: 每个并发度的调用次数
+        stub_options: 覆盖StubConfig的公共参数（如latency、tokens_per_second）
+        limiter_settings: 覆盖限流器参数（如{"rate": 2.0, "max_rate": 8.0, "burst": 4, "max_concurrency": 8}
+            按生产配置测试限流下的表现），默认见limiter_settings_for
+
+    Returns:
+        list: 每个 (调用路径, 故障配置, 并发度) 的统计字典
+    """
+    scenarios = scenarios or list(SCENARIOS)
+    profiles = profiles or list(FAILURE_PROFILES)
+    work_dir = tempfile.mkdtemp(prefix="llm_benchmark_")
+    server = start_stub_server(StubConfig())
+    configure_deepseek_client(base_url=server.base_url, api_key="sk-stub", timeout=CLIENT_TIMEOUT)
+    previous_cache = set_llm_cache(LLMCache(os.path.join(work_dir, "cache")))
+
+    results = []
+    try:
+        print(f"桩服务: {server.base_url}，每个并发度 {requests_per_level} 次调用")
+        for profile in profiles:
+            for scenario_name in scenarios:
+                print(f"\n[{scenario_name}] 故障配置: {profile}")
+                print(f"{'并发':>4} {'成功':>4} {'失败':>4} {'p50(s)':>8} {'p95(s)':>8} {'吞吐(次/s)':>10} "
+                      f"{'被限流':>6}  限流器(速率/突发/并发)")
+                for concurrency in concurrency_levels:
+                    server.config = StubConfig(seed=concurrency, **{**(stub_options or {}), **FAILURE_PROFILES[profile]})
+                    # 每轮使用独立缓存目录，避免上一轮的结果命中缓存
+                    set_llm_cache(LLMCache(os.path.join(work_dir, f"cache_{profile}_{scenario_name}_{concurrency}")))
+                    limiter = configure_rate_limiter(**limiter_settings_for(concurrency, limiter_settings))
+                    result = run_level(SCENARIOS[scenario_name], concurrency, requests_per_level, work_dir)
+                    result.update({"scenario": scenario_name, "profile": profile,
+                                   "limiter": limiter.settings(), "limiter_stats": limiter.stats()})
+                    results.append(result)
+                    settings = result["limiter"]
+                    print(f"{concurrency:>4} {requests_per_level - result['failures']:>4} {result['failures']:>4} "
+                          f"{result['p50']:>8.3f} {result['p95']:>8.3f} {result['throughput']:>10.2f} "
+                          f"{result['limiter_stats']['throttled']:>6}  "
+                          f"{settings['rate']:g}/{settings['burst']}/{settings['max_concurrency']}")
+        print(f"\n桩服务请求统计: {server.stats.snapshot()}")
+    finally:
+        set_llm_cache(previous_cache)
+        reset_rate_limiter()
+        configure_deepseek_client()
+        server.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+if __name__ == "__main__":
+    run_benchmark(stub_options={"latency": 0.2, "tokens_per_second": 1000, "output_tokens": 200})
@@ -0,0 +1,182 @@
+"""
+LLM响应缓存模块 - 按 (模型, 系统提示词, 用户提示词, 内容) 的哈希持久化缓存模型输出
+
+同样的字幕/提示词组合在崩溃重跑或删除投资建议文件后再次请求时直接命中本地缓存，不再产生API调用。
+缓存按总大小做LRU淘汰，并对每条记录设置过期时间。
+命中时只在内存中更新访问时间，索引在写入、淘汰、flush时或距上次保存超过INDEX_SAVE_INTERVAL后才落盘。
+"""
+
+import os
+import json
+import time
+import atexit
+import hashlib
+import threading
+
+CACHE_DIR = ".llm_cache"  # 缓存目录
+CACHE_MAX_BYTES = 200 * 1024 * 1024  # 缓存总大小上限（200MB）
+CACHE_TTL_SECONDS = 7 * 24 * 3600  # 缓存有效期（7天）
+INDEX_SAVE_INTERVAL = 60.0  # 只有命中（访问时间变化）时，索引最多每隔多少秒写一次磁盘
+
+
+def make_cache_key(model: str, sysprompt: str, userprompt: str, content: str) -> str:
+    """计算缓存键，各字段以长度前缀拼接，避免不同切分方式得到相同的键"""
+    sha = hashlib.sha256()
+    for part in (model, sysprompt, userprompt, content):
+        data = (part or "").encode("utf-8")
+        sha.update(f"{len(data)}:".encode("ascii"))
+        sha.update(data)
+    return sha.hexdigest()
+
+
+class LLMCache:
+    """磁盘LLM响应缓存，线程安全"""
+
+    def __init__(self, cache_dir: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES, ttl_seconds: int = CACHE_TTL_SECONDS):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._index = self._load_index()
+        self._dirty = False  # 内存中的访问时间是否有尚未写入磁盘的更新
+        self._last_saved = time.monotonic()
+
+    def _load_index(self) -> dict:
+        if not os.path.exists(self.index_path):
+            return {}
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"读取LLM缓存索引失败，将重建缓存: {str(e)}")
+            return {}
+
+    def _save_index(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self.index_path)
+        self._dirty = False
+        self._last_saved = time.monotonic()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.txt")
+
+    def _remove(self, key: str):
+        self._index.pop(key, None)
+        try:
+            os.remove(self._entry_path(key))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        """删除过期记录，再按最近访问时间淘汰直到总大小不超过上限"""
+        now = time.time()
+        for key in [k for k, meta in self._index.items() if now - meta["created"] > self.ttl_seconds]:
+            self._remove(key)
+
+        total = sum(meta["size"] for meta in self._index.values())
+        if total <= self.max_bytes:
+            return
+        for key in sorted(self._index, key=lambda k: self._index[k]["last_access"]):
+            total -= self._index[key]["size"]
+            self._remove(key)
+            if total <= self.max_bytes:
+                break
+
+    def get(self, key: str):
+        """读取缓存，未命中或已过期返回None"""
+        with self._lock:
+            meta = self._index.get(key)
+            if meta and time.time() - meta["created"] <= self.ttl_seconds:
+                try:
+                    with open(self._entry_path(key), "r", encoding="utf-8") as f:
+                        value = f.read()
+                    meta["last_access"] = time.time()
+                    self._dirty = True
+                    if time.monotonic() - self._last_saved >= INDEX_SAVE_INTERVAL:
+                        self._save_index()
+                    self.hits += 1
+                    return value
+                except FileNotFoundError:
+                    pass
+            if meta:
+                self._remove(key)
+                self._dirty = True
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: str, meta: dict = None):
+        """写入缓存并按需淘汰旧记录，meta为随记录保存在索引中的附加信息"""
+        if not value:
+            return
+        with self._lock:
+            path = self._entry_path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(value)
+            now = time.time()
+            self._index[key] = {
+                **(meta or {}),
+                "size": os.path.getsize(path),
+                "created": now,
+                "last_access": now
+            }
+            self._evict()
+            self._save_index()
+
+    def flush(self):
+        """把内存中尚未保存的访问时间写入索引（进程退出时对共享实例自动调用）"""
+        with self._lock:
+            if self._dirty:
+                self._save_index()
+
+    def stats(self) -> dict:
+        """返回命中/未命中次数及缓存占用"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._index),
+                "bytes": sum(meta["size"] for meta in self._index.values())
+            }
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            for key in list(self._index):
+                self._remove(key)
+            self._save_index()
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMCache:
+    """获取进程内共享的默认缓存实例"""
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = LLMCache()
+                atexit.register(_default_cache.flush)
+    return _default_cache
+
+
+def set_llm_cache(cache: LLMCache):
+    """替换进程内共享的默认缓存实例（例如基准测试时指向临时目录），返回原实例"""
+    global _default_cache
+    with _default_cache_lock:
+        previous = _default_cache
+        _default_cache = cache
+    return previous
+
+
+def get_cache_stats() -> dict:
+    """返回默认缓存的命中统计"""
+    return get_llm_cache().stats()
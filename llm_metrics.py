@@ -0,0 +1,160 @@
+"""
+LLM调用统计模块 - 记录每次模型调用的token用量、耗时和缓存命中情况
+
+deepseek_summary、stream_summary_to_file、extract_key_targets每次调用（包括命中缓存）都会记录一条：
+阶段、模型、提示词/输出的字符数与token数、耗时、是否命中缓存。
+run_all_tasks结束时按阶段打印汇总表，并把明细与汇总写入归档文件夹的 llm_metrics_<日期>.json，
+同一天多次运行的记录会追加到同一个文件。
+"""
+
+import os
+import json
+import time
+import threading
+from datetime import datetime
+
+DEFAULT_STAGE = "未分类"
+
+
+class LLMMetrics:
+    """进程内的模型调用记录器，线程安全"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = []
+        self._saved_count = 0
+
+    def record(self, stage: str, model: str, prompt_chars: int, completion_chars: int, seconds: float,
+               cached: bool = False, usage=None):
+        """记录一次调用
+
+        Args:
+            stage: 调用所属阶段（如"B站字幕总结"）
+            model: 模型名
+            prompt_chars: 提示词与输入内容的总字符数
+            completion_chars: 输出字符数
+            seconds: 调用耗时（包含限流等待与重试）
+            cached: 是否命中LLM缓存
+            usage: 接口返回的usage对象或字典，命中缓存或接口未返回时为None
+        """
+        prompt_tokens = completion_tokens = None
+        if usage is not None:
+            if isinstance(usage, dict):
+                prompt_tokens = usage.get("prompt_tokens")
+                completion_tokens = usage.get("completion_tokens")
+            else:
+                prompt_tokens = getattr(usage, "prompt_tokens", None)
+                completion_tokens = getattr(usage, "completion_tokens", None)
+        entry = {
+            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "stage": stage or DEFAULT_STAGE,
+            "model": model,
+            "cached": cached,
+            "prompt_chars": prompt_chars,
+            "completion_chars": completion_chars,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "seconds": round(seconds, 3)
+        }
+        with self._lock:
+            self._calls.append(entry)
+
+    def calls(self) -> list:
+        with self._lock:
+            return list(self._calls)
+
+    def save(self, archive_folder: str, current_date: str) -> str:
+        """把本次运行尚未写入的记录追加到归档文件夹的统计文件，并重新计算汇总
+
+        Returns:
+            str: 统计文件路径
+        """
+        path = os.path.join(archive_folder, f"llm_metrics_{current_date}.json")
+        with self._lock:
+            new_calls = self._calls[self._saved_count:]
+            saved_count = len(self._calls)
+
+        existing = []
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    existing = json.load(f).get("calls", [])
+            except Exception as e:
+                print(f"读取LLM调用统计文件失败，将重新生成: {str(e)}")
+
+        all_calls = existing + new_calls
+        data = {
+            "date": current_date,
+            "updated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "by_stage": summarize_calls(all_calls, "stage"),
+            "by_model": summarize_calls(all_calls, "model"),
+            "calls": all_calls
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._saved_count = saved_count
+        return path
+
+    def reset(self):
+        with self._lock:
+            self._calls = []
+            self._saved_count = 0
+
+
+def summarize_calls(calls: list, key: str = "stage") -> dict:
+    """按指定字段汇总调用次数、缓存命中、token用量和耗时"""
+    summary = {}
+    for call in calls:
+        group = summary.setdefault(call.get(key) or DEFAULT_STAGE, {
+            "calls": 0,
+            "cache_hits": 0,
+            "prompt_chars": 0,
+            "completion_chars": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "seconds": 0.0
+        })
+        group["calls"] += 1
+        group["cache_hits"] += 1 if call.get("cached") else 0
+        for field in ("prompt_chars", "completion_chars", "prompt_tokens", "completion_tokens"):
+            group[field] += call.get(field) or 0
+        group["seconds"] = round(group["seconds"] + (call.get("seconds") or 0.0), 3)
+    return summary
+
+
+def print_metrics_table(calls: list):
+    """按阶段打印调用统计表"""
+    if not calls:
+        print("本次运行没有模型调用")
+        return
+    summary = summarize_calls(calls, "stage")
+    total = summarize_calls(calls, "model")
+    print("\n模型调用统计（按阶段）:")
+    print(f"{'阶段':<16} {'调用':>5} {'缓存命中':>8} {'输入tokens':>11} {'输出tokens':>11} {'累计耗时(s)':>12}")
+    rows = sorted(summary.items(), key=lambda item: item[1]["seconds"], reverse=True)
+    for stage, group in rows:
+        print(f"{stage:<16} {group['calls']:>5} {group['cache_hits']:>8} {group['prompt_tokens']:>11} "
+              f"{group['completion_tokens']:>11} {group['seconds']:>12.1f}")
+    for model, group in total.items():
+        print(f"合计[{model}]: {group['calls']} 次调用，{group['cache_hits']} 次命中缓存，"
+              f"输入 {group['prompt_tokens']} tokens，输出 {group['completion_tokens']} tokens，"
+              f"累计耗时 {group['seconds']:.1f} 秒")
+
+
+_default_metrics = LLMMetrics()
+
+
+def get_llm_metrics() -> LLMMetrics:
+    """获取进程内共享的调用记录器"""
+    return _default_metrics
+
+
+def record_llm_call(stage: str, model: str, prompt_chars: int, completion_chars: int, started_at: float,
+                    cached: bool = False, usage=None):
+    """向共享记录器记录一次调用，started_at为time.perf_counter()记录的开始时间"""
+    _default_metrics.record(stage, model, prompt_chars, completion_chars, time.perf_counter() - started_at,
+                            cached=cached, usage=usage)
@@ -0,0 +1,221 @@
+"""
+LLM限流与重试模块 - 所有模型调用共用的自适应令牌桶与指数退避重试
+
+令牌桶控制每秒发起的请求数，并发信号量控制同时在途的请求数。
+收到429时按Retry-After暂停整个桶并把速率减半，连续成功后逐步恢复（AIMD），
+使并行总结尽量跑满服务端允许的速率而不持续触发限流。
+429、超时、连接错误和5xx按带抖动的指数退避重试，其余错误直接抛出。
+"""
+
+import time
+import random
+import threading
+import contextlib
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+LLM_RATE_LIMIT = 2.0  # 初始每秒请求数
+LLM_MIN_RATE = 0.2  # 限流后速率下限
+LLM_MAX_RATE = 8.0  # 自适应提升的速率上限
+LLM_RATE_INCREASE = 0.1  # 每次成功后速率的加性提升
+LLM_RATE_DECREASE = 0.5  # 每次被限流后速率的乘性衰减
+LLM_BURST = 4  # 令牌桶容量，允许的瞬时突发请求数
+LLM_MAX_CONCURRENCY = 8  # 同时在途的请求数上限
+LLM_MAX_RETRIES = 5  # 单次调用的最大重试次数
+BACKOFF_BASE = 1.0  # 指数退避基数（秒）
+BACKOFF_MAX = 60.0  # 单次退避上限（秒）
+
+RETRYABLE_STATUS_CODES = (408, 409, 429, 500, 502, 503, 504)
+# openai/httpx的超时与连接类异常名，按名称判断以免本模块依赖具体SDK版本
+RETRYABLE_ERROR_NAMES = (
+    "APITimeoutError", "APIConnectionError", "TimeoutException", "ConnectTimeout", "ReadTimeout",
+    "ConnectError", "ReadError", "RemoteProtocolError", "IncompleteRead", "ConnectionResetError",
+    "StreamInterruptedError"
+)
+
+
+class StreamInterruptedError(Exception):
+    """流式响应在收到结束标记前中断"""
+
+
+def get_status_code(error: Exception):
+    """取出异常携带的HTTP状态码，没有时返回None"""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None)
+    return status
+
+
+def parse_retry_after(error: Exception):
+    """从异常携带的响应头中解析Retry-After（秒），支持秒数、retry-after-ms和HTTP日期格式"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        retry_ms = headers.get("retry-after-ms")
+        if retry_ms:
+            return max(0.0, float(retry_ms) / 1000)
+        retry_after = headers.get("retry-after")
+        if not retry_after:
+            return None
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            retry_at = parsedate_to_datetime(retry_after)
+            return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except Exception:
+        return None
+
+
+def is_retryable(error: Exception) -> bool:
+    """429、超时、连接错误和5xx可以重试"""
+    status = get_status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+    return any(cls.__name__ in RETRYABLE_ERROR_NAMES for cls in type(error).__mro__)
+
+
+def backoff_delay(attempt: int, retry_after=None) -> float:
+    """第attempt次重试前的等待秒数：有Retry-After时以它为准并加少量抖动，否则为全抖动指数退避"""
+    if retry_after is not None:
+        return min(BACKOFF_MAX, retry_after) + random.uniform(0, BACKOFF_BASE)
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+
+class AdaptiveRateLimiter:
+    """自适应令牌桶限流器，线程安全"""
+
+    def __init__(self, rate: float = LLM_RATE_LIMIT, burst: int = LLM_BURST, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 min_rate: float = LLM_MIN_RATE, max_rate: float = LLM_MAX_RATE):
+        self.rate = rate
+        self.initial_rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.throttled_count = 0
+        self.retry_count = 0
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self._concurrency = threading.BoundedSemaphore(max_concurrency)
+
+    def acquire(self):
+        """阻塞直到拿到一个令牌"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    @contextlib.contextmanager
+    def slot(self):
+        """拿到令牌并占用一个并发名额，用于包裹一次请求（包括流式请求的整个读取过程）"""
+        self.acquire()
+        with self._concurrency:
+            yield
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + LLM_RATE_INCREASE)
+
+    def on_throttled(self, retry_after=None):
+        """被限流：速率乘性衰减，并在Retry-After期间暂停所有调用方"""
+        with self._lock:
+            self.throttled_count += 1
+            self.rate = max(self.min_rate, self.rate * LLM_RATE_DECREASE)
+            self._tokens = 0.0
+            self._updated = time.monotonic()
+            if retry_after:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+    def record_failure(self, error: Exception, attempt: int) -> float:
+        """记录一次可重试的失败，返回重试前应等待的秒数"""
+        retry_after = parse_retry_after(error)
+        if get_status_code(error) == 429:
+            self.on_throttled(retry_after)
+        with self._lock:
+            self.retry_count += 1
+        return backoff_delay(attempt, retry_after)
+
+    def call(self, func, *args, description: str = "模型调用", max_retries: int = LLM_MAX_RETRIES, **kwargs):
+        """在限流下调用func，可重试的错误按退避策略重试，超过次数后抛出最后一次异常"""
+        attempt = 0
+        while True:
+            try:
+                with self.slot():
+                    result = func(*args, **kwargs)
+                self.on_success()
+                return result
+            except Exception as e:
+                if not is_retryable(e) or attempt >= max_retries:
+                    raise
+                delay = self.record_failure(e, attempt)
+                attempt += 1
+                print(f"{description}失败（{type(e).__name__}: {str(e)[:80]}），{delay:.1f} 秒后第{attempt}次重试")
+                time.sleep(delay)
+
+    def settings(self) -> dict:
+        """创建时的限流参数"""
+        return {
+            "rate": self.initial_rate,
+            "burst": self.burst,
+            "max_concurrency": self.max_concurrency,
+            "min_rate": self.min_rate,
+            "max_rate": self.max_rate
+        }
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "rate": round(self.rate, 3),
+                "throttled": self.throttled_count,
+                "retries": self.retry_count
+            }
+
+
+_default_limiter = None
+_default_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> AdaptiveRateLimiter:
+    """获取进程内共享的限流器"""
+    global _default_limiter
+    if _default_limiter is None:
+        with _default_limiter_lock:
+            if _default_limiter is None:
+                _default_limiter = AdaptiveRateLimiter()
+    return _default_limiter
+
+
+def configure_rate_limiter(**settings) -> AdaptiveRateLimiter:
+    """以指定参数（rate、burst、max_concurrency、min_rate、max_rate）新建共享限流器并替换原实例
+
+    之前的AIMD速率、暂停状态与统计全部丢弃（例如基准测试的每一轮独立开始），返回新实例
+    """
+    global _default_limiter
+    limiter = AdaptiveRateLimiter(**settings)
+    with _default_limiter_lock:
+        _default_limiter = limiter
+    return limiter
+
+
+def reset_rate_limiter() -> AdaptiveRateLimiter:
+    """以默认参数重建共享限流器"""
+    return configure_rate_limiter()
+
+
+def call_with_retry(func, *args, description: str = "模型调用", **kwargs):
+    """通过共享限流器调用func（带重试）"""
+    return get_rate_limiter().call(func, *args, description=description, **kwargs)
@@ -2,13 +2,17 @@ import json
 import re
 import time
 from datetime import datetime, timedelta
-from openai import OpenAI
 import akshare as ak
 import pandas as pd
 import numpy as np
 from urllib3.exceptions import HTTPError
 import requests
 
+from deepseek_client import get_deepseek_client, get_api_key
+from deepseek_summary import DEEPSEEK_MODEL
+from llm_rate_limiter import call_with_retry
+from llm_metrics import record_llm_call
+
 try:
     import yfinance as yf
     YFINANCE_AVAILABLE = True
@@ -46,23 +50,6 @@ def _wait_for_rate_limit():
     _last_request_time = time.time()
 
 
-def load_api_key_from_file():
-    """从deepseek_api_key.txt文件读取key值"""
-    try:
-        with open("deepseek_api_key.txt", "r", encoding="utf-8") as f:
-            api_key = f.read().strip()
-            if not api_key:
-                print("警告: deepseek_api_key.txt文件为空")
-                return ""
-            return api_key
-    except FileNotFoundError:
-        print("错误: 未找到deepseek_api_key.txt文件")
-        return ""
-    except Exception as e:
-        print(f"读取key文件时出错: {e}")
-        return ""
-
-
 def parse_targets_from_text(text):
     """直接从文本中解析JSON格式的标的信息
     
@@ -133,12 +120,11 @@ def extract_key_targets(investment_advice, source_name=""):
     
     print(f"[{source_name}] 未找到结构化标的信息，尝试使用DeepSeek提取...")
     
-    DEEPSEEK_API_KEY = load_api_key_from_file()
-    if not DEEPSEEK_API_KEY:
+    if not get_api_key():
         print("无法获取DeepSeek API Key，跳过标的提取")
         return {"indices": [], "stocks": []}
     
-    client = OpenAI(api_key=DEEPSEEK_API_KEY, base_url="https://api.deepseek.com")
+    client = get_deepseek_client()
     
     system_prompt = """你是一个专业的金融分析师，擅长从投资建议中提取关键投资标的。
 你的任务是从给定的投资建议文本中提取出重点关注的指数和股票。
@@ -167,8 +153,11 @@ def extract_key_targets(investment_advice, source_name=""):
 请严格按照JSON格式输出："""
 
     try:
-        response = client.chat.completions.create(
-            model="deepseek-chat",
+        started_at = time.perf_counter()
+        response = call_with_retry(
+            client.chat.completions.create,
+            description=f"[{source_name}] 标的提取",
+            model=DEEPSEEK_MODEL,
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}
@@ -177,6 +166,8 @@ def extract_key_targets(investment_advice, source_name=""):
         )
         
         result_text = response.choices[0].message.content.strip()
+        record_llm_call(f"{source_name}标的提取", DEEPSEEK_MODEL, len(system_prompt) + len(user_prompt), len(result_text),
+                        started_at, usage=getattr(response, "usage", None))
         
         json_match = re.search(r'\{[\s\S]*\}', result_text)
         if json_match:
@@ -745,8 +736,8 @@ def format_momentum_report(results):
     return "\n".join(report_lines)
 
 
-def run_momentum_analysis(bili_advice=None, wechat_advice=None, weibo_advice=None):
-    """运行完整的动量分析流程
+def extract_all_targets(bili_advice=None, wechat_advice=None, weibo_advice=None):
+    """从各来源投资建议中提取并合并重点关注标的
     
     Args:
         bili_advice: B站投资建议
@@ -754,7 +745,7 @@ def run_momentum_analysis(bili_advice=None, wechat_advice=None, weibo_advice=Non
         weibo_advice: 微博投资建议
     
     Returns:
-        tuple: (动量分析报告文本, 分析结果字典)
+        dict: 合并后的标的
     """
     print("\n" + "=" * 50)
     print("开始提取重点关注标的")
@@ -774,7 +765,23 @@ def run_momentum_analysis(bili_advice=None, wechat_advice=None, weibo_advice=Non
         targets = extract_key_targets(weibo_advice, "微博")
         all_targets.append(targets)
     
-    merged_targets = merge_targets(all_targets)
+    return merge_targets(all_targets)
+
+
+def run_momentum_analysis(bili_advice=None, wechat_advice=None, weibo_advice=None, merged_targets=None):
+    """运行完整的动量分析流程
+    
+    Args:
+        bili_advice: B站投资建议
+        wechat_advice: 微信投资建议
+        weibo_advice: 微博投资建议
+        merged_targets: 已提取好的合并标的，提供时跳过标的提取
+    
+    Returns:
+        tuple: (动量分析报告文本, 分析结果字典)
+    """
+    if merged_targets is None:
+        merged_targets = extract_all_targets(bili_advice, wechat_advice, weibo_advice)
     
     if not merged_targets["indices"] and not merged_targets["stocks"]:
         print("未提取到任何关注标的，跳过动量分析")
@@ -0,0 +1,229 @@
+"""
+流水线DAG调度模块 - 按依赖关系调度各阶段任务，并按内容哈希做阶段级断点续跑
+
+每个节点声明自己的上游依赖，节点的输入哈希由节点名、静态参数和所有上游输出的内容哈希组成。
+节点成功后把输出及其哈希写入检查点文件；再次运行时，输入哈希未变化且输出文件仍在的节点直接复用检查点结果。
+互不依赖的节点在线程池中并行执行。节点抛出异常时不写检查点，下游节点以None作为该依赖的输入继续执行，
+下次运行会从失败的节点重新开始。
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+import concurrent.futures
+from datetime import datetime
+
+
+def hash_value(value) -> str:
+    """计算任意可JSON序列化值的内容哈希"""
+    payload = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def hash_file(path: str) -> str:
+    """计算文件内容哈希，文件不存在时返回空字符串"""
+    if not os.path.exists(path):
+        return ""
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def snapshot_files(paths) -> dict:
+    """生成文件路径到内容哈希的映射，作为节点输出时下游即按文件内容判断是否需要重跑"""
+    return {path: hash_file(path) for path in sorted(set(paths)) if os.path.exists(path)}
+
+
+def _is_empty(value) -> bool:
+    return value is None or (hasattr(value, "__len__") and len(value) == 0)
+
+
+class PipelineNode:
+    """流水线节点
+
+    Args:
+        name: 节点名，同时作为下游节点函数的关键字参数名
+        func: 节点函数，以 上游节点名=上游输出 的关键字参数调用，返回值需可JSON序列化
+        deps: 上游节点名列表
+        params: 参与输入哈希计算的静态参数（如分析日期），参数变化时节点重跑
+        output_files: 可选，接收节点输出并返回必须存在的文件路径列表，文件缺失时检查点失效
+        checkpoint_empty: 空结果（None/空列表/空字符串）是否写入检查点，默认不写，避免把失败当作完成
+    """
+
+    def __init__(self, name: str, func, deps=(), params=None, output_files=None, checkpoint_empty: bool = False):
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+        self.params = params or {}
+        self.output_files = output_files
+        self.checkpoint_empty = checkpoint_empty
+
+
+class PipelineDAG:
+    """带检查点的DAG调度器"""
+
+    def __init__(self, checkpoint_path: str, max_workers: int = 4):
+        self.checkpoint_path = checkpoint_path
+        self.max_workers = max_workers
+        self.nodes = {}
+        self.node_status = {}
+        self._lock = threading.Lock()
+        self._checkpoint = self._load_checkpoint()
+
+    def add_node(self, node: PipelineNode):
+        if node.name in self.nodes:
+            raise ValueError(f"重复的流水线节点: {node.name}")
+        self.nodes[node.name] = node
+        return node
+
+    def _load_checkpoint(self) -> dict:
+        if not os.path.exists(self.checkpoint_path):
+            return {"nodes": {}}
+        try:
+            with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            data.setdefault("nodes", {})
+            return data
+        except Exception as e:
+            print(f"读取流水线检查点失败，将从头执行: {str(e)}")
+            return {"nodes": {}}
+
+    def _save_checkpoint(self):
+        # 先写临时文件再替换，避免进程中途崩溃留下损坏的检查点
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._checkpoint, f, ensure_ascii=False, indent=2, default=str)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _topological_order(self) -> list:
+        order = []
+        visiting = set()
+        visited = set()
+
+        def visit(name, path):
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f"流水线存在循环依赖: {' → '.join(path + [name])}")
+            if name not in self.nodes:
+                raise ValueError(f"节点 {path[-1]} 依赖了不存在的节点: {name}")
+            visiting.add(name)
+            for dep in self.nodes[name].deps:
+                visit(dep, path + [name])
+            visiting.discard(name)
+            visited.add(name)
+            order.append(name)
+
+        for name in self.nodes:
+            visit(name, [])
+        return order
+
+    def _input_hash(self, node: PipelineNode, output_hashes: dict) -> str:
+        return hash_value({
+            "node": node.name,
+            "params": node.params,
+            "deps": {dep: output_hashes.get(dep) for dep in node.deps}
+        })
+
+    def _checkpoint_valid(self, node: PipelineNode, record: dict, input_hash: str) -> bool:
+        if not record or record.get("input_hash") != input_hash:
+            return False
+        if node.output_files:
+            try:
+                paths = node.output_files(record.get("output"))
+            except Exception:
+                return False
+            if any(not os.path.exists(path) for path in paths):
+                return False
+        return True
+
+    def _execute(self, node: PipelineNode, inputs: dict):
+        start_time = time.time()
+        output = node.func(**inputs)
+        return output, time.time() - start_time
+
+    def run(self) -> dict:
+        """执行整个DAG，返回各节点的输出"""
+        order = self._topological_order()
+        outputs = {}
+        output_hashes = {}
+        remaining = list(order)
+        running = {}
+        self.node_status = {}
+
+        print(f"\n>>> 流水线共 {len(order)} 个阶段: {' → '.join(order)}")
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="pipeline") as executor:
+            while remaining or running:
+                # 提交所有上游已完成的节点
+                for name in list(remaining):
+                    node = self.nodes[name]
+                    if any(dep not in self.node_status for dep in node.deps):
+                        continue
+                    remaining.remove(name)
+
+                    input_hash = self._input_hash(node, output_hashes)
+                    record = self._checkpoint["nodes"].get(name)
+                    if self._checkpoint_valid(node, record, input_hash):
+                        outputs[name] = record.get("output")
+                        output_hashes[name] = record.get("output_hash")
+                        self.node_status[name] = {"status": "跳过", "seconds": 0.0}
+                        print(f">>> [{name}] 输入未变化，复用检查点结果")
+                        continue
+
+                    inputs = {dep: outputs.get(dep) for dep in node.deps}
+                    print(f">>> [{name}] 开始执行")
+                    running[executor.submit(self._execute, node, inputs)] = (name, input_hash)
+
+                if not running:
+                    if remaining:
+                        # 理论上拓扑序保证不会出现，防御性退出
+                        raise RuntimeError(f"流水线节点无法调度: {remaining}")
+                    break
+
+                done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    name, input_hash = running.pop(future)
+                    node = self.nodes[name]
+                    try:
+                        output, seconds = future.result()
+                    except Exception as e:
+                        print(f">>> [{name}] 执行失败: {str(e)}")
+                        outputs[name] = None
+                        output_hashes[name] = None
+                        self.node_status[name] = {"status": "失败", "seconds": 0.0, "error": str(e)}
+                        continue
+
+                    outputs[name] = output
+                    output_hashes[name] = hash_value(output)
+                    self.node_status[name] = {"status": "完成", "seconds": seconds}
+                    print(f">>> [{name}] 完成，耗时 {seconds:.1f} 秒")
+
+                    if _is_empty(output) and not node.checkpoint_empty:
+                        continue
+                    with self._lock:
+                        self._checkpoint["nodes"][name] = {
+                            "input_hash": input_hash,
+                            "output_hash": output_hashes[name],
+                            "output": output,
+                            "seconds": round(seconds, 3),
+                            "finished_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                        }
+                        try:
+                            self._save_checkpoint()
+                        except Exception as e:
+                            print(f"保存流水线检查点失败: {str(e)}")
+
+        return outputs
+
+    def print_summary(self):
+        """打印各节点的执行状态与耗时"""
+        if not self.node_status:
+            return
+        print("\n流水线各阶段状态:")
+        for name, status in self.node_status.items():
+            print(f"- {name}: {status['status']}（{status['seconds']:.1f} 秒）")
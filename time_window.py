@@ -0,0 +1,224 @@
+"""
+时间窗口模块 - 各平台共用的"限定时间内"判断
+
+分析时间窗口每次运行只计算一次（运行入口在启动各平台任务前调用refresh_time_window，各平台只调用get_time_window读取），
+表示为绝对时间戳区间 [start, end)：
+平时为 LIMIT_HOURS 小时前到现在，周末（含周一9点前，尚未开盘）为周五15:00收盘到现在。
+发布时间（秒/毫秒时间戳，或页面文字：刚刚、X分钟前、X小时前、今天/昨天/前天 HH:MM、X天前、MM-DD、YYYY-MM-DD HH:MM）
+由模块级预编译的正则解析为时间戳后与窗口精确比较；今天、昨天等日期的零点时间戳在窗口创建时算好，
+逐条判断时不再调用datetime.now()、不再重新计算周末标记。
+只精确到天的日期取当天结束时刻（不晚于现在），不会因为精度不足漏掉窗口内的内容。
+
+运行 python time_window.py 执行表驱动自检与解析性能基准。
+"""
+
+import re
+import time
+import threading
+from datetime import datetime, timedelta
+
+from date_utils import get_friday_date_for_weekend
+
+LIMIT_HOURS = 18  # 平时限定小时内（18小时），周末只收录周五收盘后发布的内容
+MARKET_CLOSE_HOUR = 15  # 周五收盘时间，周末窗口的起点
+MARKET_OPEN_HOUR = 9  # 周一开盘前仍使用周末窗口
+CLOCK_SKEW_SECONDS = 600  # 窗口终点的容差，发布时间因时钟偏差略晚于现在的内容仍然收录
+TIME_WINDOW_MAX_AGE_SECONDS = 3600  # 未经refresh_time_window、按需创建的共享窗口的最长使用时间，过期后自动重算
+
+RELATIVE_UNIT_SECONDS = {'秒': 1, '分钟': 60, '小时': 3600, '天': 86400}
+RELATIVE_DAY_OFFSETS = (('今天', 0), ('昨天', 1), ('前天', 2))
+
+_RELATIVE_RE = re.compile(r'(\d+)\s*(秒|分钟|小时|天)前')
+_DATE_RE = re.compile(r'(?:(\d{4})[-/年])?(\d{1,2})[-/月](\d{1,2})')
+_CLOCK_RE = re.compile(r'(\d{1,2}):(\d{2})')
+_EPOCH_RE = re.compile(r'\d{10}(?:\d{3})?')
+
+
+class TimeWindow:
+    """分析时间窗口 [start, end)，创建后不可变，可在多线程中共用
+
+    Args:
+        now: 窗口的"现在"，默认取当前时间
+        limit_hours: 平时的窗口长度（小时）
+    """
+
+    def __init__(self, now: datetime = None, limit_hours: float = LIMIT_HOURS):
+        now = now or datetime.now()
+        weekday = now.weekday()  # 0=周一, 6=周日
+        self.now = now
+        self.limit_hours = limit_hours
+        self.is_weekend_period = weekday >= 5 or (weekday == 0 and now.hour < MARKET_OPEN_HOUR)
+        self.now_ts = now.timestamp()
+        if self.is_weekend_period:
+            friday_close_time = get_friday_date_for_weekend(now).replace(hour=MARKET_CLOSE_HOUR, minute=0, second=0,
+                                                                         microsecond=0)
+            self.start = friday_close_time.timestamp()
+        else:
+            self.start = self.now_ts - limit_hours * 3600
+        self.end = self.now_ts + CLOCK_SKEW_SECONDS
+        self._day_starts = {}  # (年, 月, 日) -> 零点时间戳
+        self._relative_day_starts = {}  # 今天/昨天/前天 -> 零点时间戳
+        for word, offset in RELATIVE_DAY_OFFSETS:
+            day = now - timedelta(days=offset)
+            self._relative_day_starts[word] = self._day_start(day.year, day.month, day.day)
+
+    def _day_start(self, year: int, month: int, day: int):
+        """某天零点的时间戳（按日期缓存），日期无效时返回None"""
+        key = (year, month, day)
+        start = self._day_starts.get(key)
+        if start is None and key not in self._day_starts:
+            try:
+                start = datetime(year, month, day).timestamp()
+            except ValueError:
+                start = None
+            self._day_starts[key] = start
+        return start
+
+    def _at_day(self, day_start: float, text: str) -> float:
+        """某天的具体时刻：文字中有HH:MM时取该时刻，否则取当天结束时刻（不晚于现在）"""
+        clock = _CLOCK_RE.search(text)
+        if clock:
+            return day_start + int(clock.group(1)) * 3600 + int(clock.group(2)) * 60
+        return min(day_start + 86399, self.now_ts)
+
+    def parse(self, value):
+        """把发布时间（时间戳或页面文字）解析为秒级时间戳，无法解析时返回None"""
+        if value is None:
+            return None
+        if isinstance(value, (int, float)):
+            return value / 1000 if value > 1e11 else float(value)
+
+        text = value.strip()
+        if not text or "刚刚" in text:
+            return self.now_ts
+        if _EPOCH_RE.fullmatch(text):
+            return self.parse(int(text))
+
+        match = _RELATIVE_RE.search(text)
+        if match:
+            return self.now_ts - int(match.group(1)) * RELATIVE_UNIT_SECONDS[match.group(2)]
+
+        for word, day_start in self._relative_day_starts.items():
+            if word in text:
+                return self._at_day(day_start, text)
+
+        match = _DATE_RE.match(text)
+        if match:
+            year = int(match.group(1)) if match.group(1) else self.now.year
+            day_start = self._day_start(year, int(match.group(2)), int(match.group(3)))
+            # 只有月日且在未来时，说明是去年的（比如1月1日刚过时）
+            if day_start is not None and not match.group(1) and day_start > self.now_ts:
+                day_start = self._day_start(year - 1, int(match.group(2)), int(match.group(3)))
+            if day_start is not None:
+                return self._at_day(day_start, text)
+        return None
+
+    def contains(self, value) -> bool:
+        """发布时间是否在窗口内，无法解析时返回False"""
+        timestamp = self.parse(value)
+        return timestamp is not None and self.start <= timestamp < self.end
+
+    __contains__ = contains
+
+    def describe(self) -> str:
+        start = datetime.fromtimestamp(self.start).strftime('%Y-%m-%d %H:%M')
+        reason = "周末，周五收盘后" if self.is_weekend_period else f"最近{self.limit_hours}小时"
+        return f"{start} 至 {self.now.strftime('%Y-%m-%d %H:%M')}（{reason}）"
+
+
+_windows = {}
+_windows_lock = threading.Lock()
+
+
+def get_time_window(limit_hours: float = LIMIT_HOURS) -> TimeWindow:
+    """获取进程内共享的时间窗口
+
+    refresh_time_window设置的窗口在下一次refresh前保持不变，运行时间再长也不会在中途被替换；
+    从未刷新过时按需创建，创建超过TIME_WINDOW_MAX_AGE_SECONDS后自动重算
+    """
+    with _windows_lock:
+        cached = _windows.get(limit_hours)
+        if cached is None or (not cached[2] and time.monotonic() - cached[0] > TIME_WINDOW_MAX_AGE_SECONDS):
+            cached = (time.monotonic(), TimeWindow(limit_hours=limit_hours), False)
+            _windows[limit_hours] = cached
+        return cached[1]
+
+
+def refresh_time_window(limit_hours: float = LIMIT_HOURS) -> TimeWindow:
+    """每次运行开始、启动各平台任务之前调用一次，以当前时间重新计算共享窗口，本次运行的所有判断使用同一个窗口
+
+    平台任务内部不应调用本函数，否则并行运行的其他平台会在中途换用新窗口
+    """
+    window = TimeWindow(limit_hours=limit_hours)
+    with _windows_lock:
+        _windows[limit_hours] = (time.monotonic(), window, True)
+    return window
+
+
+# 自检用例：(现在, 发布时间, 期望是否在窗口内)
+# 2025-06-11为周三，2025-06-14为周六，2025-06-16为周一
+SELF_CHECK_CASES = [
+    (datetime(2025, 6, 11, 10, 0), "刚刚", True),
+    (datetime(2025, 6, 11, 10, 0), "30分钟前", True),
+    (datetime(2025, 6, 11, 10, 0), "18小时前", True),
+    (datetime(2025, 6, 11, 10, 0), "19小时前", False),
+    (datetime(2025, 6, 11, 10, 0), "今天 08:15", True),
+    (datetime(2025, 6, 11, 10, 0), "昨天 16:30", True),
+    (datetime(2025, 6, 11, 10, 0), "昨天 15:59", False),
+    (datetime(2025, 6, 11, 10, 0), "昨天", True),
+    (datetime(2025, 6, 11, 10, 0), "前天 23:00", False),
+    (datetime(2025, 6, 11, 10, 0), "2天前", False),
+    (datetime(2025, 6, 11, 10, 0), "06-10", True),
+    (datetime(2025, 6, 11, 10, 0), "06-09", False),
+    (datetime(2025, 6, 11, 10, 0), "2025-06-10 17:20", True),
+    (datetime(2025, 6, 11, 10, 0), "2025-06-10 12:00", False),
+    (datetime(2025, 6, 11, 10, 0), "6月10日 20:00", True),
+    (datetime(2025, 6, 11, 10, 0), datetime(2025, 6, 11, 9, 0).timestamp(), True),
+    (datetime(2025, 6, 11, 10, 0), int(datetime(2025, 6, 11, 9, 0).timestamp() * 1000), True),
+    (datetime(2025, 6, 11, 10, 0), str(int(datetime(2025, 6, 10, 9, 0).timestamp())), False),
+    (datetime(2025, 6, 11, 10, 0), 0, False),
+    (datetime(2025, 6, 11, 10, 0), "无法解析", False),
+    (datetime(2025, 6, 14, 12, 0), "昨天 15:30", True),
+    (datetime(2025, 6, 14, 12, 0), "昨天 14:30", False),
+    (datetime(2025, 6, 14, 12, 0), "20小时前", True),
+    (datetime(2025, 6, 14, 12, 0), "22小时前", False),
+    (datetime(2025, 6, 16, 8, 0), "2天前", True),
+    (datetime(2025, 6, 16, 8, 0), "06-13 16:00", True),
+    (datetime(2025, 6, 16, 8, 0), "06-13 09:00", False),
+    (datetime(2026, 1, 1, 10, 0), "12-31 20:00", True),
+    (datetime(2026, 1, 1, 10, 0), "12-31 10:00", False),
+]
+
+
+def run_self_check() -> bool:
+    """执行表驱动自检，打印失败用例，全部通过时返回True"""
+    failures = 0
+    for now, value, expected in SELF_CHECK_CASES:
+        actual = TimeWindow(now).contains(value)
+        if actual != expected:
+            failures += 1
+            print(f"自检失败: 现在={now:%Y-%m-%d %H:%M} 发布时间={value!r} 期望={expected} 实际={actual}")
+    print(f"时间窗口自检：{len(SELF_CHECK_CASES) - failures}/{len(SELF_CHECK_CASES)} 通过")
+    return failures == 0
+
+
+def run_benchmark(iterations: int = 200000):
+    """解析性能基准：共享窗口上逐条判断混合格式发布时间的耗时"""
+    window = TimeWindow()
+    samples = ["5分钟前", "3小时前", "昨天 16:30", "06-10", "2025-06-10 17:20", "刚刚", int(window.now_ts) - 3600]
+    started = time.perf_counter()
+    for i in range(iterations):
+        window.contains(samples[i % len(samples)])
+    elapsed = time.perf_counter() - started
+    print(f"逐条判断：{iterations} 次，{elapsed * 1e9 / iterations:.0f} ns/次")
+
+    started = time.perf_counter()
+    for _ in range(iterations // 100):
+        TimeWindow()
+    elapsed = time.perf_counter() - started
+    print(f"创建窗口：{iterations // 100} 次，{elapsed * 1e6 / (iterations // 100):.1f} µs/次（每次运行只需一次）")
+
+
+if __name__ == "__main__":
+    if run_self_check():
+        run_benchmark()
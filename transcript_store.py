@@ -0,0 +1,74 @@
+"""
+字幕存储模块 - 按BV号保存字幕/语音识别文本，与日期无关
+
+每日归档文件夹中的字幕文件按标题命名，视频隔天被重新列出或标题标点变化时会重新下载和识别。
+这里以BV号为键把字幕文本保存在全局目录中，任何一天的运行都可以直接复用已有的字幕或whisper识别结果。
+存储复用LLMCache的索引、过期和按总大小LRU淘汰逻辑，索引中额外记录标题、cid和来源。
+"""
+
+import os
+import re
+import atexit
+import threading
+
+from llm_cache import LLMCache
+
+TRANSCRIPT_STORE_DIR = ".transcript_store"  # 字幕存储目录
+TRANSCRIPT_STORE_MAX_BYTES = 500 * 1024 * 1024  # 存储总大小上限（500MB）
+TRANSCRIPT_STORE_TTL_SECONDS = 180 * 24 * 3600  # 字幕有效期（180天）
+
+_BVID_PATTERN = re.compile(r'(BV[0-9A-Za-z]{10})')
+
+
+def get_video_bvid(video: dict):
+    """取视频的BV号：优先使用video['bvid']，否则从URL中解析，取不到返回None"""
+    if video.get('bvid'):
+        return video['bvid']
+    match = _BVID_PATTERN.search(video.get('url', ''))
+    return match.group(1) if match else None
+
+
+class TranscriptStore(LLMCache):
+    """按BV号存取字幕文本，线程安全"""
+
+    def __init__(self, store_dir: str = TRANSCRIPT_STORE_DIR, max_bytes: int = TRANSCRIPT_STORE_MAX_BYTES,
+                 ttl_seconds: int = TRANSCRIPT_STORE_TTL_SECONDS):
+        super().__init__(store_dir, max_bytes, ttl_seconds)
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.txt")
+
+    def get_transcript(self, bvid: str):
+        """读取字幕文本，不存在或已过期返回None"""
+        if not bvid:
+            return None
+        return self.get(bvid)
+
+    def put_transcript(self, bvid: str, text: str, title: str = "", source: str = "", cid=None):
+        """保存字幕文本
+
+        Args:
+            bvid: 视频BV号
+            text: 字幕纯文本
+            title: 视频标题
+            source: 字幕来源（subtitle: B站字幕；whisper: 语音识别）
+            cid: 视频cid（已知时记录）
+        """
+        if not bvid or not text:
+            return
+        self.set(bvid, text, meta={"title": title, "source": source, "cid": cid})
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_transcript_store() -> TranscriptStore:
+    """获取进程内共享的字幕存储"""
+    global _default_store
+    if _default_store is None:
+        with _default_store_lock:
+            if _default_store is None:
+                _default_store = TranscriptStore()
+                atexit.register(_default_store.flush)
+    return _default_store
@@ -1,14 +1,15 @@
 import requests, math, time, random, json, os, re
 from datetime import datetime, date, timedelta
 from tqdm import tqdm
-from deepseek_summary import deepseek_summary
+from chunked_summary import map_reduce_summary
 
 # 从date_utils导入日期处理函数
 try:
-    from date_utils import get_current_analysis_date, ensure_archive_folder, print_date_info, get_friday_date_for_weekend
+    from date_utils import get_current_analysis_date, ensure_archive_folder, print_date_info
 except ImportError:
     # 如果导入失败，定义本地版本（已废弃，使用date_utils模块）
     pass
+from time_window import get_time_window, refresh_time_window
 # 导入自动登录模块
 try:
     from wechat_login import update_wechat_cookie, check_cookie_validity
@@ -141,33 +142,9 @@ def get_total_count(fakeid):
 
 
 def is_today_article(article):
-    """检查文章是否为限定时间内发布（周末只收录周五收盘后发布的内容）"""
-    try:
-        # 从文章信息中获取发布时间戳
-        create_time = article.get("create_time", 0)
-        if create_time:
-            # 将时间戳转换为datetime对象
-            article_datetime = datetime.fromtimestamp(create_time)
-            now = datetime.now()
-            
-            # 检查是否为周末
-            weekday = now.weekday()  # 0=周一, 6=周日
-            is_weekend = weekday >= 5  # 5=周六, 6=周日
-            
-            if is_weekend:
-                # 使用date_utils模块的函数计算最近的周五日期
-                friday_date = get_friday_date_for_weekend(now)
-                # 设置周五收盘时间为15:00
-                friday_close_time = friday_date.replace(hour=15, minute=0, second=0, microsecond=0)
-                # 只收录周五收盘后发布的内容
-                return article_datetime >= friday_close_time
-            else:
-                # 平时使用18小时限制
-                time_diff = (now - article_datetime).total_seconds() / 3600
-                return time_diff <= LIMIT_HOURS
-        return False
-    except:
-        return False
+    """检查文章是否为限定时间内发布（共享的time_window，周末只收录周五收盘后发布的内容）"""
+    create_time = article.get("create_time", 0)
+    return bool(create_time) and get_time_window(LIMIT_HOURS).contains(create_time)
 
 
 def get_content_list(fakeid, account_name, per_page=5):
@@ -374,9 +351,11 @@ def save_daily_content(all_content):
     print(f"完整文章内容已保存到 archive_{today} 目录")
 
 
-def get_all_accounts_daily_content():
-    """获取所有公众号的当日文章内容"""
+def get_all_accounts_daily_content(cancel_event=None):
+    """获取所有公众号的当日文章内容，cancel_event被设置（任务超时）时不再处理后续公众号"""
     all_content = {}
+    # 时间窗口由运行入口计算一次，这里只读取
+    print(f"时间窗口：{get_time_window(LIMIT_HOURS).describe()}")
     
     for fakeid, account_name in account_list.items():
         print(f"\n{'='*60}")
@@ -405,15 +384,33 @@ def get_all_accounts_daily_content():
         if random.random() < 0.2:
             delay = random.uniform(15, 25)
             print(f"  公众号切换，添加较长延迟: {delay:.1f}秒")
-            time.sleep(delay)
         else:
             # 正常切换延迟：8-12秒
             delay = random.uniform(8, 12)
+        if cancel_event is None:
             time.sleep(delay)
+        elif cancel_event.wait(delay):
+            # 任务已超时被放弃，提前结束等待
+            print("微信任务已取消，停止获取后续公众号")
+            break
     
     return all_content
 
 
+def list_article_files(today):
+    """列出当日归档目录中的公众号文章文件（流水线获取阶段的输出快照，不含下游生成的投资建议文件）"""
+    archive_dir = f"archive_{today}"
+    if not os.path.exists(archive_dir):
+        return []
+    
+    files = []
+    for filename in os.listdir(archive_dir):
+        if filename.startswith('wechat_') and filename.endswith('.txt') and not filename.endswith('_summary.txt') \
+                and not filename.startswith('wechat_投资建议_'):
+            files.append(os.path.join(archive_dir, filename))
+    return files
+
+
 def collect_all_articles_content(today):
     """收集当日所有公众号文章内容"""
     # 确保使用传入的today参数作为归档目录名
@@ -440,20 +437,25 @@ def collect_all_articles_content(today):
     return '\n\n'.join(all_articles_content)
 
 
-def generate_investment_advice(all_content, today):
-    """基于所有文章内容生成投资建议"""
+def generate_investment_advice(all_content, today, cancel_event=None):
+    """基于所有文章内容生成投资建议，cancel_event在生成期间被设置时不写入投资建议文件并返回None"""
     print("开始生成投资分析建议...")
     
     # 确保使用传入的today参数作为归档目录名
     archive_dir = f"archive_{today}"
     
     # 调用deepseek进行投资分析
-    investment_advice = deepseek_summary(
+    investment_advice = map_reduce_summary(
         all_content,
         sysprompt="你是一个专业的金融分析师，擅长基于多份财经市场分析报告给出投资建议。请结合宏观经济、市场情绪、行业趋势等多个维度进行分析。",
-        userprompt='''这些是最近限定时间内各大财经公众号的文章内容，请基于以下所有文章内容，给出未来几天的投资建议，包括：\n1. 整体市场判断\n2. 重点行业/板块分析\n3. 具体投资策略\n4. 风险提示\n\n请详细分析并以自然文本格式给出专业建议。\n\n最后，请将所有涉及到的重点关注的指数和股票以严格的JSON格式附加在末尾，格式如下：\n```json\n{\n    "indices": [\n        {"code": "000001", "name": "上证指数"},\n        {"code": "399006", "name": "创业板指"}\n    ],\n    "stocks": [\n        {"code": "600519", "name": "贵州茅台"},\n        {"code": "000858", "name": "五粮液"}\n    ]\n}\n```\n注意：\n1. 指数代码格式：上证指数"000001"，深证成指"399001"，创业板指"399006"，科创50"000688"等\n2. 股票代码格式：6位数字代码，如"600519"、"000001"等\n3. 只列出明确提到或强烈暗示值得关注的标的\n4. 如果没有相关标的，对应数组为空\n\n请开始分析：\n\n'''
+        userprompt='''这些是最近限定时间内各大财经公众号的文章内容，请基于以下所有文章内容，给出未来几天的投资建议，包括：\n1. 整体市场判断\n2. 重点行业/板块分析\n3. 具体投资策略\n4. 风险提示\n\n请详细分析并以自然文本格式给出专业建议。\n\n最后，请将所有涉及到的重点关注的指数和股票以严格的JSON格式附加在末尾，格式如下：\n```json\n{\n    "indices": [\n        {"code": "000001", "name": "上证指数"},\n        {"code": "399006", "name": "创业板指"}\n    ],\n    "stocks": [\n        {"code": "600519", "name": "贵州茅台"},\n        {"code": "000858", "name": "五粮液"}\n    ]\n}\n```\n注意：\n1. 指数代码格式：上证指数"000001"，深证成指"399001"，创业板指"399006"，科创50"000688"等\n2. 股票代码格式：6位数字代码，如"600519"、"000001"等\n3. 只列出明确提到或强烈暗示值得关注的标的\n4. 如果没有相关标的，对应数组为空\n\n请开始分析：\n\n''',
+        stage="微信投资建议"
     )
     
+    if cancel_event is not None and cancel_event.is_set():
+        print("微信任务已取消，不保存投资建议")
+        return None
+    
     # 确保归档目录存在
     if not os.path.exists(archive_dir):
         os.makedirs(archive_dir)
@@ -469,10 +471,12 @@ def generate_investment_advice(all_content, today):
     return investment_advice
 
 
-def run_wechat_task():
-    """运行微信公众号文章分析任务"""
+def run_wechat_task(cancel_event=None):
+    """运行微信公众号文章分析任务，cancel_event被设置（任务超时）时在下一个阶段前停止，不写入投资建议"""
     print("开始获取所有公众号限定时间内文章内容...")
-    all_daily_content = get_all_accounts_daily_content()
+    all_daily_content = get_all_accounts_daily_content(cancel_event)
+    if cancel_event is not None and cancel_event.is_set():
+        return None
     # save_daily_content(all_daily_content)
     
     # 使用统一的日期工具获取当前分析日期
@@ -484,7 +488,7 @@ def run_wechat_task():
     
     if all_articles_content.strip():
         print(f"已收集文章内容，总长度：{len(all_articles_content)}字符")
-        investment_advice = generate_investment_advice(all_articles_content, today)
+        investment_advice = generate_investment_advice(all_articles_content, today, cancel_event)
         print("\n投资分析建议生成完成！")
         return investment_advice
     else:
@@ -493,4 +497,5 @@ def run_wechat_task():
 
 
 if __name__ == "__main__":
+    refresh_time_window(LIMIT_HOURS)
     run_wechat_task()
\ No newline at end of file
@@ -3,18 +3,17 @@ import json
 import time
 import re
 import urllib.parse
-from seleniumwire import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.chrome.service import Service
+# selenium/selenium-wire在需要扫码登录时才导入，cookie有效时的运行不加载
+from browser_utils import create_chrome_service
 
 def update_wechat_cookie():
     """
     通过浏览器自动化登录微信公众号平台，获取新的cookie和token
     """
+    from seleniumwire import webdriver
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.chrome.options import Options
+    
     print("开始微信公众号登录流程...")
     
     # 设置Chrome选项
@@ -27,7 +26,7 @@ def update_wechat_cookie():
     
     try:
         # 初始化WebDriver
-        service = Service(ChromeDriverManager().install())
+        service = create_chrome_service()
         driver = webdriver.Chrome(service=service, options=chrome_options)
         driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
         print("浏览器已启动")
@@ -1,22 +1,21 @@
 import os
 import time
 import random
-import re
-from datetime import datetime, timedelta
+from datetime import datetime
 import json
 import requests
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
+# selenium在需要启动浏览器时才导入
 
-from deepseek_summary import deepseek_summary
-from date_utils import get_current_analysis_date, ensure_archive_folder, print_date_info, get_friday_date_for_weekend
+from chunked_summary import map_reduce_summary
+from browser_utils import (create_chrome_service, wait_for_page_ready, wait_for_network_idle, wait_for_any_selector,
+                           scroll_and_wait)
+from date_utils import get_current_analysis_date, ensure_archive_folder, print_date_info
+from time_window import get_time_window, refresh_time_window
 
 LIMIT_HOURS = 18  # 平时限定小时内（18小时），周末只收录周五收盘后发布的内容
+PROFILE_LOAD_TIMEOUT = 8  # 用户主页加载到网络空闲的最长等待（秒）
+SCROLL_LOAD_TIMEOUT = 4  # 每次滚动后等待新内容加载的最长时间（秒）
+ARTICLE_LOAD_TIMEOUT = 5  # 文章详情页正文出现的最长等待（秒）
 
 # 用户ID列表
 WEIBO_USER_IDS = [
@@ -32,6 +31,8 @@ WEIBO_COOKIE_PATH = "weibo_cookies.json"
 
 def setup_browser():
     """初始化浏览器"""
+    from selenium import webdriver
+    
     options = webdriver.ChromeOptions()
     options.add_argument("--disable-blink-features=AutomationControlled")
     options.add_experimental_option("excludeSwitches", ["enable-automation"])
@@ -41,7 +42,7 @@ def setup_browser():
     options.add_experimental_option("excludeSwitches", ["enable-logging"])
     
     driver = webdriver.Chrome(
-        service=Service(ChromeDriverManager().install()),
+        service=create_chrome_service(),
         options=options
     )
     driver.set_window_size(1000, 800)
@@ -59,6 +60,8 @@ def check_weibo_cookie_validity(driver):
     Returns:
         bool: cookie是否有效
     """
+    from selenium.webdriver.common.by import By
+    
     try:
         time.sleep(3)
         
@@ -189,106 +192,22 @@ def perform_manual_login(driver):
         print(f"保存cookie时出错: {str(e)}")
         return False
 
-def is_within_limit_hours(publish_date: str) -> bool:
-    """检查发布时间是否在限定小时内"""
-    now = datetime.now()
-    
-    # 检查是否为周末 (周六或周日) 或周一早上9点前
-    weekday = now.weekday()  # 0=周一, 6=周日
-    is_weekend = weekday >= 5  # 5=周六, 6=周日
-    is_monday_early = weekday == 0 and now.hour < 9  # 周一且9点前
-    is_weekend_period = is_weekend or is_monday_early
-    
-    # 处理日期格式：'YYYY-MM-DD' 或 'MM-DD' 或 'M-D'
-    date_match = re.match(r'(\d{4}-)?(\d{1,2}-\d{1,2})', publish_date)
-    if date_match:
-        try:
-            date_part = date_match.group(2)  # 获取MM-DD部分
-            
-            # 如果有年份，直接使用；如果没有，使用当前年份
-            if date_match.group(1):
-                full_date_str = f"{date_match.group(1)}{date_part}"
-                weibo_date = datetime.strptime(full_date_str, '%Y-%m-%d')
-            else:
-                # 只有月日，使用当前年份
-                current_year = now.year
-                full_date_str = f"{current_year}-{date_part}"
-                weibo_date = datetime.strptime(full_date_str, '%Y-%m-%d')
-                
-                # 如果解析出的日期在未来，说明是去年的
-                if weibo_date > now:
-                    weibo_date = weibo_date.replace(year=current_year - 1)
-            
-            # 周末逻辑：收录周五收盘后所有内容
-            if is_weekend_period:
-                friday_date = get_friday_date_for_weekend(now)
-                friday_close_time = friday_date.replace(hour=15, minute=0, second=0, microsecond=0)
-                return weibo_date.date() >= friday_close_time.date()
-            else:
-                # 平时使用18小时限制
-                delta = now - weibo_date
-                hours_diff = delta.total_seconds() / 3600
-                return hours_diff <= LIMIT_HOURS
-        except ValueError:
-            return False
-
-    # 处理相对时间格式（今天、X小时前、X分钟前等）
-    if is_weekend_period:
-        friday_date = get_friday_date_for_weekend(now)
-        friday_close_time = friday_date.replace(hour=15, minute=0, second=0, microsecond=0)
-        
-        if "分钟" in publish_date or "今天" in publish_date:
-            return True
-            
-        if "小时前" in publish_date:
-            match = re.search(r'(\d+)小时前', publish_date)
-            if match:
-                hours = int(match.group(1))
-                publish_time = now - timedelta(hours=hours)
-                return publish_time >= friday_close_time
-            return True
-            
-        if "昨天" in publish_date:
-            return True
-            
-        if "天前" in publish_date:
-            match = re.search(r'(\d+)天前', publish_date)
-            if match:
-                days = int(match.group(1))
-                return days <= 2
-            return True
-            
-        return True
-    else:
-        # 平时的处理逻辑（周一至周五）
-        if "分钟" in publish_date:
-            return True
-        if "今天" in publish_date:
-            return True
-        if "小时前" in publish_date:
-            match = re.search(r'(\d+)小时前', publish_date)
-            if match:
-                hours = int(match.group(1))
-                return hours <= LIMIT_HOURS
-            return True  # 如果无法提取小时数，默认包含
-        if "昨天" in publish_date:
-            return True  # 昨天的内容总是包含
-        if "天前" in publish_date:
-            match = re.search(r'(\d+)天前', publish_date)
-            if match:
-                days = int(match.group(1))
-                return days <= 1  # 平时只包含昨天和今天的内容
-            return False
-            
-    return False  # 默认不包含
+def is_within_limit_hours(publish_date) -> bool:
+    """检查发布时间是否在限定小时内（共享的time_window，周末收录周五收盘后的内容）"""
+    return get_time_window(LIMIT_HOURS).contains(publish_date)
 
 def get_weibo_content(driver, user_id):
     """获取指定用户的微博内容"""
+    from selenium.webdriver.common.by import By
+    
     try:
         user_url = f"https://weibo.com/u/{user_id}"
         driver.get(user_url)
         print(f"访问用户ID {user_id} URL：{user_url}")
-        time.sleep(8)
+        # 等待页面就绪且网络空闲，最长PROFILE_LOAD_TIMEOUT秒
+        started = time.monotonic()
+        wait_for_page_ready(driver, timeout=PROFILE_LOAD_TIMEOUT)
+        wait_for_network_idle(driver, timeout=max(0.0, PROFILE_LOAD_TIMEOUT - (time.monotonic() - started)))
         
         page_source = driver.page_source
         login_required_indicators = [
@@ -421,13 +340,13 @@ def get_weibo_content(driver, user_id):
         
         print(f"最终使用的用户名: {username}")
         
-        # 不使用特定元素等待，改为简单的时间等待
-        # 滚动加载更多内容
+        # 滚动加载更多内容：页面高度增长且网络空闲后继续，没有新内容时提前结束
         print("滚动加载更多内容...")
         for i in range(3):
-            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
             print(f"滚动 {i+1}/3")
-            time.sleep(4)  # 增加滚动后的等待时间
+            if not scroll_and_wait(driver, timeout=SCROLL_LOAD_TIMEOUT):
+                print("没有更多内容加载，停止滚动")
+                break
         
         # 尝试使用不同的选择器获取微博列表
         print("尝试获取微博列表...")
@@ -531,10 +450,13 @@ def get_weibo_content(driver, user_id):
                         driver.execute_script(f"window.open('{article_link}', '_blank');")
                         # 切换到新窗口
                         driver.switch_to.window(driver.window_handles[-1])
-                        time.sleep(5)  # 等待页面加载
                         
-                        # 尝试提取文章内容
+                        # 等待文章正文出现，而不是固定等待
                         article_content_selectors = ['.articalContent', '.article-content', '.WB_artical', '.content']
+                        wait_for_page_ready(driver, timeout=ARTICLE_LOAD_TIMEOUT)
+                        wait_for_any_selector(driver, article_content_selectors, timeout=ARTICLE_LOAD_TIMEOUT)
+                        
+                        # 尝试提取文章内容
                         for selector in article_content_selectors:
                             try:
                                 content_elem = driver.find_element(By.CSS_SELECTOR, selector)
@@ -694,17 +616,22 @@ def collect_all_weibo_content(archive_folder):
     
     return '\n\n'.join(all_weibo_content)
 
-def generate_weibo_investment_advice(all_content, archive_folder, current_date):
-    """基于所有微博内容生成投资建议"""
+def generate_weibo_investment_advice(all_content, archive_folder, current_date, cancel_event=None):
+    """基于所有微博内容生成投资建议，cancel_event在生成期间被设置时不写入投资建议文件并返回None"""
     print("开始生成微博投资分析建议...")
     
     # 调用deepseek进行投资分析
-    investment_advice = deepseek_summary(
+    investment_advice = map_reduce_summary(
         all_content,
         sysprompt="你是一个专业的金融分析师，擅长基于多份财经市场分析报告给出投资建议。请结合宏观经济、市场情绪、行业趋势等多个维度进行分析。",
-        userprompt='''这些是最近限定时间内微博用户的内容，请基于以下所有内容，给出未来几天的投资建议，包括：\n1. 整体市场判断\n2. 重点行业/板块分析\n3. 具体投资策略\n4. 风险提示\n\n请详细分析并以自然文本格式给出专业建议。\n\n最后，请将所有涉及到的重点关注的指数和股票以严格的JSON格式附加在末尾，格式如下：\n```json\n{\n    "indices": [\n        {"code": "000001", "name": "上证指数"},\n        {"code": "399006", "name": "创业板指"}\n    ],\n    "stocks": [\n        {"code": "600519", "name": "贵州茅台"},\n        {"code": "000858", "name": "五粮液"}\n    ]\n}\n```\n注意：\n1. 指数代码格式：上证指数"000001"，深证成指"399001"，创业板指"399006"，科创50"000688"等\n2. 股票代码格式：6位数字代码，如"600519"、"000001"等\n3. 只列出明确提到或强烈暗示值得关注的标的\n4. 如果没有相关标的，对应数组为空\n\n请开始分析：\n\n'''
+        userprompt='''这些是最近限定时间内微博用户的内容，请基于以下所有内容，给出未来几天的投资建议，包括：\n1. 整体市场判断\n2. 重点行业/板块分析\n3. 具体投资策略\n4. 风险提示\n\n请详细分析并以自然文本格式给出专业建议。\n\n最后，请将所有涉及到的重点关注的指数和股票以严格的JSON格式附加在末尾，格式如下：\n```json\n{\n    "indices": [\n        {"code": "000001", "name": "上证指数"},\n        {"code": "399006", "name": "创业板指"}\n    ],\n    "stocks": [\n        {"code": "600519", "name": "贵州茅台"},\n        {"code": "000858", "name": "五粮液"}\n    ]\n}\n```\n注意：\n1. 指数代码格式：上证指数"000001"，深证成指"399001"，创业板指"399006"，科创50"000688"等\n2. 股票代码格式：6位数字代码，如"600519"、"000001"等\n3. 只列出明确提到或强烈暗示值得关注的标的\n4. 如果没有相关标的，对应数组为空\n\n请开始分析：\n\n''',
+        stage="微博投资建议"
     )
     
+    if cancel_event is not None and cancel_event.is_set():
+        print("微博任务已取消，不保存投资建议")
+        return None
+    
     # 保存投资建议
     advice_filename = os.path.join(archive_folder, f"weibo_投资建议_{current_date}.txt")
     with open(advice_filename, 'w', encoding='utf-8') as f:
@@ -716,33 +643,17 @@ def generate_weibo_investment_advice(all_content, archive_folder, current_date):
     print(f"投资建议已保存到: {advice_filename}")
     return investment_advice
 
-def run_weibo_task():
-    """运行微博分析任务"""
-    print("\n" + "="*50)
-    print("开始执行微博分析任务")
-    print("="*50)
+def fetch_weibo_contents(archive_folder, cancel_event=None):
+    """登录微博并抓取所有用户限定时间内的内容，保存到归档文件夹
     
-    # 使用统一的日期工具获取当前分析日期
-    current_date, date_reason, archive_folder = get_current_analysis_date()
-    print_date_info()
-    
-    # 确保归档文件夹存在
-    ensure_archive_folder(archive_folder)
+    cancel_event被设置（任务超时）时不再处理后续用户
     
-    # 检查微博投资建议文件是否已存在
-    weibo_advice_path = os.path.join(archive_folder, f"weibo_投资建议_{current_date}.txt")
-    if os.path.exists(weibo_advice_path):
-        print(f"微博投资建议文件已存在: {weibo_advice_path}")
-        print("跳过微博任务执行")
-        # 读取已存在的投资建议
-        try:
-            with open(weibo_advice_path, "r", encoding="utf-8") as f:
-                weibo_advice = f.read()
-            print(f"已读取现有微博投资建议，长度: {len(weibo_advice)}字符")
-            return weibo_advice
-        except Exception as e:
-            print(f"读取现有微博投资建议失败: {str(e)}")
-            return None
+    Returns:
+        list: 本次保存的微博内容文件路径列表
+    """
+    saved_files = []
+    # 时间窗口由运行入口计算一次，这里只读取
+    print(f"时间窗口：{get_time_window(LIMIT_HOURS).describe()}")
     
     # 初始化浏览器
     driver = setup_browser()
@@ -751,12 +662,14 @@ def run_weibo_task():
         # 登录微博
         if not login_and_save_cookie(driver):
             print("登录失败，无法继续执行微博任务")
-            return None
+            return saved_files
         
         # 获取所有用户的微博内容
-        all_weibo_collected = False
         user_ids = WEIBO_USER_IDS
         for user_id in user_ids:
+            if cancel_event is not None and cancel_event.is_set():
+                print("微博任务已取消，停止获取后续用户")
+                break
             print(f"\n处理用户ID: {user_id}")
             result = get_weibo_content(driver, user_id)
             
@@ -774,13 +687,51 @@ def run_weibo_task():
             
             if weibo_contents:
                 save_weibo_content(user_id, username, weibo_contents, archive_folder)
-                all_weibo_collected = True
+                saved_files.append(os.path.join(archive_folder, f"weibo_{username}.txt"))
             else:
                 print(f"未获取到用户 {username} 的微博内容")
         
-        if not all_weibo_collected:
+        return saved_files
+    finally:
+        driver.quit()
+
+def run_weibo_task(reuse_existing: bool = True, cancel_event=None):
+    """运行微博分析任务，reuse_existing为True时当天已有微博投资建议文件则直接复用
+    
+    cancel_event被设置（任务超时）时在下一个阶段前停止，不写入投资建议
+    """
+    print("\n" + "="*50)
+    print("开始执行微博分析任务")
+    print("="*50)
+    
+    # 使用统一的日期工具获取当前分析日期
+    current_date, date_reason, archive_folder = get_current_analysis_date()
+    print_date_info()
+    
+    # 确保归档文件夹存在
+    ensure_archive_folder(archive_folder)
+    
+    # 检查微博投资建议文件是否已存在
+    weibo_advice_path = os.path.join(archive_folder, f"weibo_投资建议_{current_date}.txt")
+    if reuse_existing and os.path.exists(weibo_advice_path):
+        print(f"微博投资建议文件已存在: {weibo_advice_path}")
+        print("跳过微博任务执行")
+        # 读取已存在的投资建议
+        try:
+            with open(weibo_advice_path, "r", encoding="utf-8") as f:
+                weibo_advice = f.read()
+            print(f"已读取现有微博投资建议，长度: {len(weibo_advice)}字符")
+            return weibo_advice
+        except Exception as e:
+            print(f"读取现有微博投资建议失败: {str(e)}")
+            return None
+    
+    try:
+        if not fetch_weibo_contents(archive_folder, cancel_event):
             print("未获取到任何微博内容，跳过投资建议生成")
             return None
+        if cancel_event is not None and cancel_event.is_set():
+            return None
         
         # 收集所有微博内容
         print("\n收集所有微博内容...")
@@ -788,7 +739,8 @@ def run_weibo_task():
         
         if all_articles_content.strip():
             print(f"已收集微博内容，总长度：{len(all_articles_content)}字符")
-            investment_advice = generate_weibo_investment_advice(all_articles_content, archive_folder, current_date)
+            investment_advice = generate_weibo_investment_advice(all_articles_content, archive_folder, current_date,
+                                                                 cancel_event)
             print("\n微博任务完成")
             return investment_advice
         else:
@@ -798,8 +750,7 @@ def run_weibo_task():
     except Exception as e:
         print(f"微博任务执行失败: {str(e)}")
         return None
-    finally:
-        driver.quit()
 
 if __name__ == "__main__":
+    refresh_time_window(LIMIT_HOURS)
     run_weibo_task()
\ No newline at end of file
@@ -0,0 +1,375 @@
+"""
+语音识别模块 - 进程内共享的faster-whisper模型
+
+模型按 (模型大小, 设备, 计算类型) 只加载一次，之后所有视频、所有工作线程共用同一个实例。
+CTranslate2模型支持多线程并发调用，num_workers决定同时能真正并行执行的转写数。
+设备探测结果只计算一次，通过faster-whisper自带的ctranslate2查询CUDA设备，不再为探测GPU导入torch。
+prewarm_whisper_model()可以在获取视频列表时于后台线程提前加载模型。
+
+CPU上的长音频可使用并行模式：先用VAD找出静音位置，把音频在静音处切成若干段，
+在按CPU核数确定大小的进程池中分别转写，最后按各段起始偏移拼接时间轴，输出与顺序转写格式一致的SRT。
+
+transcribe_stream_to_srt()接收边下载边解码得到的PCM数据块，缓冲区攒够后即在静音处切出完整的段提交转写，
+下载尚未结束时转写就已开始，音频不落盘。
+"""
+
+import os
+import time
+import atexit
+import threading
+import functools
+import multiprocessing
+import concurrent.futures
+
+WHISPER_MODEL_SIZE = "small"  # 使用small模型，速度较快
+WHISPER_LANGUAGE = "zh"
+WHISPER_BEAM_SIZE = 5
+WHISPER_NUM_WORKERS = 2  # 同一模型实例上可并行执行的转写数
+WHISPER_SAMPLING_RATE = 16000
+
+# 并行转写配置（仅CPU）
+TRANSCRIBE_MODE = "auto"  # "auto": CPU上的长音频自动并行；"parallel": 总是并行；"sequential": 总是顺序
+PARALLEL_MIN_SECONDS = 10 * 60  # auto模式下音频时长超过该值才并行
+PARALLEL_CHUNK_SECONDS = 120  # 每段目标时长，实际在最近的静音处切开
+PARALLEL_THREADS_PER_WORKER = 2  # 每个转写进程使用的CPU线程数，进程数 = CPU核数 / 该值
+VAD_MIN_SILENCE_MS = 500  # 作为切分点的最短静音时长
+STREAM_MAX_BUFFER_SECONDS = 600  # 流式转写时缓冲区超过该时长仍找不到静音则整段提交
+
+
+@functools.lru_cache(maxsize=1)
+def detect_whisper_device():
+    """检测语音识别使用的设备，返回 (device, compute_type)，结果在进程内缓存"""
+    try:
+        import ctranslate2
+        if ctranslate2.get_cuda_device_count() > 0:
+            print("检测到GPU可用，使用CUDA设备进行语音识别")
+            return "cuda", "float16"  # GPU上使用float16以获得更好性能
+    except Exception as e:
+        print(f"检测GPU失败: {e}")
+    print("未检测到GPU，使用CPU进行语音识别")
+    return "cpu", "int8"
+
+
+class WhisperModelRegistry:
+    """faster-whisper模型注册表，同一配置的模型只加载一次，线程安全"""
+
+    def __init__(self):
+        self._models = {}
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    def get(self, model_size: str = WHISPER_MODEL_SIZE):
+        """获取模型，首次调用时加载；其他线程正在加载同一模型时等待其完成
+
+        Raises:
+            ImportError: 未安装faster-whisper
+        """
+        device, compute_type = detect_whisper_device()
+        key = (model_size, device, compute_type)
+        while True:
+            with self._lock:
+                model = self._models.get(key)
+                if model is not None:
+                    return model
+                event = self._loading.get(key)
+                if event is None:
+                    event = self._loading[key] = threading.Event()
+                    break
+            # 其他线程正在加载，等待后重新检查（加载失败时由当前线程重试）
+            event.wait()
+
+        try:
+            from faster_whisper import WhisperModel
+            print(f"加载faster-whisper模型 {model_size} (设备: {device}, 计算类型: {compute_type})...")
+            start_time = time.time()
+            model = WhisperModel(model_size, device=device, compute_type=compute_type,
+                                 num_workers=WHISPER_NUM_WORKERS)
+            print(f"faster-whisper模型加载完成，耗时 {time.time() - start_time:.1f} 秒")
+            with self._lock:
+                self._models[key] = model
+            return model
+        finally:
+            with self._lock:
+                self._loading.pop(key, None)
+            event.set()
+
+    def prewarm(self, model_size: str = WHISPER_MODEL_SIZE) -> threading.Thread:
+        """在后台线程中加载模型，返回该线程"""
+        def load():
+            try:
+                self.get(model_size)
+            except ImportError:
+                print("未安装faster-whisper，跳过模型预热")
+            except Exception as e:
+                print(f"faster-whisper模型预热失败: {e}")
+
+        thread = threading.Thread(target=load, name="whisper_prewarm", daemon=True)
+        thread.start()
+        return thread
+
+    def unload(self):
+        """释放所有已加载的模型"""
+        with self._lock:
+            self._models.clear()
+
+
+_registry = WhisperModelRegistry()
+
+
+def get_whisper_model(model_size: str = WHISPER_MODEL_SIZE):
+    """获取进程内共享的faster-whisper模型"""
+    return _registry.get(model_size)
+
+
+def prewarm_whisper_model(model_size: str = WHISPER_MODEL_SIZE) -> threading.Thread:
+    """后台预加载共享模型，之后的get_whisper_model直接复用"""
+    return _registry.prewarm(model_size)
+
+
+def unload_whisper_models():
+    """释放共享模型（例如任务结束后需要回收显存时）"""
+    _registry.unload()
+
+
+def format_time(seconds: float) -> str:
+    """将秒数格式化为SRT时间格式"""
+    hours = int(seconds // 3600)
+    minutes = int((seconds % 3600) // 60)
+    seconds = seconds % 60
+    return f"{hours:02d}:{minutes:02d}:{seconds:06.3f}".replace('.', ',')
+
+
+def write_srt(segments, srt_path: str) -> int:
+    """把 (开始秒, 结束秒, 文本) 序列写成SRT文件，返回写入的条数"""
+    count = 0
+    with open(srt_path, 'w', encoding='utf-8') as f:
+        for i, (start, end, text) in enumerate(segments, 1):
+            f.write(f"{i}\n")
+            f.write(f"{format_time(start)} --> {format_time(end)}\n")
+            f.write(f"{text}\n\n")
+            count = i
+    return count
+
+
+def split_on_silence(audio, chunk_seconds: float = PARALLEL_CHUNK_SECONDS,
+                     sampling_rate: int = WHISPER_SAMPLING_RATE) -> list:
+    """用VAD检测语音区间，在静音处把音频切成约chunk_seconds长的段，不会切断语音
+
+    Returns:
+        list: [(起始采样点, 结束采样点)]，首尾相接覆盖整段音频
+    """
+    from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+    speech = get_speech_timestamps(audio, VadOptions(min_silence_duration_ms=VAD_MIN_SILENCE_MS))
+    chunk_samples = int(chunk_seconds * sampling_rate)
+    cuts = [0]
+    previous_end = None
+    for region in speech:
+        if previous_end is not None and region["end"] - cuts[-1] > chunk_samples:
+            # 在上一段语音结束与本段语音开始之间的静音中点切开
+            cuts.append((previous_end + region["start"]) // 2)
+        previous_end = region["end"]
+    cuts.append(len(audio))
+    return [(start, end) for start, end in zip(cuts, cuts[1:]) if end > start]
+
+
+_worker_model = None
+
+
+def _init_transcribe_worker(model_size: str, cpu_threads: int):
+    """转写进程初始化：每个进程加载一次自己的模型"""
+    global _worker_model
+    from faster_whisper import WhisperModel
+    _worker_model = WhisperModel(model_size, device="cpu", compute_type="int8", cpu_threads=cpu_threads)
+
+
+def _transcribe_with_model(model, offset_seconds: float, audio) -> list:
+    segments, _ = model.transcribe(audio, beam_size=WHISPER_BEAM_SIZE, language=WHISPER_LANGUAGE)
+    return [(segment.start + offset_seconds, segment.end + offset_seconds, segment.text) for segment in segments]
+
+
+def _transcribe_chunk(offset_seconds: float, audio) -> list:
+    return _transcribe_with_model(_worker_model, offset_seconds, audio)
+
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+
+def get_parallel_worker_count() -> int:
+    return max(1, (os.cpu_count() or 1) // PARALLEL_THREADS_PER_WORKER)
+
+
+def _get_process_pool(model_size: str):
+    """获取常驻的转写进程池，多个视频复用，避免每个视频都重新启动进程和加载模型"""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            workers = get_parallel_worker_count()
+            print(f"启动并行转写进程池: {workers} 个进程，每个进程 {PARALLEL_THREADS_PER_WORKER} 个线程")
+            # 使用spawn启动子进程：此时父进程已有总结、爬虫等线程和已加载的CTranslate2/OpenMP模型，
+            # fork会把这些线程持有的锁与libgomp线程池状态复制到子进程，可能导致子进程卡死
+            _process_pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_transcribe_worker,
+                initargs=(model_size, PARALLEL_THREADS_PER_WORKER)
+            )
+        return _process_pool
+
+
+def shutdown_transcription_pool():
+    """关闭并行转写进程池"""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=True)
+            _process_pool = None
+
+
+atexit.register(shutdown_transcription_pool)
+
+
+def transcribe_parallel(audio, model_size: str = WHISPER_MODEL_SIZE,
+                        sampling_rate: int = WHISPER_SAMPLING_RATE) -> list:
+    """在静音处切段后用进程池并行转写，返回按时间排序的 (开始秒, 结束秒, 文本) 列表
+
+    Args:
+        audio: 16kHz单声道float32采样数组
+    """
+    chunks = split_on_silence(audio, sampling_rate=sampling_rate)
+    print(f"音频时长 {len(audio) / sampling_rate / 60:.1f} 分钟，在静音处切分为 {len(chunks)} 段并行转写")
+    pool = _get_process_pool(model_size)
+    futures = [pool.submit(_transcribe_chunk, start / sampling_rate, audio[start:end]) for start, end in chunks]
+    segments = []
+    for index, future in enumerate(futures, 1):
+        segments.extend(future.result())
+        print(f"并行转写进度: {index}/{len(chunks)}")
+    return segments
+
+
+def transcribe_sequential(audio, model_size: str = WHISPER_MODEL_SIZE) -> list:
+    """使用共享模型顺序转写，返回 (开始秒, 结束秒, 文本) 列表
+
+    Args:
+        audio: 音频文件路径或16kHz单声道float32采样数组
+    """
+    return _transcribe_with_model(get_whisper_model(model_size), 0.0, audio)
+
+
+def should_transcribe_parallel(duration_seconds: float, mode: str = TRANSCRIBE_MODE) -> bool:
+    if mode == "parallel":
+        return True
+    if mode != "auto":
+        return False
+    device, _ = detect_whisper_device()
+    return device == "cpu" and get_parallel_worker_count() > 1 and duration_seconds >= PARALLEL_MIN_SECONDS
+
+
+def transcribe_to_srt(audio_path: str, srt_path: str, mode: str = TRANSCRIBE_MODE,
+                      model_size: str = WHISPER_MODEL_SIZE) -> str:
+    """转写音频文件并写成SRT，按mode和音频时长选择顺序或并行方式
+
+    Raises:
+        ImportError: 未安装faster-whisper
+    """
+    from faster_whisper import decode_audio
+
+    audio = decode_audio(audio_path, sampling_rate=WHISPER_SAMPLING_RATE)
+    duration = len(audio) / WHISPER_SAMPLING_RATE
+    start_time = time.time()
+    if should_transcribe_parallel(duration, mode):
+        segments = transcribe_parallel(audio, model_size)
+    else:
+        segments = transcribe_sequential(audio, model_size)
+    count = write_srt(segments, srt_path)
+    print(f"语音识别完成: {count} 条字幕，音频 {duration / 60:.1f} 分钟，耗时 {time.time() - start_time:.1f} 秒")
+    return srt_path
+
+
+def transcribe_stream(blocks, mode: str = TRANSCRIBE_MODE, model_size: str = WHISPER_MODEL_SIZE,
+                      sampling_rate: int = WHISPER_SAMPLING_RATE, duration_seconds: float = None) -> list:
+    """边接收PCM数据块边转写，返回按时间排序的 (开始秒, 结束秒, 文本) 列表
+
+    缓冲区攒够两段的长度后在静音处切分，除最后一段（可能还未结束）外全部提交转写。
+    已知音频时长时按should_transcribe_parallel决定是否使用进程池；时长未知时先用共享模型在线程中转写，
+    auto模式下已接收的音频超过PARALLEL_MIN_SECONDS后，后续的段才改为提交到进程池。
+
+    Args:
+        blocks: 产出16kHz单声道float32采样数组的可迭代对象
+        duration_seconds: 音频总时长（如视频信息中的时长），未知时为None
+    """
+    import numpy as np
+
+    decided = mode != "auto" or duration_seconds is not None
+    use_pool = should_transcribe_parallel(duration_seconds or 0, mode)
+    executors = {}
+
+    def submit(offset, audio):
+        if use_pool:
+            if "pool" not in executors:
+                executors["pool"] = _get_process_pool(model_size)
+            return executors["pool"].submit(_transcribe_chunk, offset, audio)
+        if "thread" not in executors:
+            executors["model"] = get_whisper_model(model_size)
+            executors["thread"] = concurrent.futures.ThreadPoolExecutor(max_workers=WHISPER_NUM_WORKERS,
+                                                                        thread_name_prefix="whisper_stream")
+        return executors["thread"].submit(_transcribe_with_model, executors["model"], offset, audio)
+
+    chunk_samples = PARALLEL_CHUNK_SECONDS * sampling_rate
+    buffer = np.zeros(0, dtype=np.float32)
+    buffer_offset = 0  # 缓冲区起点在整段音频中的采样点位置
+    futures = []
+    try:
+        for block in blocks:
+            buffer = np.concatenate([buffer, block])
+            if not decided and (buffer_offset + len(buffer)) / sampling_rate >= PARALLEL_MIN_SECONDS:
+                # 时长未知的长音频：超过阈值后改用进程池，已提交到共享模型的段照常完成
+                decided = True
+                use_pool = should_transcribe_parallel(PARALLEL_MIN_SECONDS, mode)
+                if use_pool:
+                    print(f"已接收音频超过 {PARALLEL_MIN_SECONDS / 60:.0f} 分钟，后续分段改用进程池并行转写")
+            if len(buffer) < 2 * chunk_samples:
+                continue
+            chunks = split_on_silence(buffer, sampling_rate=sampling_rate)
+            if len(chunks) == 1 and len(buffer) < STREAM_MAX_BUFFER_SECONDS * sampling_rate:
+                continue
+            ready = chunks[:-1] if len(chunks) > 1 else chunks
+            for start, end in ready:
+                futures.append(submit((buffer_offset + start) / sampling_rate, buffer[start:end]))
+            consumed = ready[-1][1]
+            buffer = buffer[consumed:]
+            buffer_offset += consumed
+            print(f"已接收音频 {(buffer_offset + len(buffer)) / sampling_rate / 60:.1f} 分钟，已提交 {len(futures)} 段转写")
+
+        if len(buffer):
+            for start, end in split_on_silence(buffer, sampling_rate=sampling_rate):
+                futures.append(submit((buffer_offset + start) / sampling_rate, buffer[start:end]))
+        total_samples = buffer_offset + len(buffer)
+        if total_samples == 0:
+            raise RuntimeError("未接收到任何音频数据")
+        print(f"音频接收完成，共 {total_samples / sampling_rate / 60:.1f} 分钟，{len(futures)} 段")
+
+        segments = []
+        for future in futures:
+            segments.extend(future.result())
+        return segments
+    finally:
+        for future in futures:
+            future.cancel()
+        if "thread" in executors:
+            executors["thread"].shutdown(wait=True)
+
+
+def transcribe_stream_to_srt(blocks, srt_path: str, mode: str = TRANSCRIBE_MODE,
+                             model_size: str = WHISPER_MODEL_SIZE, duration_seconds: float = None) -> str:
+    """边接收PCM数据块边转写并写成SRT，duration_seconds为已知的音频时长（未知时为None）
+
+    Raises:
+        ImportError: 未安装faster-whisper
+    """
+    start_time = time.time()
+    segments = transcribe_stream(blocks, mode, model_size, duration_seconds=duration_seconds)
+    count = write_srt(segments, srt_path)
+    print(f"流式语音识别完成: {count} 条字幕，耗时 {time.time() - start_time:.1f} 秒")
+    return srt_path